@@ -0,0 +1,44 @@
+-- =====================================================
+-- Migration 105: Censo de mercados no servidor
+-- =====================================================
+-- market-demand-discovery.py baixava o business_category de todos os leads
+-- elegíveis em páginas de 1000 linhas só para montar um Counter em Python.
+-- market_census() devolve as contagens por mercado numa única agregação:
+-- - total_leads:    leads com business_category
+-- - eligible_leads: com embedding E bio (os que entram na análise)
+-- =====================================================
+
+-- 1. Índice parcial dos leads elegíveis por mercado
+-- (serve a contagem e o COPY por mercado do loader)
+CREATE INDEX IF NOT EXISTS idx_instagram_leads_category_eligible
+ON instagram_leads (business_category)
+WHERE embedding IS NOT NULL AND bio IS NOT NULL;
+
+-- 2. Função de censo
+DROP FUNCTION IF EXISTS market_census(integer);
+
+CREATE OR REPLACE FUNCTION market_census(p_min_eligible integer DEFAULT 0)
+RETURNS TABLE (
+  business_category text,
+  total_leads bigint,
+  eligible_leads bigint
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT
+    il.business_category::text,
+    COUNT(*) AS total_leads,
+    COUNT(*) FILTER (WHERE il.embedding IS NOT NULL AND il.bio IS NOT NULL) AS eligible_leads
+  FROM instagram_leads il
+  WHERE il.business_category IS NOT NULL
+    AND btrim(il.business_category) <> ''
+  GROUP BY il.business_category
+  HAVING COUNT(*) FILTER (WHERE il.embedding IS NOT NULL AND il.bio IS NOT NULL) >= p_min_eligible
+  ORDER BY eligible_leads DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION market_census(integer) TO service_role;
+
+COMMENT ON FUNCTION market_census IS 'Per-market lead counts (total and eligible = with embedding and bio) for market-demand-discovery, aggregated server-side.';
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark: compute profiles / backends of the D2P topic model
+
+For each size and configuration, fits the BERTopic pipeline exactly as
+run_analysis does (create_bertopic_model + fit_transform on precomputed
+embeddings) in a fresh subprocess and reports wall time, peak RSS of that
+subprocess and topic agreement (ARI) against the `exact` profile (UMAP +
+HDBSCAN, the historical baseline).
+
+Configurations are profile names (exact, fast, huge) or reducer+clusterer
+pairs, e.g. svd+hdbscan, random_projection+graph.
+
+Docs are synthetic bios (see bench_d2p_lexicon) encoded with the engine's
+sentence model; --synthetic-embeddings skips the model and draws clustered
+random vectors instead (timings only, topics are meaningless).
+
+Uso:
+    python scripts/bench_d2p_backends.py [--sizes 1000 5000 20000]
+        [--configs exact fast huge pca+hdbscan svd+hdbscan random_projection+hdbscan umap+graph]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+DEFAULT_CONFIGS = ['exact', 'fast', 'huge', 'pca+hdbscan', 'svd+hdbscan', 'random_projection+hdbscan', 'umap+graph']
+
+
+def parse_config(config: str) -> Dict[str, str]:
+    if '+' in config:
+        reducer, clusterer = config.split('+', 1)
+        return {'profile': 'fast', 'reducer': reducer, 'clusterer': clusterer}
+    return {'profile': config}
+
+
+def run_one(data_dir: str, n: int, config: str) -> None:
+    """Subprocess entry: fit one configuration, print {"wall_s", "topics"} on stdout."""
+    import d2p_analysis_engine as engine
+    from d2p_backends import resolve_profile
+
+    with open(os.path.join(data_dir, 'docs.json')) as f:
+        docs = json.load(f)[:n]
+    embeddings = np.load(os.path.join(data_dir, 'embeddings.npy'))[:n]
+    cfg = parse_config(config)
+    profile = resolve_profile(cfg['profile'], cfg.get('reducer'), cfg.get('clusterer'))
+
+    t0 = time.perf_counter()
+    topic_model = engine.create_bertopic_model(n, profile)
+    topics, _ = topic_model.fit_transform(docs, embeddings)
+    wall_s = time.perf_counter() - t0
+
+    print(json.dumps({'wall_s': wall_s, 'topics': [int(t) for t in topics], 'backends': profile}))
+
+
+def prepare_data(data_dir: str, n: int, seed: int, synthetic_embeddings: bool) -> None:
+    from bench_d2p_lexicon import synthetic_bios
+    import d2p_analysis_engine as engine
+
+    docs = engine.prepare_bertopic_docs(synthetic_bios(n, seed), '')
+    if synthetic_embeddings:
+        rng = np.random.default_rng(seed)
+        centers = rng.standard_normal((40, 384))
+        embeddings = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, 384))
+    else:
+        model = engine.get_sentence_model()
+        cache = engine.get_embedding_cache()
+        if cache is not None:
+            embeddings, _ = engine.encode_with_cache(model, engine.EMBEDDING_MODEL_ID, docs, cache)
+        else:
+            embeddings = model.encode(docs, show_progress_bar=False, convert_to_numpy=True)
+
+    with open(os.path.join(data_dir, 'docs.json'), 'w') as f:
+        json.dump(docs, f)
+    np.save(os.path.join(data_dir, 'embeddings.npy'), np.asarray(embeddings, dtype=np.float32))
+
+
+def measure(data_dir: str, n: int, config: str) -> Dict:
+    """Run one configuration in a child process; peak RSS comes from wait4."""
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--run-one', data_dir, str(n), config],
+            stdout=subprocess.PIPE, stderr=err,
+        )
+        out = proc.stdout.read()
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if proc.returncode != 0:
+            err.seek(0)
+            lines = err.read().decode('utf-8', 'replace').strip().splitlines()
+            return {'error': (lines[-1] if lines else f'exit code {proc.returncode}')[:100]}
+
+    result = json.loads(out)
+    result['peak_rss_mb'] = usage.ru_maxrss / 1024
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark D2P compute profiles and backends")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument("--configs", nargs='+', default=DEFAULT_CONFIGS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--synthetic-embeddings", action='store_true',
+                        help="Skip the sentence model; use clustered random vectors")
+    parser.add_argument("--run-one", nargs=3, metavar=('DATA_DIR', 'N', 'CONFIG'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_one(args.run_one[0], int(args.run_one[1]), args.run_one[2])
+        return
+
+    from sklearn.metrics import adjusted_rand_score
+
+    configs: List[str] = ['exact'] + [c for c in args.configs if c != 'exact']
+    with tempfile.TemporaryDirectory(prefix='d2p_bench_') as data_dir:
+        prepare_data(data_dir, max(args.sizes), args.seed, args.synthetic_embeddings)
+
+        print(f"{'docs':>6} | {'config':<26} | {'wall':>8} | {'peak RSS':>9} | {'topics':>6} | {'outliers':>8} | ARI vs exact")
+        print("-" * 90)
+        for n in args.sizes:
+            baseline = None
+            for config in configs:
+                result = measure(data_dir, n, config)
+                if 'error' in result:
+                    print(f"{n:>6} | {config:<26} | {result['error']}")
+                    continue
+                topics = np.asarray(result['topics'])
+                if config == 'exact':
+                    baseline = topics
+                ari = adjusted_rand_score(baseline, topics) if baseline is not None else float('nan')
+                n_topics = len(set(topics.tolist()) - {-1})
+                print(f"{n:>6} | {config:<26} | {result['wall_s']:>7.1f}s | {result['peak_rss_mb']:>7.0f}MB | "
+                      f"{n_topics:>6} | {(topics == -1).mean():>7.1%} | {ari:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sentence encoder backends (PyTorch vs ONNX Runtime fp32 / int8)
+
+Encodes the same synthetic bios (see bench_d2p_lexicon), prepared exactly as
+run_analysis prepares BERTopic docs, with every backend and reports
+throughput plus cosine agreement with the PyTorch SentenceTransformer — the
+reference the stored topic models and caches were built with.
+
+Uso:
+    python scripts/bench_d2p_encoder.py [--n 2000] [--max-seq-length 128 64]
+        [--batch-tokens 8192] [--threads 0]
+"""
+
+import argparse
+import os
+import time
+from typing import Dict
+
+import numpy as np
+
+
+def cosine_agreement(reference: np.ndarray, other: np.ndarray) -> Dict[str, float]:
+    ref = reference / np.clip(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12, None)
+    oth = other / np.clip(np.linalg.norm(other, axis=1, keepdims=True), 1e-12, None)
+    cos = (ref * oth).sum(axis=1)
+    return {'mean': float(cos.mean()), 'p1': float(np.percentile(cos, 1)), 'min': float(cos.min())}
+
+
+def timed_encode(model, docs, repeats: int) -> (np.ndarray, float):
+    model.encode(docs[:32], show_progress_bar=False, convert_to_numpy=True)  # warm-up
+    best = float('inf')
+    embeddings = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        embeddings = model.encode(docs, show_progress_bar=False, convert_to_numpy=True)
+        best = min(best, time.perf_counter() - t0)
+    return np.asarray(embeddings, dtype=np.float32), best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark D2P sentence encoder backends")
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--max-seq-length", type=int, nargs='+', default=[128])
+    parser.add_argument("--batch-tokens", type=int, default=8192)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX intra-op threads (0 = runtime default)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import d2p_analysis_engine as engine
+    from bench_d2p_lexicon import synthetic_bios
+    from d2p_onnx_encoder import OnnxSentenceEncoder
+    from sentence_transformers import SentenceTransformer
+
+    docs = engine.prepare_bertopic_docs(synthetic_bios(args.n, args.seed), '')
+    onnx_dir = os.path.join(engine.CACHE_DIR, 'onnx')
+
+    reference_model = SentenceTransformer(engine.EMBEDDING_MODEL, device='cpu')
+    reference, ref_s = timed_encode(reference_model, docs, args.repeats)
+
+    print(f"{'backend':<12} | {'max_seq':>7} | {'docs/s':>8} | {'speedup':>7} | cosine vs torch/128 (mean / p1 / min)")
+    print("-" * 80)
+    print(f"{'torch':<12} | {reference_model.max_seq_length:>7} | {len(docs) / ref_s:>8.0f} | {1.0:>6.2f}x | reference")
+
+    for max_seq in args.max_seq_length:
+        if max_seq != reference_model.max_seq_length:
+            reference_model.max_seq_length = max_seq
+            emb, secs = timed_encode(reference_model, docs, args.repeats)
+            agree = cosine_agreement(reference, emb)
+            print(f"{'torch':<12} | {max_seq:>7} | {len(docs) / secs:>8.0f} | {ref_s / secs:>6.2f}x | "
+                  f"{agree['mean']:.4f} / {agree['p1']:.4f} / {agree['min']:.4f}")
+
+        for quantized in (False, True):
+            model = OnnxSentenceEncoder(engine.EMBEDDING_MODEL, onnx_dir, max_seq_length=max_seq,
+                                        quantized=quantized, batch_tokens=args.batch_tokens,
+                                        intra_op_threads=args.threads)
+            emb, secs = timed_encode(model, docs, args.repeats)
+            agree = cosine_agreement(reference, emb)
+            name = 'onnx-int8' if quantized else 'onnx-fp32'
+            print(f"{name:<12} | {max_seq:>7} | {len(docs) / secs:>8.0f} | {ref_s / secs:>6.2f}x | "
+                  f"{agree['mean']:.4f} / {agree['p1']:.4f} / {agree['min']:.4f}")
+
+
+if __name__ == '__main__':
+    main()
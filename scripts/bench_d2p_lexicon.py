@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single-pass lexicon automaton vs the per-list substring loops
+
+Generates synthetic bios from the D2P lexicons plus filler text and times the
+signal stages of run_analysis (operational phrases, business signals, D2P
+binary score, global workarounds) both ways. Also asserts that both paths
+produce identical results.
+
+Uso:
+    python scripts/bench_d2p_lexicon.py [--sizes 5000 50000] [--seed 42]
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import Dict, List
+
+import d2p_analysis_engine as engine
+
+FILLER = (
+    'moda fitness loja online entrega para todo brasil sp rj nutricionista consultório '
+    'consultas presenciais advogada direito família previdenciário agende sua avaliação '
+    'link na bio atendimento humanizado ✨ 📲 🚀 | . ! \n ➡️ especialista em resultados reais'
+).split(' ')
+
+
+# ------------------------------------------------------------------------------
+# Reference implementation (the substring loops the automaton replaced)
+# ------------------------------------------------------------------------------
+
+def legacy_extract_operational_phrases(bio: str) -> List[str]:
+    phrases = []
+    for sentence in re.split(r'[.!?\n|•⚡🔥✨💡🚀📲📱💼🎯✅❌➡️▶️🔸🔹]+', bio.lower()):
+        sentence = sentence.strip()
+        if len(sentence) < 5:
+            continue
+        if any(verb in sentence for verb in engine.OPERATIONAL_VERBS):
+            phrases.append(sentence)
+    return phrases
+
+
+def legacy_signal_stages(bios: List[str]) -> Dict:
+    docs = []
+    for bio in bios:
+        docs.append(engine.bertopic_doc(bio, legacy_extract_operational_phrases(bio)))
+
+    business = {}
+    for signal in engine.BUSINESS_OWNER_SIGNALS:
+        count = sum(1 for bio in bios if signal in bio.lower())
+        if count > 0:
+            business[signal] = count
+
+    frequency = volume = manual = 0
+    for bio in bios:
+        bio_lower = bio.lower()
+        frequency += any(s in bio_lower for s in engine.FREQUENCY_SIGNALS)
+        volume += any(s in bio_lower for s in engine.VOLUME_SIGNALS)
+        manual += any(s in bio_lower for s in engine.MANUAL_SIGNALS)
+
+    all_text = ''.join(' ' + bio for bio in bios).lower()
+    tools = [tool for tool in engine.WORKAROUND_TO_DECISION if tool in all_text]
+
+    return {'docs': docs, 'business': business, 'counts': (frequency, volume, manual), 'tools': tools}
+
+
+def automaton_signal_stages(bios: List[str]) -> Dict:
+    docs = []
+    bio_hits = []
+    for bio in bios:
+        phrases, hits = engine.preprocess_bio(bio)
+        docs.append(engine.bertopic_doc(bio, phrases))
+        bio_hits.append(hits)
+
+    business = engine.count_business_signals_per_bio(bios, bio_hits)
+    engine.calculate_d2p_binary_score([], bios, len(bios), bio_hits=bio_hits)
+    counts = tuple(sum(1 for hits in bio_hits if k in hits) for k in ('frequency', 'volume', 'manual'))
+
+    all_tools = set().union(*(hits.get('workaround', ()) for hits in bio_hits))
+    tools = [w['tool'] for w in engine.detect_workarounds_and_decisions('', hits={'workaround': all_tools})]
+
+    return {'docs': docs, 'business': business, 'counts': counts, 'tools': tools}
+
+
+def synthetic_bios(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = [t for terms in engine.SIGNAL_LEXICONS.values() for t in terms]
+    bios = []
+    for _ in range(n):
+        words = [rng.choice(vocabulary) if rng.random() < 0.25 else rng.choice(FILLER)
+                 for _ in range(rng.randint(6, 40))]
+        bio = ' '.join(words)
+        bios.append(bio.upper() if rng.random() < 0.05 else bio)
+    return bios
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the D2P lexicon automaton")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[5000, 50000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Automaton backend: {engine.LEXICON_MATCHER.backend}")
+    print(f"{'bios':>8} | {'substring loops':>16} | {'automaton':>10} | {'speedup':>7} | identical")
+    print("-" * 62)
+
+    for n in args.sizes:
+        bios = synthetic_bios(n, args.seed)
+
+        t0 = time.perf_counter()
+        expected = legacy_signal_stages(bios)
+        legacy_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        actual = automaton_signal_stages(bios)
+        automaton_s = time.perf_counter() - t0
+
+        identical = expected == actual
+        print(f"{n:>8} | {legacy_s:>15.2f}s | {automaton_s:>9.2f}s | {legacy_s / automaton_s:>6.1f}x | {identical}")
+        if not identical:
+            raise SystemExit(f"Mismatch at {n} bios — automaton diverges from substring semantics")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent analyses with and without a thread budget
+
+Starts 1, 2, 4 … one-shot engine processes at the same time on the same
+synthetic market (see bench_d2p_lexicon) and measures the makespan, mean job
+latency and throughput. Each concurrency level runs twice:
+
+    default   no budget — every runtime sizes its pools to all cores
+    budget    D2P_THREADS = cores / concurrency (at least 1) per job
+
+Caches (result, embeddings, topic models) are disabled so every job encodes
+and fits; the LLM step is skipped (no API key in the children), so jobs
+fall back to the data-only decisions.
+
+Uso:
+    python scripts/bench_d2p_threads.py [--concurrency 1 2 4] [--n 2000] [--profile fast]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'd2p_analysis_engine.py')
+
+
+def make_payload(n: int, seed: int, profile: str) -> bytes:
+    from bench_d2p_lexicon import synthetic_bios
+
+    leads = [
+        {'lead_id': f'bench-{i}', 'username': f'bench{i}', 'bio': bio, 'profession': 'Bench',
+         'business_category': 'bench', 'similarity': 0.8}
+        for i, bio in enumerate(synthetic_bios(n, seed))
+    ]
+    return json.dumps({
+        'market_name': 'Bench threads',
+        'version_id': 'bench_threads',
+        'leads': leads,
+        'compute_profile': profile,
+        'use_result_cache': False,
+        'use_embedding_cache': False,
+        'reuse_topic_model': False,
+        'use_llm_cache': False,
+    }).encode('utf-8')
+
+
+def run_concurrent(payload: bytes, concurrency: int, threads: Optional[int], cache_dir: str) -> Dict:
+    env = {k: v for k, v in os.environ.items() if k not in ('OPENAI_API_KEY', 'D2P_LLM_CLIENT_FACTORY', 'D2P_THREADS')}
+    env['D2P_CACHE_DIR'] = cache_dir
+    if threads:
+        env['D2P_THREADS'] = str(threads)
+
+    t0 = time.perf_counter()
+    procs = []
+    for _ in range(concurrency):
+        proc = subprocess.Popen([sys.executable, ENGINE], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, env=env)
+        procs.append((proc, time.perf_counter()))
+    for proc, _ in procs:
+        proc.stdin.write(payload)
+        proc.stdin.close()
+
+    latencies: List[float] = []
+    reported = None
+    for proc, started in procs:
+        result = json.loads(proc.stdout.read() or b'{}')
+        proc.wait()
+        latencies.append(time.perf_counter() - started)
+        if not result.get('success'):
+            return {'error': str(result.get('error', f'exit code {proc.returncode}'))[:100]}
+        reported = result.get('threads')
+    makespan = time.perf_counter() - t0
+    return {
+        'makespan_s': makespan,
+        'mean_latency_s': sum(latencies) / len(latencies),
+        'jobs_per_min': concurrency / makespan * 60,
+        'threads': reported,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark D2P throughput under a thread budget")
+    parser.add_argument("--concurrency", type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--profile", default='fast', help="Compute profile (fast = multi-threaded UMAP)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    payload = make_payload(args.n, args.seed, args.profile)
+    print(f"{args.n} leads per job, profile {args.profile}, {cores} cores")
+    print(f"{'jobs':>4} | {'mode':<8} | {'threads/job':>11} | {'makespan':>8} | {'latency':>8} | {'jobs/min':>8} | speedup")
+    print("-" * 78)
+
+    for concurrency in args.concurrency:
+        baseline = None
+        for mode, threads in (('default', None), ('budget', max(1, cores // concurrency))):
+            with tempfile.TemporaryDirectory(prefix='d2p_bench_') as cache_dir:
+                result = run_concurrent(payload, concurrency, threads, cache_dir)
+            if 'error' in result:
+                print(f"{concurrency:>4} | {mode:<8} | {result['error']}")
+                continue
+            baseline = baseline or result['jobs_per_min']
+            torch_threads = (result['threads'] or {}).get('torch', '?')
+            print(f"{concurrency:>4} | {mode:<8} | {threads or f'all ({torch_threads})':>11} | "
+                  f"{result['makespan_s']:>7.1f}s | {result['mean_latency_s']:>7.1f}s | "
+                  f"{result['jobs_per_min']:>8.1f} | {result['jobs_per_min'] / baseline:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
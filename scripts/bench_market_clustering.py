@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-market BERTopic fits vs one global fit sliced per market
+
+Builds synthetic markets (see bench_d2p_lexicon for the bios) whose
+embeddings mix themes shared across markets with market-specific ones, then
+runs market-demand-discovery both ways on the same data:
+
+    per_market  analyze_markets — one UMAP + HDBSCAN per market (--workers processes)
+    global      analyze_markets_global — one fit on all leads, topics sliced per
+                market with per-market c-TF-IDF
+
+and reports total wall time, topics / friction units found and mean coverage.
+Embeddings are random clusters, so only the timings and the relative topic
+counts are meaningful, not the friction labels.
+
+Uso:
+    python scripts/bench_market_clustering.py [--markets 15] [--leads 200 5000] [--dims 1536] [--workers 1]
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'market-demand-discovery.py')
+
+
+def load_discovery():
+    spec = importlib.util.spec_from_file_location('market_demand_discovery', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_markets(mdd, n_markets: int, min_leads: int, max_leads: int, dims: int, seed: int) -> Dict:
+    from bench_d2p_lexicon import synthetic_bios
+
+    rng = np.random.default_rng(seed)
+    shared = rng.standard_normal((12, dims)) * 3
+    markets = {}
+    for mi in range(n_markets):
+        n = int(rng.integers(min_leads, max_leads + 1))
+        own = rng.standard_normal((6, dims)) * 3
+        centers = np.concatenate([shared[rng.choice(len(shared), 4, replace=False)], own])
+        embeddings = (centers[rng.integers(0, len(centers), n)] + rng.standard_normal((n, dims))).astype(np.float32)
+        data = mdd.MarketLeads(n)
+        for i, bio in enumerate(synthetic_bios(n, seed + mi)):
+            data.add(f'bench-{mi}-{i}', f'bench{i}', bio, None, embeddings[i])
+        markets[f'Mercado {mi:02d}'] = data.finish()
+    return markets
+
+
+def summarize(results: List[Dict], seconds: float) -> Dict:
+    ok = [r for r in results if 'error' not in r]
+    return {
+        'wall_s': seconds,
+        'markets': len(ok),
+        'topics': sum(r['topics_discovered'] for r in ok),
+        'friction_units': sum(r['metrics']['friction_count'] for r in ok),
+        'coverage': sum(r['coverage_percentage'] for r in ok) / max(1, len(ok)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark per-market vs global market clustering")
+    parser.add_argument("--markets", type=int, default=15)
+    parser.add_argument("--leads", type=int, nargs=2, default=[200, 5000], metavar=('MIN', 'MAX'))
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--workers", type=int, default=1, help="Processes for the per-market mode")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    mdd = load_discovery()
+    markets = synthetic_markets(mdd, args.markets, args.leads[0], args.leads[1], args.dims, args.seed)
+    n_total = sum(len(d) for d in markets.values())
+
+    # numba compiles UMAP / pynndescent on first use — keep that out of both timings.
+    # Forked per-market workers compile on their own, and must not be forked
+    # after this process has run numba / OpenMP code, so warm up after them.
+    smallest = min(markets, key=lambda m: len(markets[m]))
+
+    def warm_up():
+        mdd.analyze_market(smallest, markets[smallest])
+        mdd.analyze_markets_global({smallest: markets[smallest]})
+
+    runs = {}
+    if args.workers <= 1:
+        warm_up()
+    t0 = time.perf_counter()
+    runs['per_market'] = summarize(mdd.analyze_markets(markets, args.workers), time.perf_counter() - t0)
+    if args.workers > 1:
+        warm_up()
+    t0 = time.perf_counter()
+    runs['global'] = summarize(mdd.analyze_markets_global(markets), time.perf_counter() - t0)
+
+    print(f"\n{args.markets} markets, {n_total:,} leads, {args.dims} dims, per-market workers={args.workers}")
+    print(f"{'mode':<11} | {'wall':>7} | {'markets':>7} | {'topics':>6} | {'frictions':>9} | {'coverage':>8} | speedup")
+    print("-" * 72)
+    baseline = runs['per_market']['wall_s']
+    for mode, r in runs.items():
+        print(f"{mode:<11} | {r['wall_s']:>6.1f}s | {r['markets']:>7} | {r['topics']:>6} | "
+              f"{r['friction_units']:>9} | {r['coverage']:>7.1f}% | {baseline / r['wall_s']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,7 +15,9 @@ Pipeline (Node.js does steps 1-2, Python does steps 3-5):
 5. SCORE D2P → 5 critérios binários (Python)
 6. PRODUTO → Definição estruturada com MVP (Python)
 
-Input (stdin JSON):
+Input (stdin — NDJSON stream, Arrow IPC stream, or the legacy JSON envelope below;
+see read_input). NDJSON: first line = header fields below without "leads",
+then one lead per line; bios are preprocessed while the stream is arriving.
 {
     "market_name": "Advogados",
     "version_id": "advogados_v1_20260128",
@@ -23,12 +25,48 @@ Input (stdin JSON):
         {"lead_id": "uuid", "username": "x", "bio": "...", "profession": "Advogado",
          "business_category": "juridico", "similarity": 0.82},
         ...
-    ]
+    ],
+    "view_mode": "empresa",              // optional, empresa | cliente
+    "view_modes": ["empresa", "cliente"], // optional, several perspectives over the same leads in one
+                                         // run (LLM prompts in parallel); top level = first, all under "perspectives"
+    "dedup": true,                       // optional, encode exact / near-duplicate docs once; saves encode
+                                         // time only, every lead still clusters (default D2P_DEDUP)
+    "use_embedding_cache": true,         // optional, default true (encoder: D2P_ENCODER_BACKEND=torch|onnx,
+                                         // D2P_ENCODER_MAX_SEQ_LENGTH, D2P_ENCODER_BATCH_TOKENS)
+    "reuse_topic_model": true,           // optional, warm start from the stored market model
+    "force_refit": false,                // optional, always refit (and replace the stored model); never
+                                         // answered from the result cache
+    "scale_mode": null,                  // optional, fit on a coreset; null = auto above D2P_CORESET_THRESHOLD
+    "compute_profile": "exact",          // optional, exact | fast | huge (see d2p_backends);
+                                         // "reducer" / "clusterer" override the profile's backends
+    "sweep": false,                      // optional, true or {"min_cluster_size": [...], "min_samples": [...],
+                                         // "workers", "topics_min", "topics_max"}: reduce once, grid-search
+                                         // HDBSCAN in parallel, fit the best config (see d2p_sweep)
+    "threads": null,                     // optional, thread budget for torch / numba / BLAS / tokenizers /
+                                         // onnxruntime in this run (default D2P_THREADS; see d2p_threads)
+    "deadline_ms": null,                 // optional, time budget in ms (> 0): degrade in order (sample
+                                         // leads, cheaper reducer, shorter prompt, skip LLM → "partial") to
+                                         // finish in time; "deadline" reports what was applied and
+                                         // leads_sampled, the leads actually clustered (see d2p_deadline)
+    "trace_memory": false,               // optional, tracemalloc peaks per span (default D2P_TRACE_MEMORY)
+    "trace_file": null,                  // optional, write a Chrome trace here (default under D2P_TRACE_DIR)
+    "use_result_cache": true,            // optional, reuse the stored result for an identical lead set
+                                         // (only runs whose owner decisions came from the LLM are stored)
+    "force_refresh": false,              // optional, recompute even on a cache hit (and overwrite it)
+    "use_llm_cache": true,               // optional, reuse parsed LLM decisions for an identical prompt
+    "force_llm": false                   // optional, call the LLM even when the topics match the previous
+                                         // version's (see D2P_DECISION_REUSE_THRESHOLD); skips the LLM cache
 }
+Instead of "leads", a "session_id" from d2p_search_and_store makes the engine
+read d2p_search_results itself (see read_session_leads).
+
+Long-lived mode: scripts/d2p_worker.py loads this module once and serves
+many run_analysis jobs over JSON lines (stdin/stdout) from a pre-forked pool.
 
 Output:
 {
     "success": true,
+    "cache": "miss",                     // "hit" → stored result for the same lead-set fingerprint
     "product": {
         "name": "LegalGate",
         "type": "gatekeeper",
@@ -43,19 +81,40 @@ import sys
 import json
 import re
 import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Set, Tuple, Optional
+
+# Thread caps must be in the environment before torch / numba / BLAS load
+from d2p_threads import apply_budget, budget_from_env, configure_env, current_budget
+configure_env(budget_from_env())
 
 try:
     from bertopic import BERTopic
-    from umap import UMAP
-    from hdbscan import HDBSCAN
     from sklearn.feature_extraction.text import CountVectorizer
     from sentence_transformers import SentenceTransformer
 except ImportError as e:
     print(json.dumps({"success": False, "error": f"Missing dependency: {e}"}))
     sys.exit(1)
 
+from d2p_embedding_cache import EmbeddingCache, encode_with_cache
+from d2p_lexicon import LexiconMatcher
+from d2p_timing import StageTimer
+from d2p_backends import make_clusterer, make_reducer, resolve_profile
+from d2p_cache import SqliteCache, fingerprint, make_key
+from d2p_decision_store import DecisionStore, match_topics, topic_signature
+from d2p_coreset import coreset_indices, coreset_report
+from d2p_deadline import Deadline
+from d2p_dedup import dedup_docs
+from d2p_onnx_encoder import (DEFAULT_BATCH_TOKENS, DEFAULT_MAX_SEQ_LENGTH, OnnxSentenceEncoder,
+                              onnx_encoder_available)
+from d2p_prompt import count_tokens, fit_topics_to_budget
+from d2p_sweep import ReducedMatrixCache, SweepRunner, default_grid, reduce_once
+from d2p_topic_store import TopicModelStore, centroid_drift, doc_hash
+
 try:
     from openai import OpenAI
     _openai_available = True
@@ -71,17 +130,136 @@ MIN_SAMPLES = 20
 N_NEIGHBORS = 15
 N_COMPONENTS = 10
 
+# Named (reducer, clusterer) pairs — see d2p_backends.COMPUTE_PROFILES
+DEFAULT_COMPUTE_PROFILE = os.environ.get('D2P_COMPUTE_PROFILE', 'exact')
+
 EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+
+# Encoder backend: torch (SentenceTransformer) or onnx (int8 ONNX Runtime,
+# see d2p_onnx_encoder; falls back to torch when onnxruntime is missing)
+ENCODER_BACKEND = os.environ.get('D2P_ENCODER_BACKEND', 'torch')
+if ENCODER_BACKEND not in ('torch', 'onnx'):
+    print(f"[D2P] Unknown D2P_ENCODER_BACKEND '{ENCODER_BACKEND}', using torch", file=sys.stderr)
+    ENCODER_BACKEND = 'torch'
+elif ENCODER_BACKEND == 'onnx' and not onnx_encoder_available():
+    print("[D2P] D2P_ENCODER_BACKEND=onnx needs onnxruntime + tokenizers, using torch", file=sys.stderr)
+    ENCODER_BACKEND = 'torch'
+ENCODER_MAX_SEQ_LENGTH = int(os.environ.get('D2P_ENCODER_MAX_SEQ_LENGTH', str(DEFAULT_MAX_SEQ_LENGTH)))
+ENCODER_BATCH_TOKENS = int(os.environ.get('D2P_ENCODER_BATCH_TOKENS', str(DEFAULT_BATCH_TOKENS)))
+
+# Identity of the vectors: embedding cache, topic/decision stores and the
+# result cache key use it, so switching backend or sequence length never
+# mixes vectors from different encoders. Unchanged for the default encoder.
+if ENCODER_BACKEND == 'torch' and ENCODER_MAX_SEQ_LENGTH == DEFAULT_MAX_SEQ_LENGTH:
+    EMBEDDING_MODEL_ID = EMBEDDING_MODEL
+else:
+    EMBEDDING_MODEL_ID = f"{EMBEDDING_MODEL}:{'onnx-int8' if ENCODER_BACKEND == 'onnx' else 'torch'}:{ENCODER_MAX_SEQ_LENGTH}"
+
+# Bump whenever a change alters run_analysis output for the same input —
+# it is part of the result cache key
+ENGINE_VERSION = "2026.10.2"
 _sentence_model = None
 
-def get_sentence_model() -> SentenceTransformer:
+def get_sentence_model():
+    """SentenceTransformer, or OnnxSentenceEncoder with D2P_ENCODER_BACKEND=onnx (same encode API)."""
     global _sentence_model
     if _sentence_model is None:
-        print(f"[D2P] Loading model: {EMBEDDING_MODEL}", file=sys.stderr)
-        _sentence_model = SentenceTransformer(EMBEDDING_MODEL)
+        print(f"[D2P] Loading model: {EMBEDDING_MODEL} ({ENCODER_BACKEND}, "
+              f"max_seq_length={ENCODER_MAX_SEQ_LENGTH})", file=sys.stderr)
+        if ENCODER_BACKEND == 'onnx':
+            _sentence_model = OnnxSentenceEncoder(
+                EMBEDDING_MODEL,
+                os.path.join(CACHE_DIR, 'onnx'),
+                max_seq_length=ENCODER_MAX_SEQ_LENGTH,
+                batch_tokens=ENCODER_BATCH_TOKENS,
+                intra_op_threads=current_budget() or 0,
+            )
+        else:
+            _sentence_model = SentenceTransformer(EMBEDDING_MODEL)
+            _sentence_model.max_seq_length = ENCODER_MAX_SEQ_LENGTH
     return _sentence_model
 
 
+# Local caches (embeddings, and later results) live under one directory
+CACHE_DIR = os.environ.get('D2P_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+EMBEDDING_CACHE_MAX_MB = int(os.environ.get('D2P_EMBEDDING_CACHE_MAX_MB', '2048'))
+_embedding_cache = None
+_embedding_cache_pid = None
+
+# Whole-result cache keyed by the lead-set fingerprint (D2P_RESULT_CACHE=0 disables)
+RESULT_CACHE_TTL_HOURS = float(os.environ.get('D2P_RESULT_CACHE_TTL_HOURS', '24'))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('D2P_RESULT_CACHE_MAX_ENTRIES', '500'))
+_result_cache = None
+_result_cache_pid = None
+
+def get_result_cache() -> Optional[SqliteCache]:
+    """Per-process result cache (reopened after fork). None when disabled via D2P_RESULT_CACHE=0."""
+    global _result_cache, _result_cache_pid
+    if os.environ.get('D2P_RESULT_CACHE', '1') == '0':
+        return None
+    if _result_cache is None or _result_cache_pid != os.getpid():
+        _result_cache = SqliteCache(
+            os.path.join(CACHE_DIR, 'results.sqlite'),
+            ttl_seconds=RESULT_CACHE_TTL_HOURS * 3600,
+            max_entries=RESULT_CACHE_MAX_ENTRIES,
+        )
+        _result_cache_pid = os.getpid()
+    return _result_cache
+
+
+# Input fields besides the lead set that change the result; the topic model
+# options decide between a warm start and a cold fit
+RESULT_KEY_OPTIONS = ('view_modes', 'compute_profile', 'reducer', 'clusterer', 'scale_mode', 'sweep', 'dedup',
+                      'reuse_topic_model', 'force_refit')
+# Defaults of the options above, so omitting one keys like passing its default
+RESULT_KEY_DEFAULTS = {'reuse_topic_model': True, 'force_refit': False}
+
+
+def lead_set_fingerprint(lead_ids: List[str], bios: List[str]) -> str:
+    """Order-independent fingerprint of the lead_id:bio-hash set."""
+    return fingerprint(f"{lead_id}:{doc_hash(bio)}" for lead_id, bio in zip(lead_ids, bios))
+
+
+def result_cache_key(input_data: Dict, lead_set: str) -> str:
+    """(market, view mode, engine version, options, lead_set_fingerprint)."""
+    return make_key(
+        market_name=input_data.get('market_name', 'Unknown'),
+        view_mode=input_data.get('view_mode', 'empresa'),
+        engine_version=ENGINE_VERSION,
+        embedding_model=EMBEDDING_MODEL_ID,
+        options={k: input_data.get(k, RESULT_KEY_DEFAULTS.get(k)) for k in RESULT_KEY_OPTIONS},
+        lead_set=lead_set,
+    )
+
+
+# Per-stage timings: D2P_TRACE_DIR writes a Chrome trace per run,
+# D2P_TRACE_MEMORY=1 adds tracemalloc heap peaks to every span
+TRACE_DIR = os.environ.get('D2P_TRACE_DIR', '')
+TRACE_MEMORY = os.environ.get('D2P_TRACE_MEMORY', '0') == '1'
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Per-process embedding cache (reopened after fork). None when disabled via D2P_EMBEDDING_CACHE=0."""
+    global _embedding_cache, _embedding_cache_pid
+    if os.environ.get('D2P_EMBEDDING_CACHE', '1') == '0':
+        return None
+    if _embedding_cache is None or _embedding_cache_pid != os.getpid():
+        _embedding_cache = EmbeddingCache(
+            os.path.join(CACHE_DIR, 'embeddings'),
+            max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+        )
+        _embedding_cache_pid = os.getpid()
+    return _embedding_cache
+
+
+def lead_bio_text(lead: Dict) -> str:
+    """Bio as analysed by the pipeline: "profession. bio" when profession is known."""
+    bio = lead.get('bio', '') or ''
+    profession = lead.get('profession', '') or ''
+    if profession:
+        bio = f"{profession}. {bio}"
+    return bio
+
+
 # ==============================================================================
 # D2P FRAMEWORK - WORKAROUND → DECISÃO
 # ==============================================================================
@@ -252,139 +430,41 @@ BUSINESS_OWNER_SIGNALS = [
 ]
 
 
-def infer_business_owner_decisions(
-    market_name: str,
-    bio_business_signals: Dict[str, int],
-    n_leads: int,
-    topic_keywords: List[List[str]] = None,
-    representative_bios: List[List[str]] = None,
-    view_mode: str = 'empresa',
-) -> Dict[str, Any]:
-    """
-    Infer decisions using GPT-4o-mini.
-    view_mode='empresa': business owner decisions (default).
-    view_mode='cliente': client/buyer decisions.
-    Returns empty if LLM unavailable — no heuristic fallback.
-    """
-    market_lower = market_name.lower()
-    intermediary_signals = ['agência', 'agencia', 'consultoria', 'assessoria',
-                           'marketing digital', 'social media', 'gestão de']
-    is_intermediary = any(sig in market_lower for sig in intermediary_signals)
-
-    # Collect business signal summary for context
-    signal_summary = _summarize_business_signals(bio_business_signals, n_leads)
-
-    # Try LLM
-    llm_result = _infer_via_llm(market_name, signal_summary, is_intermediary, topic_keywords, representative_bios, view_mode)
-
-    if llm_result:
-        return {
-            'owner_decisions': llm_result['decisions'],
-            'evidence': llm_result['evidence'],
-            'is_intermediary': is_intermediary,
-            'business_signal_counts': _count_signal_groups(bio_business_signals),
-            'source': 'llm',
-        }
-
-    # No fallback — better to return empty than to invent wrong decisions
-    print(f"[D2P] LLM inference failed, no owner decisions available", file=sys.stderr)
-    return {
-        'owner_decisions': [],
-        'evidence': ['LLM indisponível — owner decisions não geradas'],
-        'is_intermediary': is_intermediary,
-        'business_signal_counts': _count_signal_groups(bio_business_signals),
-        'source': 'none',
-    }
-
-
-def _summarize_business_signals(signals: Dict[str, int], n_leads: int) -> str:
-    """Create a human-readable summary of business signals found in bios."""
-    if not signals:
-        return "Nenhum sinal de dor operacional encontrado diretamente nas bios."
-
-    parts = []
-    sorted_signals = sorted(signals.items(), key=lambda x: -x[1])[:10]
-    for term, count in sorted_signals:
-        pct = count / n_leads * 100
-        parts.append(f'"{term}" em {count} bios ({pct:.0f}%)')
-    return "Termos de negócio encontrados nas bios: " + ", ".join(parts)
-
-
-def _count_signal_groups(bio_business_signals: Dict[str, int]) -> Dict[str, int]:
-    margin_terms = ['margem', 'lucro', 'lucrativo', 'rentável', 'rentabilidade',
-                    'precificação', 'preço', 'fee', 'ticket', 'custo', 'roi']
-    scope_terms = ['escopo', 'retrabalho', 'refação', 'refazer', 'ajuste',
-                   'briefing', 'scope creep']
-    team_terms = ['time', 'equipe', 'colaborador', 'freelancer', 'terceirizar',
-                  'capacidade', 'escalar', 'delegar', 'contratar']
-    churn_terms = ['churn', 'cancelamento', 'cancelar', 'reter', 'retenção',
-                   'contrato', 'proposta', 'sla']
-
-    return {
-        'margin': sum(bio_business_signals.get(s, 0) for s in margin_terms),
-        'scope': sum(bio_business_signals.get(s, 0) for s in scope_terms),
-        'team': sum(bio_business_signals.get(s, 0) for s in team_terms),
-        'churn': sum(bio_business_signals.get(s, 0) for s in churn_terms),
-    }
-
-
-def _infer_via_llm(
-    market_name: str,
-    signal_summary: str,
-    is_intermediary: bool,
-    topic_keywords: List[List[str]] = None,
-    representative_bios: List[List[str]] = None,
-    view_mode: str = 'empresa',
-) -> Optional[Dict[str, Any]]:
-    """Call GPT-4o-mini to infer decisions. view_mode='cliente' adapts prompt for client perspective."""
-    api_key = os.environ.get('OPENAI_API_KEY')
-    if not api_key or not _openai_available:
-        print(f"[D2P] OpenAI not available (key={'set' if api_key else 'missing'}, "
-              f"lib={'ok' if _openai_available else 'missing'})", file=sys.stderr)
-        return None
+LLM_MODEL = "gpt-4o-mini"
+LLM_TEMPERATURE = 0.3
+LLM_MAX_TOKENS = 1000
+LLM_SYSTEM_PROMPT = (
+    "Você responde exclusivamente em JSON válido. Sem markdown. Você descreve COMPORTAMENTO OBSERVÁVEL. "
+    "NUNCA elege um sinal específico como critério. NUNCA racionaliza estratégia. Proibido: margem, ROI, "
+    "conversão, oportunidade perdida, percentuais inventados, termos específicos como critério de decisão. "
+    "REGRA CRÍTICA: Decisões genéricas que servem para qualquer mercado são PROIBIDAS. 'Respondo agora ou "
+    "depois?' e 'Esse contato merece minha atenção?' são exemplos de decisões PROIBIDAS por serem genéricas."
+)
 
-    if is_intermediary:
-        intermediary_ctx = (
-            "ATENÇÃO: Este é um negócio INTERMEDIÁRIO (agência/consultoria). "
-            "A dor é do DONO do negócio, não dos clientes que ele atende."
-        )
-    else:
-        intermediary_ctx = ""
+# Input token budget for system + user prompt; topic keywords and bios are
+# trimmed to fit (D2P_LLM_PROMPT_TOKEN_BUDGET=0 disables trimming)
+LLM_PROMPT_TOKEN_BUDGET = int(os.environ.get('D2P_LLM_PROMPT_TOKEN_BUDGET', '6000'))
 
-    # Collect BERTopic topic keywords for grounding
-    topic_keywords_str = ""
-    if topic_keywords:
-        topics_formatted = []
-        for i, kws in enumerate(topic_keywords):
-            if not kws:
-                continue
-            topic_line = f"Tópico {i}: palavras-chave=[{', '.join(kws[:6])}]"
-            # Attach representative bios if available
-            if representative_bios and i < len(representative_bios) and representative_bios[i]:
-                bios_sample = representative_bios[i][:2]  # max 2 bios per topic
-                bios_text = " | ".join(b[:150] for b in bios_sample)
-                topic_line += f" — exemplos de bios: \"{bios_text}\""
-            topics_formatted.append(topic_line)
-        topic_keywords_str = "- Tópicos BERTopic descobertos nos dados:\n  " + "\n  ".join(topics_formatted)
-
-    # CLIENT MODE: different prompt perspective
-    if view_mode == 'cliente':
-        prompt = f"""Analise os DADOS ABAIXO e identifique as decisões que o CLIENTE de {market_name} toma ANTES de contratar o serviço.
+# Static part of the user prompt per view mode. Nothing market-specific goes
+# here: the per-market DADOS block is appended last so every request shares
+# this prefix and the provider can serve it from its prompt cache.
+LLM_INSTRUCTIONS = {
+    'cliente': """Analise os DADOS no final desta mensagem e identifique as decisões que o CLIENTE do mercado analisado toma ANTES de contratar o serviço.
 
 REGRA FUNDAMENTAL:
 O dado só pode afirmar o que ele LITERALMENTE contém.
 Qualquer explicação causal é hipótese, não fricção.
-Se os dados são insuficientes, retorne {{"decisions": []}}.
+Se os dados são insuficientes, retorne {"decisions": []}.
 
 PERSPECTIVA: CLIENTE (não o dono do negócio)
-- Estas são pessoas que PRECISAM de serviços de {market_name}
+- Estas são pessoas que PRECISAM dos serviços do mercado analisado
 - As decisões são do ponto de vista de quem CONTRATA, não de quem oferece
 - Exemplos para Advogado-Cliente: "Contrato esse advogado ou busco outro?" / "Pago consulta particular ou busco gratuita?"
 - Exemplos para Agência-Cliente: "Terceirizo meu marketing ou faço in-house?" / "Invisto em agência ou contrato freelancer?"
 
 ESPECIFICIDADE DE MERCADO — REGRA OBRIGATÓRIA:
-- As decisões devem ser ESPECÍFICAS para clientes de {market_name}.
-- TESTE DE SUBSTITUIÇÃO: substitua "{market_name}" por outro mercado. Se a decisão continua fazendo sentido, está genérica demais — DESCARTE.
+- As decisões devem ser ESPECÍFICAS para clientes do mercado analisado.
+- TESTE DE SUBSTITUIÇÃO: substitua o mercado analisado por outro mercado. Se a decisão continua fazendo sentido, está genérica demais — DESCARTE.
 - Use os tópicos BERTopic como evidência obrigatória.
 
 DECISÃO — REGRAS:
@@ -400,35 +480,31 @@ FRICÇÃO — O QUE É PERMITIDO:
 - Falta de informação para decidir
 - Medo de fazer escolha errada
 
-DADOS:
-- Mercado analisado: {market_name} (perspectiva CLIENTE)
-- {signal_summary}
-{topic_keywords_str}
-
 Responda EXCLUSIVAMENTE em JSON válido (sem markdown, sem ```):
-{{
+{
   "decisions": [
-    {{
-      "decision": "Pergunta binária que o CLIENTE de {market_name} se faz — ESPECÍFICA para este mercado",
-      "friction": "Comportamento observável do cliente ao tentar decidir — ESPECÍFICO para {market_name}",
+    {
+      "decision": "Pergunta binária que o CLIENTE do mercado analisado se faz — ESPECÍFICA para este mercado",
+      "friction": "Comportamento observável do cliente ao tentar decidir — ESPECÍFICO para o mercado analisado",
       "product_type": "gatekeeper|triage|operational_decision",
       "weight": 0.0 a 1.0,
       "grounded_in": "Tópico N + evidência dos dados."
-    }}
+    }
   ]
-}}"""
-    else:
-        prompt = f"""Analise os DADOS ABAIXO e identifique as decisões operacionais repetitivas do DONO deste negócio.
+}
+
+""",
+    'empresa': """Analise os DADOS no final desta mensagem e identifique as decisões operacionais repetitivas do DONO deste negócio.
 
 REGRA FUNDAMENTAL:
 O dado só pode afirmar o que ele LITERALMENTE contém.
 Qualquer explicação causal é hipótese, não fricção.
-Se os dados são insuficientes, retorne {{"decisions": []}}.
+Se os dados são insuficientes, retorne {"decisions": []}.
 
 ESPECIFICIDADE DE MERCADO — REGRA OBRIGATÓRIA:
-- As decisões devem ser ESPECÍFICAS para {market_name}.
+- As decisões devem ser ESPECÍFICAS para o mercado analisado.
 - Se a decisão serve para qualquer mercado, está ERRADA. DESCARTE.
-- TESTE DE SUBSTITUIÇÃO: substitua "{market_name}" por "Padaria", "Advogado", "Personal Trainer". Se a decisão continua fazendo sentido para esses mercados, ela é genérica demais — DESCARTE.
+- TESTE DE SUBSTITUIÇÃO: substitua o mercado analisado por "Padaria", "Advogado", "Personal Trainer". Se a decisão continua fazendo sentido para esses mercados, ela é genérica demais — DESCARTE.
 - Use os tópicos BERTopic como evidência obrigatória — cada decisão DEVE citar qual tópico a fundamenta.
 
 EXEMPLOS DE DECISÕES GENÉRICAS PROIBIDAS (servem para QUALQUER mercado):
@@ -475,38 +551,351 @@ FRICÇÃO — O QUE É PROIBIDO:
 
 TESTE DE SANIDADE: Se amanhã o modelo descobrir que outro padrão é mais relevante, a decisão e a fricção continuam válidas? Se não, está enviesada.
 
-DADOS:
-- Mercado analisado: {market_name}
-- {intermediary_ctx}
-- {signal_summary}
-{topic_keywords_str}
-
 Responda EXCLUSIVAMENTE em JSON válido (sem markdown, sem ```):
-{{
+{
   "decisions": [
-    {{
-      "decision": "Pergunta binária CEGA que o dono se faz todo dia — ESPECÍFICA para {market_name} (NÃO pode servir para outro mercado)",
-      "friction": "Comportamento observável, sem eleger critério ou sinal — ESPECÍFICO para {market_name}",
+    {
+      "decision": "Pergunta binária CEGA que o dono se faz todo dia — ESPECÍFICA para o mercado analisado (NÃO pode servir para outro mercado)",
+      "friction": "Comportamento observável, sem eleger critério ou sinal — ESPECÍFICO para o mercado analisado",
       "product_type": "gatekeeper|triage|operational_decision",
       "weight": 0.0 a 1.0,
       "grounded_in": "Tópico N + evidência dos dados. Explique por que esta decisão NÃO se aplica a uma padaria ou advogado."
-    }}
+    }
   ]
-}}"""
+}
+
+""",
+}
+
+# Parsed LLM decisions cached by prompt hash (D2P_LLM_CACHE=0 disables)
+LLM_CACHE_TTL_HOURS = float(os.environ.get('D2P_LLM_CACHE_TTL_HOURS', '168'))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('D2P_LLM_CACHE_MAX_ENTRIES', '2000'))
+_llm_cache = None
+_llm_cache_pid = None
+
+def get_llm_cache() -> Optional[SqliteCache]:
+    """Per-process LLM response cache (reopened after fork). None when disabled via D2P_LLM_CACHE=0."""
+    global _llm_cache, _llm_cache_pid
+    if os.environ.get('D2P_LLM_CACHE', '1') == '0':
+        return None
+    if _llm_cache is None or _llm_cache_pid != os.getpid():
+        _llm_cache = SqliteCache(
+            os.path.join(CACHE_DIR, 'llm.sqlite'),
+            ttl_seconds=LLM_CACHE_TTL_HOURS * 3600,
+            max_entries=LLM_CACHE_MAX_ENTRIES,
+        )
+        _llm_cache_pid = os.getpid()
+    return _llm_cache
+
+
+# Client factory override: set_llm_client_factory() in-process, or
+# D2P_LLM_CLIENT_FACTORY="module:callable" for subprocess runs. The factory
+# returns an object exposing chat.completions.create() like the OpenAI client.
+_llm_client_factory = None
+
+def set_llm_client_factory(factory) -> None:
+    global _llm_client_factory
+    _llm_client_factory = factory
+
+
+def get_llm_client():
+    """OpenAI client (or the injected stub); None when unavailable."""
+    factory = _llm_client_factory
+    if factory is None and os.environ.get('D2P_LLM_CLIENT_FACTORY'):
+        import importlib
+        module_name, _, attr = os.environ['D2P_LLM_CLIENT_FACTORY'].partition(':')
+        factory = getattr(importlib.import_module(module_name), attr)
+    if factory is not None:
+        return factory()
+
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if not api_key or not _openai_available:
+        return None
+    return OpenAI(api_key=api_key)
+
+
+INTERMEDIARY_SIGNALS = ['agência', 'agencia', 'consultoria', 'assessoria',
+                        'marketing digital', 'social media', 'gestão de']
+
+
+def infer_business_owner_decisions(
+    market_name: str,
+    bio_business_signals: Dict[str, int],
+    n_leads: int,
+    topic_keywords: List[List[str]] = None,
+    representative_bios: List[List[str]] = None,
+    view_mode: str = 'empresa',
+    use_llm_cache: bool = True,
+    token_budget: Optional[int] = None,
+    timeout_s: Optional[float] = None,
+    allow_call: bool = True,
+) -> Dict[str, Any]:
+    """
+    Infer decisions using GPT-4o-mini.
+    view_mode='empresa': business owner decisions (default).
+    view_mode='cliente': client/buyer decisions.
+    Returns empty if LLM unavailable — no heuristic fallback.
+    token_budget / timeout_s / allow_call=False come from deadline degradations
+    (shorter prompt, bounded call, cache only); source is then 'skipped'.
+    """
+    market_lower = market_name.lower()
+    is_intermediary = any(sig in market_lower for sig in INTERMEDIARY_SIGNALS)
+
+    # Collect business signal summary for context
+    signal_summary = _summarize_business_signals(bio_business_signals, n_leads)
+
+    # Try LLM
+    llm_cache_stats = {'enabled': use_llm_cache and get_llm_cache() is not None, 'hits': 0, 'misses': 0}
+    llm_usage = {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0, 'latency_ms': 0.0}
+    llm_result = _infer_via_llm(market_name, signal_summary, is_intermediary, topic_keywords, representative_bios,
+                                view_mode, use_cache=use_llm_cache, cache_stats=llm_cache_stats,
+                                usage_stats=llm_usage, token_budget=token_budget, timeout_s=timeout_s,
+                                allow_call=allow_call)
+
+    if llm_result:
+        return {
+            'owner_decisions': llm_result['decisions'],
+            'evidence': llm_result['evidence'],
+            'is_intermediary': is_intermediary,
+            'business_signal_counts': _count_signal_groups(bio_business_signals),
+            'source': 'llm',
+            'llm_cache': llm_cache_stats,
+            'llm_usage': llm_usage,
+        }
+
+    # No fallback — better to return empty than to invent wrong decisions
+    if not allow_call:
+        return {
+            'owner_decisions': [],
+            'evidence': ['LLM pulado — prazo (deadline_ms) insuficiente, owner decisions não geradas'],
+            'is_intermediary': is_intermediary,
+            'business_signal_counts': _count_signal_groups(bio_business_signals),
+            'source': 'skipped',
+            'llm_cache': llm_cache_stats,
+            'llm_usage': llm_usage,
+        }
+    print(f"[D2P] LLM inference failed, no owner decisions available", file=sys.stderr)
+    return {
+        'owner_decisions': [],
+        'evidence': ['LLM indisponível — owner decisions não geradas'],
+        'is_intermediary': is_intermediary,
+        'business_signal_counts': _count_signal_groups(bio_business_signals),
+        'source': 'none',
+        'llm_cache': llm_cache_stats,
+        'llm_usage': llm_usage,
+    }
+
+
+# Decision reuse: a new version whose topics overlap the last LLM-inferred
+# version of the same market + view mode by at least DECISION_REUSE_THRESHOLD
+# gets that version's decisions without a GPT call
+DECISION_STORE_DIR = os.path.join(CACHE_DIR, 'decisions')
+DECISION_REUSE_THRESHOLD = float(os.environ.get('D2P_DECISION_REUSE_THRESHOLD', '0.85'))
+
+
+def infer_or_reuse_decisions(
+    market_name: str,
+    view_mode: str,
+    version_id: str,
+    signature: List[Dict[str, Any]],
+    bio_business_signals: Dict[str, int],
+    force_llm: bool = False,
+    **infer_kwargs,
+) -> Dict[str, Any]:
+    """
+    infer_business_owner_decisions, unless the stored decisions of a previous
+    version still fit this run's topics. The result carries 'decision_reuse'
+    with the similarity and topic matches behind the choice either way.
+    """
+    store = DecisionStore(DECISION_STORE_DIR)
+    previous = None if force_llm else store.load(market_name, view_mode)
+    reuse: Dict[str, Any] = {'reused': False, 'threshold': DECISION_REUSE_THRESHOLD}
+
+    if force_llm:
+        reuse['reason'] = 'force_llm'
+    elif previous is None:
+        reuse['reason'] = 'no_previous_version'
+    elif previous.get('embedding_model') != EMBEDDING_MODEL_ID:
+        reuse['reason'] = 'embedding_model_changed'
+    else:
+        match = match_topics(signature, previous.get('topics', []))
+        reuse.update({'from_version': previous.get('version_id'), 'similarity': match['similarity'],
+                      'topic_matches': match['matches']})
+        if match['similarity'] >= DECISION_REUSE_THRESHOLD and previous.get('decisions'):
+            reuse['reused'] = True
+            reuse['decisions'] = [d['decision'] for d in previous['decisions']]
+        else:
+            reuse['reason'] = 'topics_shifted'
+
+    if reuse['reused']:
+        print(f"[D2P] [{view_mode}] Reusing {len(reuse['decisions'])} decisions from {reuse['from_version']} "
+              f"(topic overlap {reuse['similarity']:.3f} >= {DECISION_REUSE_THRESHOLD})", file=sys.stderr)
+        market_lower = market_name.lower()
+        return {
+            'owner_decisions': previous['decisions'],
+            'evidence': previous.get('evidence', []),
+            'is_intermediary': any(sig in market_lower for sig in INTERMEDIARY_SIGNALS),
+            'business_signal_counts': _count_signal_groups(bio_business_signals),
+            'source': 'reused',
+            'llm_cache': {'enabled': False, 'hits': 0, 'misses': 0},
+            'llm_usage': {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0,
+                          'latency_ms': 0.0},
+            'decision_reuse': reuse,
+        }
+
+    if 'similarity' in reuse:
+        print(f"[D2P] [{view_mode}] Topics shifted since {reuse['from_version']} "
+              f"(overlap {reuse['similarity']:.3f} < {DECISION_REUSE_THRESHOLD}) — re-inferring", file=sys.stderr)
+    owner_analysis = infer_business_owner_decisions(
+        market_name=market_name,
+        bio_business_signals=bio_business_signals,
+        view_mode=view_mode,
+        **infer_kwargs,
+    )
+    if owner_analysis['source'] == 'llm' and owner_analysis['owner_decisions']:
+        try:
+            store.save(market_name, view_mode, version_id, EMBEDDING_MODEL_ID, signature, owner_analysis)
+        except OSError as e:
+            print(f"[D2P] Could not store decisions for reuse: {e}", file=sys.stderr)
+    owner_analysis['decision_reuse'] = reuse
+    return owner_analysis
+
+
+def _summarize_business_signals(signals: Dict[str, int], n_leads: int) -> str:
+    """Create a human-readable summary of business signals found in bios."""
+    if not signals:
+        return "Nenhum sinal de dor operacional encontrado diretamente nas bios."
+
+    parts = []
+    sorted_signals = sorted(signals.items(), key=lambda x: -x[1])[:10]
+    for term, count in sorted_signals:
+        pct = count / n_leads * 100
+        parts.append(f'"{term}" em {count} bios ({pct:.0f}%)')
+    return "Termos de negócio encontrados nas bios: " + ", ".join(parts)
+
+
+def _count_signal_groups(bio_business_signals: Dict[str, int]) -> Dict[str, int]:
+    margin_terms = ['margem', 'lucro', 'lucrativo', 'rentável', 'rentabilidade',
+                    'precificação', 'preço', 'fee', 'ticket', 'custo', 'roi']
+    scope_terms = ['escopo', 'retrabalho', 'refação', 'refazer', 'ajuste',
+                   'briefing', 'scope creep']
+    team_terms = ['time', 'equipe', 'colaborador', 'freelancer', 'terceirizar',
+                  'capacidade', 'escalar', 'delegar', 'contratar']
+    churn_terms = ['churn', 'cancelamento', 'cancelar', 'reter', 'retenção',
+                   'contrato', 'proposta', 'sla']
+
+    return {
+        'margin': sum(bio_business_signals.get(s, 0) for s in margin_terms),
+        'scope': sum(bio_business_signals.get(s, 0) for s in scope_terms),
+        'team': sum(bio_business_signals.get(s, 0) for s in team_terms),
+        'churn': sum(bio_business_signals.get(s, 0) for s in churn_terms),
+    }
+
+
+def _infer_via_llm(
+    market_name: str,
+    signal_summary: str,
+    is_intermediary: bool,
+    topic_keywords: List[List[str]] = None,
+    representative_bios: List[List[str]] = None,
+    view_mode: str = 'empresa',
+    use_cache: bool = True,
+    cache_stats: Optional[Dict[str, Any]] = None,
+    usage_stats: Optional[Dict[str, Any]] = None,
+    token_budget: Optional[int] = None,
+    timeout_s: Optional[float] = None,
+    allow_call: bool = True,
+) -> Optional[Dict[str, Any]]:
+    """
+    Call GPT-4o-mini to infer decisions. view_mode='cliente' adapts prompt for client perspective.
+    Parsed + filtered decisions are cached under a hash of model, temperature and the rendered prompts.
+    Token usage (prompt, cached, completion) and latency of the call are added to usage_stats.
+    token_budget overrides LLM_PROMPT_TOKEN_BUDGET; allow_call=False answers from the cache only.
+    """
+    cache_stats = cache_stats if cache_stats is not None else {'hits': 0, 'misses': 0}
+    usage_stats = usage_stats if usage_stats is not None else {}
+
+    if is_intermediary:
+        intermediary_ctx = (
+            "ATENÇÃO: Este é um negócio INTERMEDIÁRIO (agência/consultoria). "
+            "A dor é do DONO do negócio, não dos clientes que ele atende."
+        )
+    else:
+        intermediary_ctx = ""
+
+    # Static instructions first (identical across markets → provider prompt
+    # cache), per-market data last; topics are trimmed to the token budget
+    instructions = LLM_INSTRUCTIONS['cliente' if view_mode == 'cliente' else 'empresa']
+    if view_mode == 'cliente':
+        data_lines = [f"- Mercado analisado: {market_name} (perspectiva CLIENTE)", f"- {signal_summary}"]
+    else:
+        data_lines = [f"- Mercado analisado: {market_name}", f"- {intermediary_ctx}", f"- {signal_summary}"]
+    data_head = "DADOS:\n" + "\n".join(data_lines) + "\n"
+
+    token_budget = LLM_PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    topics_budget = None
+    if token_budget > 0:
+        fixed_tokens = count_tokens(LLM_SYSTEM_PROMPT + instructions + data_head, LLM_MODEL)
+        topics_budget = max(0, token_budget - fixed_tokens)
+    topic_keywords_str, trim = fit_topics_to_budget(topic_keywords, representative_bios, topics_budget, LLM_MODEL)
+    if trim['level'] or trim['topics_kept'] < trim['topics_total']:
+        print(f"[D2P] Prompt trimmed to {token_budget} tokens: level {trim['level']}, "
+              f"{trim['topics_kept']}/{trim['topics_total']} topics", file=sys.stderr)
+
+    prompt = instructions + data_head + topic_keywords_str
+    usage_stats.update({
+        'prompt_tokens_estimated': count_tokens(LLM_SYSTEM_PROMPT + prompt, LLM_MODEL),
+        'token_budget': token_budget or None,
+        'trim': trim,
+    })
+
+    llm_cache = get_llm_cache() if use_cache else None
+    cache_key = make_key(model=LLM_MODEL, temperature=LLM_TEMPERATURE, max_tokens=LLM_MAX_TOKENS,
+                         system=LLM_SYSTEM_PROMPT, prompt=prompt)
+    if llm_cache is not None:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            cache_stats['hits'] += 1
+            print(f"[D2P] LLM cache HIT — {len(cached['decisions'])} decisions", file=sys.stderr)
+            return cached
+        cache_stats['misses'] += 1
+
+    if not allow_call:
+        print(f"[D2P] LLM call skipped (deadline)", file=sys.stderr)
+        return None
+
+    client = get_llm_client()
+    if client is None:
+        api_key = os.environ.get('OPENAI_API_KEY')
+        print(f"[D2P] OpenAI not available (key={'set' if api_key else 'missing'}, "
+              f"lib={'ok' if _openai_available else 'missing'})", file=sys.stderr)
+        return None
 
     try:
-        client = OpenAI(api_key=api_key)
         print(f"[D2P] Calling GPT-4o-mini for owner pain inference...", file=sys.stderr)
 
+        t0 = time.perf_counter()
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=LLM_MODEL,
             messages=[
-                {"role": "system", "content": "Você responde exclusivamente em JSON válido. Sem markdown. Você descreve COMPORTAMENTO OBSERVÁVEL. NUNCA elege um sinal específico como critério. NUNCA racionaliza estratégia. Proibido: margem, ROI, conversão, oportunidade perdida, percentuais inventados, termos específicos como critério de decisão. REGRA CRÍTICA: Decisões genéricas que servem para qualquer mercado são PROIBIDAS. 'Respondo agora ou depois?' e 'Esse contato merece minha atenção?' são exemplos de decisões PROIBIDAS por serem genéricas."},
+                {"role": "system", "content": LLM_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.3,
-            max_tokens=1000,
+            temperature=LLM_TEMPERATURE,
+            max_tokens=LLM_MAX_TOKENS,
+            **({'timeout': timeout_s} if timeout_s else {}),
         )
+        usage_stats['latency_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+        usage_stats['calls'] = usage_stats.get('calls', 0) + 1
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            details = getattr(usage, 'prompt_tokens_details', None)
+            usage_stats['prompt_tokens'] = getattr(usage, 'prompt_tokens', None)
+            usage_stats['cached_tokens'] = (getattr(details, 'cached_tokens', 0) or 0) if details is not None else 0
+            usage_stats['completion_tokens'] = getattr(usage, 'completion_tokens', None)
+            print(f"[D2P] LLM usage: {usage_stats['prompt_tokens']} prompt tokens "
+                  f"({usage_stats['cached_tokens']} cached), {usage_stats['completion_tokens']} completion, "
+                  f"{usage_stats['latency_ms']:.0f}ms", file=sys.stderr)
 
         raw = response.choices[0].message.content.strip()
         # Clean potential markdown wrapping
@@ -562,7 +951,10 @@ Responda EXCLUSIVAMENTE em JSON válido (sem markdown, sem ```):
         for d in decisions[:3]:
             print(f"[D2P]   → {d['decision']}", file=sys.stderr)
 
-        return {'decisions': decisions, 'evidence': evidence}
+        inferred = {'decisions': decisions, 'evidence': evidence}
+        if llm_cache is not None and decisions:
+            llm_cache.put(cache_key, inferred)
+        return inferred
 
     except json.JSONDecodeError as e:
         print(f"[D2P] LLM returned invalid JSON: {e}", file=sys.stderr)
@@ -574,14 +966,16 @@ Responda EXCLUSIVAMENTE em JSON válido (sem markdown, sem ```):
 
 
 
-def count_business_signals_per_bio(bios: List[str]) -> Dict[str, int]:
+def count_business_signals_per_bio(
+    bios: List[str],
+    bio_hits: List[Dict[str, Set[str]]] = None
+) -> Dict[str, int]:
     """Count how many bios contain each business owner signal."""
-    counts = {}
-    for signal in BUSINESS_OWNER_SIGNALS:
-        count = sum(1 for bio in bios if signal in bio.lower())
-        if count > 0:
-            counts[signal] = count
-    return counts
+    if bio_hits is None:
+        bio_hits = [scan_signals(bio) for bio in bios]
+    found = Counter(term for hits in bio_hits for term in hits.get('business_owner', ()))
+    # Keep BUSINESS_OWNER_SIGNALS order: ties in the LLM summary sort depend on it
+    return {signal: found[signal] for signal in BUSINESS_OWNER_SIGNALS if found[signal] > 0}
 
 
 # ==============================================================================
@@ -591,7 +985,8 @@ def count_business_signals_per_bio(bios: List[str]) -> Dict[str, int]:
 def calculate_d2p_binary_score(
     detected_workarounds: List[Dict],
     lead_bios: List[str],
-    n_leads: int
+    n_leads: int,
+    bio_hits: List[Dict[str, Set[str]]] = None
 ) -> Dict[str, Any]:
     """
     Score D2P com 5 critérios binários.
@@ -609,17 +1004,11 @@ def calculate_d2p_binary_score(
     Score >= 4 = produto candidato forte
     """
     # Count signals across individual bios (proportional, not concatenated)
-    frequency_count = 0
-    volume_count = 0
-    manual_count = 0
-    for bio in lead_bios:
-        bio_lower = bio.lower()
-        if any(s in bio_lower for s in FREQUENCY_SIGNALS):
-            frequency_count += 1
-        if any(s in bio_lower for s in VOLUME_SIGNALS):
-            volume_count += 1
-        if any(s in bio_lower for s in MANUAL_SIGNALS):
-            manual_count += 1
+    if bio_hits is None:
+        bio_hits = [scan_signals(bio) for bio in lead_bios]
+    frequency_count = sum(1 for hits in bio_hits if 'frequency' in hits)
+    volume_count = sum(1 for hits in bio_hits if 'volume' in hits)
+    manual_count = sum(1 for hits in bio_hits if 'manual' in hits)
 
     # Proportional thresholds: signal must appear in >= 5% of bios to count
     min_proportion = 0.05
@@ -826,19 +1215,23 @@ def generate_product_definition(
 
 def detect_workarounds_and_decisions(
     text: str,
-    market_name: str = ''
+    market_name: str = '',
+    hits: Dict[str, Set[str]] = None
 ) -> List[Dict]:
     """
     Detecta workarounds (ferramentas reais) nas bios.
     Professions are no longer detected here — pipeline is blind.
     LLM is the only source of decisions.
+    Pass `hits` (from scan_signals) to skip re-scanning the text.
     """
-    text_lower = text.lower()
+    if hits is None:
+        hits = scan_signals(text)
+    found_tools = hits.get('workaround', ())
     detected_workarounds = []
 
-    # Detectar workarounds
+    # Detectar workarounds (WORKAROUND_TO_DECISION order)
     for tool, data in WORKAROUND_TO_DECISION.items():
-        if tool in text_lower:
+        if tool in found_tools:
             detected_workarounds.append({
                 'tool': tool,
                 **data
@@ -858,9 +1251,10 @@ def analyze_friction_unit(
     Workarounds contribute to friction_score as metadata.
     """
     combined_text = ' '.join(keywords + docs)
+    hits = scan_signals(combined_text)
 
     # Detectar workarounds only (no profession matching)
-    workarounds = detect_workarounds_and_decisions(combined_text, market_name)
+    workarounds = detect_workarounds_and_decisions(combined_text, market_name, hits=hits)
 
     # decision stays None — LLM is the only source of decisions
     dominant_decision = None
@@ -873,8 +1267,8 @@ def analyze_friction_unit(
         friction_score += 0.3 * min(len(workarounds), 3)
 
     # Detectar sinais de volume/frequência
-    volume_detected = any(s in combined_text.lower() for s in VOLUME_SIGNALS)
-    frequency_detected = any(s in combined_text.lower() for s in FREQUENCY_SIGNALS)
+    volume_detected = 'volume' in hits
+    frequency_detected = 'frequency' in hits
 
     if volume_detected:
         friction_score += 0.1
@@ -931,6 +1325,61 @@ DECISION_CONTEXT_NOUNS = [
     'equipe', 'time', 'colaborador', 'freelancer',
 ]
 
+# Every signal list, compiled once into a single automaton. scan_signals()
+# returns {lexicon: {terms found}} with the same semantics as `term in text`.
+SIGNAL_LEXICONS = {
+    'business_owner': BUSINESS_OWNER_SIGNALS,
+    'frequency': FREQUENCY_SIGNALS,
+    'volume': VOLUME_SIGNALS,
+    'manual': MANUAL_SIGNALS,
+    'operational_verb': OPERATIONAL_VERBS,
+    'context_noun': DECISION_CONTEXT_NOUNS,
+    'workaround': list(WORKAROUND_TO_DECISION),
+}
+LEXICON_MATCHER = LexiconMatcher(SIGNAL_LEXICONS)
+_OPERATIONAL_VERB_SET = frozenset(OPERATIONAL_VERBS)
+
+SENTENCE_SPLIT_RE = re.compile(r'[.!?\n|•⚡🔥✨💡🚀📲📱💼🎯✅❌➡️▶️🔸🔹]+')
+
+
+def scan_signals(text: str) -> Dict[str, Set[str]]:
+    """Single-pass scan of text against every D2P lexicon."""
+    return LEXICON_MATCHER.scan(text.lower())
+
+
+def _sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) of each fragment SENTENCE_SPLIT_RE.split(text) would return."""
+    spans = []
+    start = 0
+    for m in SENTENCE_SPLIT_RE.finditer(text):
+        spans.append((start, m.start()))
+        start = m.end()
+    spans.append((start, len(text)))
+    return spans
+
+
+def preprocess_bio(bio: str) -> Tuple[List[str], Dict[str, Set[str]]]:
+    """
+    One automaton pass over a bio: returns its operational phrases (see
+    extract_operational_phrases) and its per-lexicon signal hits.
+    """
+    bio_lower = bio.lower()
+    matches = list(LEXICON_MATCHER.iter_matches(bio_lower))
+    hits = LEXICON_MATCHER.group({term for _, _, term in matches})
+
+    phrases = []
+    if 'operational_verb' in hits:
+        verb_spans = [(a, b) for a, b, term in matches if term in _OPERATIONAL_VERB_SET]
+        for start, end in _sentence_spans(bio_lower):
+            sentence = bio_lower[start:end].strip()
+            if len(sentence) < 5:
+                continue
+            # A verb counts only if it lies inside this fragment (`verb in sentence`)
+            if any(start <= a and b <= end for a, b in verb_spans):
+                phrases.append(sentence)
+
+    return phrases, hits
+
 
 def extract_operational_phrases(bio: str) -> List[str]:
     """
@@ -944,28 +1393,18 @@ def extract_operational_phrases(bio: str) -> List[str]:
     producing topics like "qualificar leads" vs "agendar clientes"
     instead of 2 identical generic clusters.
     """
-    bio_lower = bio.lower()
-    phrases = []
-
-    # Split into sentences (rough: by punctuation and line breaks)
-    sentences = re.split(r'[.!?\n|•⚡🔥✨💡🚀📲📱💼🎯✅❌➡️▶️🔸🔹]+', bio_lower)
-
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if len(sentence) < 5:
-            continue
-
-        has_verb = any(verb in sentence for verb in OPERATIONAL_VERBS)
-        has_context = any(noun in sentence for noun in DECISION_CONTEXT_NOUNS)
+    # Sentences split by punctuation/line breaks/emoji bullets; a sentence is
+    # kept when it has an operational verb (with or without a context noun —
+    # both the high- and medium-value cases end up as phrases).
+    phrases, _ = preprocess_bio(bio)
+    return phrases
 
-        if has_verb and has_context:
-            # High-value: operational verb + business context
-            phrases.append(sentence.strip())
-        elif has_verb:
-            # Medium-value: operational verb alone
-            phrases.append(sentence.strip())
 
-    return phrases
+def bertopic_doc(bio: str, phrases: List[str]) -> str:
+    """Operational phrases joined as the document; fall back to the trimmed full bio."""
+    if phrases:
+        return ' | '.join(phrases)
+    return bio[:300] if len(bio) > 300 else bio
 
 
 def prepare_bertopic_docs(bios: List[str], market_name: str) -> List[str]:
@@ -983,14 +1422,10 @@ def prepare_bertopic_docs(bios: List[str], market_name: str) -> List[str]:
     extracted_count = 0
 
     for bio in bios:
-        phrases = extract_operational_phrases(bio)
+        phrases, _ = preprocess_bio(bio)
+        docs.append(bertopic_doc(bio, phrases))
         if phrases:
-            # Join operational phrases as the document
-            docs.append(' | '.join(phrases))
             extracted_count += 1
-        else:
-            # Fallback: use full bio but trimmed
-            docs.append(bio[:300] if len(bio) > 300 else bio)
 
     print(f"[D2P] Bio preprocessing: {extracted_count}/{len(bios)} bios had operational phrases extracted",
           file=sys.stderr)
@@ -998,6 +1433,139 @@ def prepare_bertopic_docs(bios: List[str], market_name: str) -> List[str]:
     return docs
 
 
+# ==============================================================================
+# LEAD INGESTION (incremental — works while leads are still arriving)
+# ==============================================================================
+
+class PreparedLeads:
+    """
+    Per-lead preprocessing accumulated one lead at a time: bio text, BERTopic
+    document and lexicon hits. Streaming readers feed it while stdin is still
+    being written, so only the derived data is kept — never the raw payload.
+    """
+
+    def __init__(self):
+        self.lead_ids: List[str] = []
+        self.bios: List[str] = []
+        self.docs: List[str] = []
+        self.bio_hits: List[Dict[str, Set[str]]] = []
+        self.similarities: List[float] = []
+        self.professions: Set[str] = set()
+        self.extracted_count = 0
+
+    def add(self, lead: Dict) -> None:
+        bio = lead_bio_text(lead)
+        phrases, hits = preprocess_bio(bio)
+        self.lead_ids.append(lead.get('lead_id') or '')
+        self.bios.append(bio)
+        self.docs.append(bertopic_doc(bio, phrases))
+        self.bio_hits.append(hits)
+        self.similarities.append(lead.get('similarity', 0) or 0)
+        if lead.get('profession'):
+            self.professions.add(lead['profession'])
+        if phrases:
+            self.extracted_count += 1
+
+    def extend(self, leads) -> 'PreparedLeads':
+        for lead in leads:
+            self.add(lead)
+        return self
+
+    def __len__(self) -> int:
+        return len(self.bios)
+
+
+def read_input(stream) -> Tuple[Dict, Optional[PreparedLeads]]:
+    """
+    Read the engine input from a binary stream. Accepted formats:
+
+    - Arrow IPC stream (first byte 0xFF): header JSON in the schema metadata
+      key "header", one row per lead in the record batches.
+    - NDJSON: first line is the header (market_name, version_id, view_mode, ...
+      without "leads"), then one lead object per line.
+    - Legacy JSON envelope {"market_name": ..., "leads": [...]} (fallback).
+
+    Streaming formats return (header, PreparedLeads) with every lead already
+    preprocessed as it arrived; the legacy envelope returns (payload, None).
+    """
+    first = stream.peek(1)[:1] if hasattr(stream, 'peek') else b''
+    if first == b'\xff':
+        import pyarrow.ipc
+
+        reader = pyarrow.ipc.open_stream(stream)
+        metadata = reader.schema.metadata or {}
+        header = json.loads(metadata.get(b'header', b'{}'))
+        prepared = PreparedLeads()
+        for batch in reader:
+            prepared.extend(batch.to_pylist())
+        return header, prepared
+
+    first_line = stream.readline()
+    if not first_line.strip():
+        rest = stream.read()
+        return (json.loads(rest) if rest.strip() else {}), None
+
+    try:
+        header = json.loads(first_line)
+    except json.JSONDecodeError:
+        # Pretty-printed legacy envelope spanning several lines
+        return json.loads(first_line + stream.read()), None
+
+    if 'leads' in header:
+        return header, None
+
+    prepared = PreparedLeads()
+    for line in stream:
+        if line.strip():
+            prepared.add(json.loads(line))
+    return header, prepared
+
+
+SESSION_READ_BATCH = 2000
+
+
+def read_session_leads(session_id: str, cleanup: bool = True) -> PreparedLeads:
+    """
+    Direct session read: stream the rows d2p_search_and_store staged for
+    `session_id` straight from Postgres with a server-side cursor, instead of
+    Node paging them through PostgREST and re-serialising them to stdin.
+    Needs DATABASE_URL (Supabase direct connection string) and psycopg2.
+    """
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("psycopg2 not installed (pip install psycopg2-binary)")
+
+    dsn = os.environ.get('DATABASE_URL') or os.environ.get('SUPABASE_DB_URL')
+    if not dsn:
+        raise RuntimeError("DATABASE_URL must be set for session_id input")
+
+    prepared = PreparedLeads()
+    columns = ('lead_id', 'username', 'bio', 'profession', 'business_category', 'similarity')
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn:
+            with conn.cursor(name=f"d2p_session_{os.getpid()}") as cur:
+                cur.itersize = SESSION_READ_BATCH
+                cur.execute(
+                    "SELECT lead_id::text, username, bio, profession, business_category, similarity::float8 "
+                    "FROM d2p_search_results WHERE session_id = %s ORDER BY similarity DESC",
+                    (session_id,),
+                )
+                for row in cur:
+                    prepared.add(dict(zip(columns, row)))
+
+        if cleanup:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM d2p_search_results WHERE session_id = %s", (session_id,))
+    finally:
+        conn.close()
+
+    print(f"[D2P] Read {len(prepared)} leads from session {session_id} (direct Postgres)", file=sys.stderr)
+    return prepared
+
+
 # ==============================================================================
 # BERTOPIC
 # ==============================================================================
@@ -1023,7 +1591,7 @@ def get_portuguese_stopwords() -> List[str]:
     ]
 
 
-def create_bertopic_model(n_docs: int) -> BERTopic:
+def bertopic_params(n_docs: int) -> Dict[str, int]:
     # More aggressive clustering for homogeneous datasets
     # For 603 docs: min_cluster=10, min_samples=3 → more granular topics
     # For 2000 docs: min_cluster=25, min_samples=8
@@ -1032,26 +1600,42 @@ def create_bertopic_model(n_docs: int) -> BERTopic:
 
     # Lower n_components for smaller datasets to avoid overfitting UMAP
     adjusted_n_components = min(N_COMPONENTS, max(3, n_docs // 100))
+    adjusted_n_neighbors = min(N_NEIGHBORS, max(2, n_docs // 10))
+
+    return {
+        'min_cluster_size': adjusted_min_cluster,
+        'min_samples': adjusted_min_samples,
+        'n_components': adjusted_n_components,
+        'n_neighbors': adjusted_n_neighbors,
+    }
+
+
+def create_bertopic_model(
+    n_docs: int,
+    profile: Optional[Dict[str, Any]] = None,
+    min_cluster_size: Optional[int] = None,
+    min_samples: Optional[int] = None,
+    umap_model=None,
+) -> BERTopic:
+    """BERTopic with heuristic parameters; explicit values (e.g. from a sweep) override them."""
+    profile = profile or resolve_profile(DEFAULT_COMPUTE_PROFILE)
+    params = bertopic_params(n_docs)
+    adjusted_min_cluster = min_cluster_size or params['min_cluster_size']
+    adjusted_min_samples = min_samples or params['min_samples']
+    adjusted_n_components = params['n_components']
+    adjusted_n_neighbors = params['n_neighbors']
 
     print(f"[D2P] BERTopic params: min_cluster={adjusted_min_cluster}, min_samples={adjusted_min_samples}, "
-          f"n_components={adjusted_n_components}, n_docs={n_docs}", file=sys.stderr)
-
-    umap_model = UMAP(
-        n_neighbors=min(N_NEIGHBORS, max(2, n_docs // 10)),
-        n_components=adjusted_n_components,
-        min_dist=0.05,  # slightly > 0 to spread clusters apart
-        metric='cosine',
-        random_state=42,
-        low_memory=True,
-        verbose=False
-    )
+          f"n_components={adjusted_n_components}, n_docs={n_docs}, profile={profile['name']} "
+          f"({profile['reducer']} + {profile['clusterer']})", file=sys.stderr)
 
-    hdbscan_model = HDBSCAN(
-        min_cluster_size=adjusted_min_cluster,
-        min_samples=adjusted_min_samples,
-        metric='euclidean',
-        cluster_selection_method='leaf',  # 'leaf' finds more fine-grained clusters than 'eom'
-        prediction_data=True
+    if umap_model is None:
+        umap_model = make_reducer(
+            profile['reducer'], adjusted_n_components, adjusted_n_neighbors, profile['deterministic']
+        )
+    hdbscan_model = make_clusterer(
+        profile['clusterer'], adjusted_min_cluster, adjusted_min_samples, adjusted_n_neighbors,
+        n_jobs=current_budget(),
     )
 
     vectorizer_model = CountVectorizer(
@@ -1073,118 +1657,609 @@ def create_bertopic_model(n_docs: int) -> BERTopic:
     )
 
 
+# Warm start: a stored model for the same market + view mode is reused
+# (transform only) unless the lead set moved too far from what it was fit on
+TOPIC_MODEL_DIR = os.path.join(CACHE_DIR, 'topic_models')
+TOPIC_REFIT_NEW_SHARE = float(os.environ.get('D2P_TOPIC_REFIT_NEW_SHARE', '0.25'))
+TOPIC_REFIT_DRIFT = float(os.environ.get('D2P_TOPIC_REFIT_DRIFT', '0.05'))
+TOPIC_REFIT_OUTLIER_GROWTH = float(os.environ.get('D2P_TOPIC_REFIT_OUTLIER_GROWTH', '0.15'))
+
+# Scale mode: above CORESET_THRESHOLD leads, fit on a coreset of CORESET_SIZE
+# and assign the rest out-of-sample in batches of CORESET_ASSIGN_BATCH
+CORESET_THRESHOLD = int(os.environ.get('D2P_CORESET_THRESHOLD', '8000'))
+CORESET_SIZE = int(os.environ.get('D2P_CORESET_SIZE', '4000'))
+CORESET_ASSIGN_BATCH = int(os.environ.get('D2P_CORESET_ASSIGN_BATCH', '5000'))
+
+# Dedup: exact and near-duplicate docs (MinHash estimate >= DEDUP_THRESHOLD)
+# are encoded once; each lead then clusters with its representative's
+# embedding, so densities, min_cluster_size and c-TF-IDF see every copy.
+# It saves encode time only: UMAP and HDBSCAN still run on every lead
+DEDUP_DEFAULT = os.environ.get('D2P_DEDUP', '1') == '1'
+DEDUP_THRESHOLD = float(os.environ.get('D2P_DEDUP_THRESHOLD', '0.85'))
+
+
+# BERTopic internals timed as sub-spans of a fit (reducer, clusterer, c-TF-IDF)
+BERTOPIC_STAGES = {
+    '_reduce_dimensionality': 'reduce',
+    '_cluster_embeddings': 'cluster',
+    '_extract_topics': 'ctfidf',
+}
+
+
+def fit_on_coreset(
+    docs: List[str],
+    embeddings,
+    similarities: Optional[List[float]],
+    sample_size: int,
+    profile: Optional[Dict[str, Any]] = None,
+    timer: Optional[StageTimer] = None,
+) -> Tuple[BERTopic, List[int], Dict[str, Any]]:
+    """Fit on a stratified sample, then assign every other doc via transform()."""
+    timer = timer or StageTimer()
+    sample_idx = coreset_indices(embeddings, similarities, sample_size)
+    print(f"[D2P] Scale mode: fitting on coreset of {len(sample_idx)}/{len(docs)} docs", file=sys.stderr)
+
+    topic_model = create_bertopic_model(len(sample_idx), profile)
+    with timer.instrument(topic_model, BERTOPIC_STAGES), timer.span('fit', docs=len(sample_idx)):
+        sample_topics, _ = topic_model.fit_transform([docs[i] for i in sample_idx], embeddings[sample_idx])
+
+    topics = [-1] * len(docs)
+    for i, t in zip(sample_idx, sample_topics):
+        topics[i] = int(t)
+
+    in_sample = set(sample_idx.tolist())
+    rest = [i for i in range(len(docs)) if i not in in_sample]
+    n_batches = 0
+    with timer.span('transform', docs=len(rest)):
+        for start in range(0, len(rest), CORESET_ASSIGN_BATCH):
+            batch = rest[start:start + CORESET_ASSIGN_BATCH]
+            batch_topics, _ = topic_model.transform([docs[i] for i in batch], embeddings[batch])
+            for i, t in zip(batch, batch_topics):
+                topics[i] = int(t)
+            n_batches += 1
+
+    return topic_model, topics, coreset_report(topics, sample_idx, n_batches)
+
+
+# Sweep mode: reduce once (cached under SWEEP_CACHE_DIR), then grid-search
+# HDBSCAN min_cluster_size / min_samples in parallel and fit the best config
+SWEEP_CACHE_DIR = os.path.join(CACHE_DIR, 'reduced')
+SWEEP_CACHE_MAX_ENTRIES = int(os.environ.get('D2P_SWEEP_CACHE_MAX_ENTRIES', '8'))
+
+
+def sweep_hdbscan(
+    docs: List[str],
+    embeddings,
+    options: Dict[str, Any],
+    profile: Dict[str, Any],
+    timer: Optional[StageTimer] = None,
+) -> Tuple[BERTopic, List[int], Dict[str, Any]]:
+    """
+    options: min_cluster_size / min_samples lists (default: grid around the
+    heuristic values), workers, topics_min, topics_max, use_cache.
+    """
+    timer = timer or StageTimer()
+    params = bertopic_params(len(docs))
+    cache = ReducedMatrixCache(SWEEP_CACHE_DIR, SWEEP_CACHE_MAX_ENTRIES) if options.get('use_cache', True) else None
+
+    if options.get('min_cluster_size') or options.get('min_samples'):
+        grid = [(int(mc), int(ms))
+                for mc in options.get('min_cluster_size') or [params['min_cluster_size']]
+                for ms in options.get('min_samples') or [params['min_samples']]]
+    else:
+        grid = default_grid(params['min_cluster_size'], params['min_samples'])
+
+    with SweepRunner(len(grid), options.get('workers') or current_budget()) as runner:
+        with timer.span('reduce') as span_args:
+            reducer, reduce_report = reduce_once(
+                embeddings, profile['reducer'], params['n_components'], params['n_neighbors'],
+                profile['deterministic'], cache,
+            )
+            span_args['cache'] = reduce_report['cache']
+
+        with timer.span('sweep_grid', configs=len(grid), workers=runner.workers):
+            report = runner.run(
+                reducer.reduced, grid,
+                topics_min=options.get('topics_min', 5),
+                topics_max=options.get('topics_max', 40),
+            )
+    best = report['best']
+    print(f"[D2P] Sweep: {report['configs']} configs on {report['workers']} worker(s) in {report['grid_ms']:.0f}ms "
+          f"(reduction {reduce_report['cache']}) → min_cluster={best['min_cluster_size']}, "
+          f"min_samples={best['min_samples']} (score {best['score']}, {best['topics']} topics, "
+          f"coverage {best['coverage']:.1%}, DBCV {best['dbcv']})", file=sys.stderr)
+
+    topic_model = create_bertopic_model(
+        len(docs), profile, best['min_cluster_size'], best['min_samples'], umap_model=reducer,
+    )
+    with timer.instrument(topic_model, BERTOPIC_STAGES), timer.span('fit', docs=len(docs)):
+        topics, _ = topic_model.fit_transform(docs, embeddings)
+
+    report['reduction'] = reduce_report
+    report['heuristic'] = {'min_cluster_size': params['min_cluster_size'], 'min_samples': params['min_samples']}
+    return topic_model, [int(t) for t in topics], report
+
+
+def fit_topic_model(
+    docs: List[str],
+    embeddings,
+    market_name: str,
+    view_mode: str,
+    reuse: bool = True,
+    force_refit: bool = False,
+    similarities: Optional[List[float]] = None,
+    scale_mode: Optional[bool] = None,
+    profile: Optional[Dict[str, Any]] = None,
+    timer: Optional[StageTimer] = None,
+    sweep: Optional[Dict[str, Any]] = None,
+) -> Tuple[BERTopic, List[int], Dict[str, Any]]:
+    """
+    Assign topics, reusing the market's stored model when possible.
+
+    warm → stored model, transform() only (UMAP transform + HDBSCAN approximate_predict)
+    cold → create_bertopic_model + fit_transform, then the model is stored;
+           in scale mode (None = auto above CORESET_THRESHOLD) the fit runs on
+           a coreset and status['coreset'] reports sample vs full coverage
+    sweep → always cold: HDBSCAN parameters come from sweep_hdbscan, whose
+           scoreboard is reported in status['sweep']
+    """
+    profile = profile or resolve_profile(DEFAULT_COMPUTE_PROFILE)
+    timer = timer or StageTimer()
+    backends = f"{profile['reducer']}+{profile['clusterer']}"
+    store = TopicModelStore(TOPIC_MODEL_DIR)
+    status: Dict[str, Any] = {'mode': 'cold', 'reason': 'disabled' if not reuse else 'no_stored_model'}
+    if force_refit:
+        status['reason'] = 'force_refit'
+    if sweep is not None:
+        status['reason'] = 'sweep'
+
+    with timer.span('topic_model_load'):
+        stored = store.load(market_name, view_mode) if reuse and not force_refit and sweep is None else None
+    if stored is not None:
+        topic_model, state = stored
+        known = set(state.get('doc_hashes', []))
+        current = {doc_hash(d) for d in docs}
+        new_share = len(current - known) / max(1, len(current))
+        same_space = state.get('embedding_model') == EMBEDDING_MODEL_ID
+        drift = centroid_drift(embeddings, state.get('centroid')) if same_space else 1.0
+        status.update({'new_lead_share': round(new_share, 4), 'drift': round(drift, 4)})
+
+        if not same_space:
+            status['reason'] = 'embedding_model_changed'
+        elif state.get('backends', 'umap+hdbscan') != backends:
+            status['reason'] = 'backends_changed'
+        elif new_share > TOPIC_REFIT_NEW_SHARE:
+            status['reason'] = 'new_lead_share'
+        elif drift > TOPIC_REFIT_DRIFT:
+            status['reason'] = 'centroid_drift'
+        else:
+            with timer.span('transform', docs=len(docs)):
+                topics, _ = topic_model.transform(docs, embeddings)
+            topics = [int(t) for t in topics]
+            outlier_share = sum(1 for t in topics if t == -1) / max(1, len(topics))
+            if outlier_share - state.get('outlier_share', 0) > TOPIC_REFIT_OUTLIER_GROWTH:
+                status.update({'reason': 'outlier_growth', 'warm_outlier_share': round(outlier_share, 4)})
+            else:
+                status.update({'mode': 'warm', 'reason': 'reused', 'outlier_share': round(outlier_share, 4),
+                               'fitted_at': state.get('fitted_at')})
+                print(f"[D2P] Topic model: WARM (new leads={new_share:.1%}, drift={drift:.4f})", file=sys.stderr)
+                return topic_model, topics, status
+
+    print(f"[D2P] Topic model: COLD ({status['reason']})", file=sys.stderr)
+    if scale_mode is None:
+        scale_mode = len(docs) > CORESET_THRESHOLD and sweep is None
+    if sweep is not None:
+        if scale_mode:
+            print(f"[D2P] Sweep runs on all {len(docs)} docs; scale_mode ignored", file=sys.stderr)
+        topic_model, topics, status['sweep'] = sweep_hdbscan(docs, embeddings, sweep, profile, timer)
+    elif scale_mode and len(docs) > CORESET_SIZE:
+        topic_model, topics, status['coreset'] = fit_on_coreset(
+            docs, embeddings, similarities, CORESET_SIZE, profile, timer=timer
+        )
+    else:
+        topic_model = create_bertopic_model(len(docs), profile)
+        with timer.instrument(topic_model, BERTOPIC_STAGES), timer.span('fit', docs=len(docs)):
+            topics, _ = topic_model.fit_transform(docs, embeddings)
+    topics = [int(t) for t in topics]
+    status['outlier_share'] = round(sum(1 for t in topics if t == -1) / max(1, len(topics)), 4)
+
+    if reuse:
+        try:
+            with timer.span('topic_model_save'):
+                store.save(market_name, view_mode, topic_model, docs, embeddings, topics,
+                           EMBEDDING_MODEL_ID, backends)
+        except Exception as e:
+            print(f"[D2P] Could not store topic model: {e}", file=sys.stderr)
+    return topic_model, topics, status
+
+
+# Deadline mode (input deadline_ms, see d2p_deadline): nominal per-doc costs,
+# scaled per run by the host speed measured on the encode stage
+DEADLINE_ENCODE_MS_PER_DOC = float(os.environ.get('D2P_DEADLINE_ENCODE_MS_PER_DOC', '4'))
+DEADLINE_FIT_MS_PER_DOC = {
+    'umap': 2.5,             # exact profile: seeded, single-threaded UMAP
+    'umap_parallel': 1.0,
+    'pca': 0.2,
+    'svd': 0.2,
+    'random_projection': 0.1,
+    'transform': 0.5,        # warm start: stored model, transform only
+}
+DEADLINE_LLM_MS = float(os.environ.get('D2P_DEADLINE_LLM_MS', '8000'))
+DEADLINE_SHORT_LLM_MS = float(os.environ.get('D2P_DEADLINE_SHORT_LLM_MS', '4000'))
+DEADLINE_SHORT_PROMPT_TOKENS = int(os.environ.get('D2P_DEADLINE_SHORT_PROMPT_TOKENS', '1500'))
+DEADLINE_OVERHEAD_MS = float(os.environ.get('D2P_DEADLINE_OVERHEAD_MS', '1000'))
+DEADLINE_MIN_LEADS = int(os.environ.get('D2P_DEADLINE_MIN_LEADS', '300'))
+# fast_reduction steps, cheapest last: (compute profile, reducer override)
+DEADLINE_REDUCTION_LADDER = (('fast', None), ('fast', 'pca'))
+
+
+def deadline_fit_ms(profile: Dict[str, Any], n_docs: int, warm: bool = False) -> float:
+    """Nominal topic model cost of n_docs under a compute profile (before the speed factor)."""
+    if warm:
+        key = 'transform'
+    elif profile['reducer'] == 'umap':
+        key = 'umap' if profile['deterministic'] else 'umap_parallel'
+    else:
+        key = profile['reducer']
+    return n_docs * DEADLINE_FIT_MS_PER_DOC[key]
+
+
 # ==============================================================================
 # MAIN ANALYSIS
 # ==============================================================================
 
-def run_analysis(input_data: Dict) -> Dict[str, Any]:
+VIEW_MODES = ('empresa', 'cliente')
+
+
+def build_perspective(
+    market_name: str,
+    view_mode: str,
+    owner_analysis: Dict[str, Any],
+    global_workarounds: List[Dict],
+    workaround_tools: List[str],
+    d2p_score: Dict[str, Any],
+) -> Dict[str, Any]:
+    """View-mode dependent part of the result, built from that perspective's LLM decisions."""
+    owner_decisions = owner_analysis['owner_decisions']
+    print(f"[D2P] [{view_mode}] Owner decisions inferred: {len(owner_decisions)}", file=sys.stderr)
+    for i, od in enumerate(owner_decisions[:3]):
+        print(f"[D2P]   #{i+1}: {od['decision']} (weight={od['weight']:.1f})", file=sys.stderr)
+
+    # Step 8: Determine product type (workarounds only, no profession templates)
+    product_type = determine_product_type(global_workarounds)
+
+    # Step 9: Get dominant decision and friction — ONLY from LLM
+    dominant_decision = None
+    dominant_friction = None
+
+    if owner_decisions:
+        top_owner = owner_decisions[0]
+        dominant_decision = top_owner['decision']
+        dominant_friction = top_owner['friction']
+        product_type_override = top_owner.get('product_type')
+        if product_type_override:
+            product_type['type'] = product_type_override
+
+    # No fallback. If LLM didn't find decisions, output stays None.
+    if not dominant_decision:
+        print(f"[D2P] [{view_mode}] No dominant decision — insufficient data for this market", file=sys.stderr)
+
+    # Step 10: Micro-decisions — ONLY from LLM owner decisions (no hardcoded templates)
+    micro_decisions = [od['decision'] for od in owner_decisions[1:]][:6]
+
+    print(f"[D2P] [{view_mode}] Micro-decisions: {len(micro_decisions)} (all from LLM)", file=sys.stderr)
+
+    # Step 11: Generate product definition
+    print(f"[D2P] [{view_mode}] Generating product definition...", file=sys.stderr)
+    product = generate_product_definition(
+        market_name=market_name,
+        dominant_decision=dominant_decision,
+        dominant_friction=dominant_friction,
+        product_type=product_type,
+        workaround_tools=workaround_tools,
+        d2p_score=d2p_score,
+        micro_decisions=micro_decisions,
+    )
+
+    return {
+        'search_mode': 'demand' if view_mode == 'cliente' else 'identity',
+        'dominant_pain': dominant_friction,
+        'dominant_decision': dominant_decision,
+        'product_type': product['type'],
+        'product_type_name': product['type_name'],
+        'product': product,
+        'product_definition': product['product_definition'],
+        'product_tagline': product['tagline'],
+        'mvp_does': product['mvp_does'],
+        'mvp_does_not': product['mvp_does_not'],
+        'owner_analysis': {
+            'decisions': [
+                {'decision': od['decision'], 'friction': od['friction'],
+                 'type': od['product_type'], 'weight': round(od['weight'], 2)}
+                for od in owner_decisions
+            ],
+            'evidence': owner_analysis['evidence'],
+            'is_intermediary': owner_analysis['is_intermediary'],
+            'business_signals': owner_analysis['business_signal_counts'],
+        },
+        'micro_decisions': micro_decisions,
+        'llm_cache': owner_analysis['llm_cache'],
+        'llm_usage': owner_analysis['llm_usage'],
+        'decision_reuse': owner_analysis['decision_reuse'],
+    }
+
+
+def run_analysis(input_data: Dict, prepared: Optional[PreparedLeads] = None) -> Dict[str, Any]:
     """
     Pipeline D2P (receives pre-filtered leads from Node.js):
 
-    Input: leads already filtered by pgvector similarity in Node.js
+    Input: leads already filtered by pgvector similarity in Node.js, either in
+    input_data['leads'] or already ingested by a streaming reader (`prepared`).
     1. WORKAROUNDS → Padrões nas bios
     2. DECISÕES → Tradução workaround → decisão
     3. SCORE D2P → 5 critérios binários
     4. PRODUTO → Definição estruturada
     """
     start_time = datetime.now()
+    timer = StageTimer(trace_memory=input_data.get('trace_memory', TRACE_MEMORY))
+    thread_report = apply_budget(input_data.get('threads') or budget_from_env())
+    deadline_ms = input_data.get('deadline_ms')
+    if deadline_ms is not None and (isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float))
+                                    or not 0 < deadline_ms < float('inf')):
+        return {'success': False,
+                'error': f'Invalid deadline_ms: {deadline_ms!r} (expected a positive number of milliseconds)'}
+    deadline = Deadline(deadline_ms) if deadline_ms is not None else None
 
     market_name = input_data.get('market_name', 'Unknown')
     version_id = input_data.get('version_id', 'unknown')
     view_mode = input_data.get('view_mode', 'empresa')
-    leads = input_data.get('leads', [])
-
-    print(f"[D2P] === D2P Analysis: {market_name} [{view_mode.upper()}] ===", file=sys.stderr)
-    print(f"[D2P] Received {len(leads)} pre-filtered leads from pgvector", file=sys.stderr)
+    view_modes = list(dict.fromkeys(input_data.get('view_modes') or [view_mode]))
+    unknown_modes = [mode for mode in view_modes if mode not in VIEW_MODES]
+    if unknown_modes:
+        return {'success': False, 'error': f'Unknown view_modes: {unknown_modes} (expected {list(VIEW_MODES)})'}
+    view_mode = view_modes[0]
+
+    print(f"[D2P] === D2P Analysis: {market_name} [{'+'.join(m.upper() for m in view_modes)}] ===", file=sys.stderr)
+
+    # Step 1: Prepare bios — a single lexicon pass per bio yields both the
+    # BERTopic document (operational phrases) and every signal hit set used below
+    with timer.span('preprocess') as span_args:
+        if not prepared and input_data.get('session_id') and not input_data.get('leads'):
+            span_args['source'] = 'session'
+            try:
+                prepared = read_session_leads(input_data['session_id'], input_data.get('cleanup_session', True))
+            except Exception as e:
+                timer.stop()
+                return {'success': False, 'error': f'Session read error: {e}'}
+        if prepared is None:
+            span_args['source'] = 'payload'
+            print(f"[D2P] Preprocessing bios → extracting operational phrases...", file=sys.stderr)
+            prepared = PreparedLeads().extend(input_data.get('leads', []))
+        span_args.setdefault('source', 'stream')  # already preprocessed while reading stdin
+    bios = prepared.bios
+    bertopic_docs = prepared.docs
+    bio_hits = prepared.bio_hits
+    print(f"[D2P] Received {len(prepared)} pre-filtered leads from pgvector", file=sys.stderr)
+    print(f"[D2P] Bio preprocessing: {prepared.extracted_count}/{len(bios)} bios had operational phrases extracted",
+          file=sys.stderr)
 
-    n_selected = len(leads)
+    n_selected = len(prepared)
     if n_selected < 50:
+        timer.stop()
         return {
             'success': False,
             'error': f'Insufficient leads: {n_selected}. Try lowering similarity threshold.',
             'leads_selected': n_selected
         }
 
+    # Same market/view/options and an identical lead set → stored result
+    result_cache = get_result_cache() if input_data.get('use_result_cache', True) else None
+    result_key = (result_cache_key(input_data, lead_set_fingerprint(prepared.lead_ids, prepared.bios))
+                  if result_cache is not None else None)
+    # force_refit must reach the topic model, so it is never answered from the cache
+    if result_cache is not None and not input_data.get('force_refresh', False) \
+            and not input_data.get('force_refit', False):
+        with timer.span('result_cache'):
+            cached = result_cache.get(result_key)
+        if cached is not None:
+            timer.stop()
+            duration_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+            print(f"[D2P] Result cache HIT (cached at {cached['cached_at']}) in {duration_ms}ms", file=sys.stderr)
+            return {
+                **cached['result'],
+                'version_id': version_id,
+                'cache': 'hit',
+                'cached_at': cached['cached_at'],
+                'threads': thread_report,
+                'timings': timer.summary(),
+                'analysis_duration_ms': duration_ms,
+            }
+
     # Calculate similarity stats from pre-filtered leads
-    similarities = [l.get('similarity', 0) for l in leads]
+    similarities = prepared.similarities
     min_sim = min(similarities) if similarities else 0
     avg_sim = sum(similarities) / len(similarities) if similarities else 0
 
-    # Step 1: Prepare bios for BERTopic
-    bios = []
-    all_text_combined = ""
-    for lead in leads:
-        bio = lead.get('bio', '') or ''
-        profession = lead.get('profession', '') or ''
-        if profession:
-            bio = f"{profession}. {bio}"
-        bios.append(bio)
-        all_text_combined += " " + bio
-
-    # Step 2: Detect global workarounds (no profession matching — pipeline is blind)
+    # Step 2: Detect global workarounds (no profession matching — pipeline is blind).
+    # Tool names contain no spaces, so the union of per-bio hits equals a scan
+    # of all bios joined with spaces.
     print(f"[D2P] Detecting workarounds (market: {market_name})...", file=sys.stderr)
-    global_workarounds = detect_workarounds_and_decisions(all_text_combined, market_name)
+    with timer.span('workarounds'):
+        all_tools = set().union(*(hits.get('workaround', ()) for hits in bio_hits))
+        global_workarounds = detect_workarounds_and_decisions('', market_name, hits={'workaround': all_tools})
 
     # Step 3: Collect real professions from lead data (not hardcoded templates)
-    detected_professions = list(set(
-        lead.get('profession', '') for lead in leads
-        if lead.get('profession')
-    ))
+    detected_professions = list(prepared.professions)
     print(f"[D2P] Real professions from lead data: {detected_professions[:10]}", file=sys.stderr)
 
-    # Step 4: BERTopic clustering on OPERATIONAL PHRASES (not raw bios)
-    print(f"[D2P] Preprocessing bios → extracting operational phrases...", file=sys.stderr)
-    bertopic_docs = prepare_bertopic_docs(bios, market_name)
+    try:
+        profile = resolve_profile(
+            input_data.get('compute_profile') or DEFAULT_COMPUTE_PROFILE,
+            reducer=input_data.get('reducer'),
+            clusterer=input_data.get('clusterer'),
+        )
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}
+    if profile.get('fallback'):
+        print(f"[D2P] Compute profile {profile['name']}: {profile['fallback']}, using hdbscan", file=sys.stderr)
+
+    sweep = input_data.get('sweep')
+    sweep = (sweep if isinstance(sweep, dict) else {}) if sweep else None
+    if sweep is not None and profile['clusterer'] != 'hdbscan':
+        return {'success': False, 'error': f"sweep tunes HDBSCAN; compute profile '{profile['name']}' "
+                                           f"clusters with {profile['clusterer']}"}
+
+    # Deadline: when encode + topic model + LLM do not fit in the time left,
+    # analyse a sample (workarounds and search stats above keep every lead)
+    llm_reserve_ms = DEADLINE_LLM_MS + DEADLINE_OVERHEAD_MS
+    warm_likely = False
+    n_analysed = n_selected
+    if deadline is not None:
+        reuse_topic_model = input_data.get('reuse_topic_model', True) and not input_data.get('force_refit', False)
+        topic_state = (TopicModelStore(TOPIC_MODEL_DIR).load_state(market_name, view_mode)
+                       if reuse_topic_model and sweep is None else None)
+        warm_likely = bool(topic_state) and topic_state.get('embedding_model') == EMBEDDING_MODEL_ID and \
+            topic_state.get('backends', 'umap+hdbscan') == f"{profile['reducer']}+{profile['clusterer']}"
+        per_doc_ms = DEADLINE_ENCODE_MS_PER_DOC + deadline_fit_ms(profile, 1, warm_likely)
+        if not deadline.fits('encode+topic_model', n_selected * per_doc_ms + llm_reserve_ms):
+            keep = max(DEADLINE_MIN_LEADS, int((deadline.remaining_ms() - llm_reserve_ms) / per_doc_ms))
+            if keep < n_selected:
+                sample = sorted(random.Random(42).sample(range(n_selected), keep))
+                bios = [bios[i] for i in sample]
+                bertopic_docs = [bertopic_docs[i] for i in sample]
+                bio_hits = [bio_hits[i] for i in sample]
+                similarities = [similarities[i] for i in sample]
+                deadline.degrade('sample_leads', leads_total=n_selected, leads_sampled=keep)
+                n_analysed = keep
+
+    # Step 4: BERTopic clustering on OPERATIONAL PHRASES (not raw bios).
+    # Duplicate docs (templates, franchises) are encoded once, through their
+    # representative; clustering still weighs every copy.
+    if input_data.get('dedup', DEDUP_DEFAULT):
+        with timer.span('dedup') as span_args:
+            dedup = dedup_docs(bertopic_docs, DEDUP_THRESHOLD)
+            span_args.update(unique=dedup['stats']['n_unique'])
+        dedup_report = {'enabled': True, **dedup['stats']}
+        rep_idx, assignment = dedup['rep_idx'], dedup['assignment']
+        unique_docs = [bertopic_docs[i] for i in rep_idx]
+        print(f"[D2P] Dedup: {n_analysed} docs → {len(unique_docs)} unique "
+              f"({dedup_report['exact_duplicates']} exact, {dedup_report['near_duplicates']} near duplicates)",
+              file=sys.stderr)
+    else:
+        dedup_report = {'enabled': False}
+        assignment = None
+        unique_docs = bertopic_docs
 
-    print(f"[D2P] Running BERTopic on {n_selected} preprocessed docs...", file=sys.stderr)
-    model = get_sentence_model()
-    bertopic_embeddings = model.encode(bertopic_docs, show_progress_bar=False, convert_to_numpy=True)
+    print(f"[D2P] Running BERTopic on {n_analysed} preprocessed docs ({len(unique_docs)} encoded)...",
+          file=sys.stderr)
+    encode_started = time.perf_counter()
+    with timer.span('encode') as span_args:
+        model = get_sentence_model()
+        embedding_cache = get_embedding_cache() if input_data.get('use_embedding_cache', True) else None
+        if embedding_cache is not None:
+            bertopic_embeddings, embedding_cache_stats = encode_with_cache(
+                model, EMBEDDING_MODEL_ID, unique_docs, embedding_cache
+            )
+            print(f"[D2P] Embedding cache: {embedding_cache_stats['hits']} hits, "
+                  f"{embedding_cache_stats['misses']} misses", file=sys.stderr)
+        else:
+            bertopic_embeddings = model.encode(unique_docs, show_progress_bar=False, convert_to_numpy=True)
+            embedding_cache_stats = {'hits': 0, 'misses': len(unique_docs)}
+        span_args.update(embedding_cache_stats)
+    if assignment is not None:
+        # One row per lead: the representative's embedding repeated by its group size
+        bertopic_embeddings = bertopic_embeddings[assignment]
+
+    # Deadline: calibrate on the encode just measured, then fall back to a
+    # cheaper reducer if the cold fit would not fit
+    if deadline is not None:
+        if embedding_cache_stats['misses'] >= 50:
+            deadline.calibrate((time.perf_counter() - encode_started) * 1000,
+                               embedding_cache_stats['misses'] * DEADLINE_ENCODE_MS_PER_DOC)
+        n_fit = n_analysed
+        if not warm_likely and not deadline.fits(
+                'topic_model', deadline_fit_ms(profile, n_fit) * deadline.speed + llm_reserve_ms):
+            available_ms = deadline.remaining_ms() - llm_reserve_ms
+            degraded = profile
+            for name, reducer in DEADLINE_REDUCTION_LADDER:
+                candidate = resolve_profile(name, reducer=reducer, clusterer=profile['clusterer'])
+                if deadline_fit_ms(candidate, n_fit) < deadline_fit_ms(degraded, n_fit):
+                    degraded = candidate
+                    if deadline_fit_ms(degraded, n_fit) * deadline.speed <= available_ms:
+                        break
+            if degraded is not profile:
+                deadline.degrade('fast_reduction',
+                                 **{'from': f"{profile['name']} ({profile['reducer']})",
+                                    'to': f"{degraded['name']} ({degraded['reducer']})",
+                                    'sweep_skipped': sweep is not None})
+                profile, sweep = degraded, None
 
     try:
-        topic_model = create_bertopic_model(n_selected)
-        topics, _ = topic_model.fit_transform(bertopic_docs, bertopic_embeddings)
+        with timer.span('topic_model', profile=profile['name']):
+            topic_model, topics, topic_model_status = fit_topic_model(
+                bertopic_docs,
+                bertopic_embeddings,
+                market_name,
+                view_mode,
+                reuse=input_data.get('reuse_topic_model', True),
+                force_refit=input_data.get('force_refit', False),
+                similarities=similarities,
+                scale_mode=input_data.get('scale_mode'),
+                profile=profile,
+                timer=timer,
+                sweep=sweep,
+            )
     except Exception as e:
+        timer.stop()
         return {'success': False, 'error': f'BERTopic error: {e}'}
 
-    # Get topic info
+    # Get topic info. Sizes come from this run's assignments: a warm model's
+    # stored Count reflects the leads it was fitted on.
+    scale_mode = topic_model_status.pop('coreset', {'enabled': False})
+    sweep_report = topic_model_status.pop('sweep', None)
     topic_info = topic_model.get_topic_info()
-    valid_topics = topic_info[topic_info['Topic'] != -1]
+    topic_counts = Counter(topics)
+    valid_topics = [
+        (int(row['Topic']), row.get('Name', f"Topic_{row['Topic']}"), topic_counts[int(row['Topic'])])
+        for _, row in topic_info.iterrows()
+        if row['Topic'] != -1 and topic_counts[int(row['Topic'])] > 0
+    ]
 
-    outliers = sum(1 for t in topics if t == -1)
-    coverage = (n_selected - outliers) / n_selected * 100
+    outliers = topic_counts[-1]
+    coverage = (n_analysed - outliers) / n_analysed * 100
 
     # Step 5: Analyze each topic for friction
-    friction_units = []
-    for _, row in valid_topics.iterrows():
-        topic_id = row['Topic']
-        count = row['Count']
-
-        topic_words = topic_model.get_topic(topic_id)
-        keywords = [word for word, score in topic_words[:12]] if topic_words else []
-        representative_docs = topic_model.get_representative_docs(topic_id) or []
-
-        friction_analysis = analyze_friction_unit(keywords, representative_docs[:10], market_name)
-
-        friction_unit = {
-            'topic_id': int(topic_id),
-            'label': row.get('Name', f'Topic_{topic_id}'),
-            'count': int(count),
-            'percentage': round(count / n_selected * 100, 2),
-            'keywords': keywords,
-            'representative_bios': representative_docs[:3],
-            **friction_analysis
-        }
+    with timer.span('friction_analysis'):
+        friction_units = []
+        for topic_id, label, count in valid_topics:
+
+            topic_words = topic_model.get_topic(topic_id)
+            keywords = [word for word, score in topic_words[:12]] if topic_words else []
+            representative_docs = topic_model.get_representative_docs(topic_id) or []
 
-        friction_units.append(friction_unit)
+            friction_analysis = analyze_friction_unit(keywords, representative_docs[:10], market_name)
 
-    friction_units.sort(key=lambda x: x['friction_score'], reverse=True)
+            friction_unit = {
+                'topic_id': topic_id,
+                'label': label,
+                'count': count,
+                'percentage': round(count / n_analysed * 100, 2),
+                'keywords': keywords,
+                'representative_bios': representative_docs[:3],
+                **friction_analysis
+            }
+
+            friction_units.append(friction_unit)
+
+        friction_units.sort(key=lambda x: x['friction_score'], reverse=True)
 
     # Step 6: BUSINESS OWNER PAIN INFERENCE
     # 1. Count business-owner signals in individual bios
     # 2. Pass BERTopic topics + representative bios to LLM
     # 3. LLM infers decisions grounded in actual data
     print(f"[D2P] Scanning for business owner pain signals...", file=sys.stderr)
-    bio_business_signals = count_business_signals_per_bio(bios)
+    with timer.span('signal_scan'):
+        bio_business_signals = count_business_signals_per_bio(bios, bio_hits)
     total_biz_signals = sum(bio_business_signals.values())
     print(f"[D2P] Business signals found: {total_biz_signals} total across "
           f"{len(bio_business_signals)} distinct terms", file=sys.stderr)
@@ -1196,67 +2271,71 @@ def run_analysis(input_data: Dict) -> Dict[str, Any]:
     all_topic_keywords = [fu.get('keywords', []) for fu in friction_units]
     all_representative_bios = [fu.get('representative_bios', []) for fu in friction_units]
 
-    # Run business owner inference (LLM-powered, grounded in data)
-    owner_analysis = infer_business_owner_decisions(
-        market_name=market_name,
-        bio_business_signals=bio_business_signals,
-        n_leads=n_selected,
-        topic_keywords=all_topic_keywords,
-        representative_bios=all_representative_bios,
-        view_mode=view_mode,
-    )
-    owner_decisions = owner_analysis['owner_decisions']
-    print(f"[D2P] Owner decisions inferred: {len(owner_decisions)}", file=sys.stderr)
-    for i, od in enumerate(owner_decisions[:3]):
-        print(f"[D2P]   #{i+1}: {od['decision']} (weight={od['weight']:.1f})", file=sys.stderr)
-
     # Step 7: Calculate D2P Binary Score (proportional, not concatenated)
-    print(f"[D2P] Calculating D2P score (proportional across {n_selected} bios)...", file=sys.stderr)
-    d2p_score = calculate_d2p_binary_score(
-        global_workarounds,
-        bios,
-        n_selected
-    )
-
-    # Step 8: Determine product type (workarounds only, no profession templates)
-    product_type = determine_product_type(global_workarounds)
-
-    # Step 9: Get dominant decision and friction — ONLY from LLM
-    dominant_decision = None
-    dominant_friction = None
-
-    if owner_decisions:
-        top_owner = owner_decisions[0]
-        dominant_decision = top_owner['decision']
-        dominant_friction = top_owner['friction']
-        product_type_override = top_owner.get('product_type')
-        if product_type_override:
-            product_type['type'] = product_type_override
-
-    # No fallback. If LLM didn't find decisions, output stays None.
-    if not dominant_decision:
-        print(f"[D2P] No dominant decision — insufficient data for this market", file=sys.stderr)
+    print(f"[D2P] Calculating D2P score (proportional across {n_analysed} bios)...", file=sys.stderr)
+    with timer.span('d2p_score'):
+        d2p_score = calculate_d2p_binary_score(
+            global_workarounds,
+            bios,
+            n_analysed,
+            bio_hits=bio_hits
+        )
 
     workaround_tools = list(set(
         w['tool'] for w in global_workarounds
     ))[:5]
 
-    # Step 10: Micro-decisions — ONLY from LLM owner decisions (no hardcoded templates)
-    micro_decisions = [od['decision'] for od in owner_decisions[1:]][:6]
-
-    print(f"[D2P] Micro-decisions: {len(micro_decisions)} (all from LLM)", file=sys.stderr)
+    # Run business owner inference (LLM-powered, grounded in data) — one
+    # prompt per perspective, concurrently when several were requested
+    signature = topic_signature(topics, bertopic_embeddings, friction_units)
+
+    # Deadline: bound the LLM call by the time left; shorten the prompt, or
+    # answer only from stored / cached decisions, when a normal call won't fit
+    llm_options: Dict[str, Any] = {}
+    if deadline is not None:
+        if deadline.fits('llm', DEADLINE_LLM_MS + DEADLINE_OVERHEAD_MS):
+            llm_options['timeout_s'] = round((deadline.remaining_ms() - DEADLINE_OVERHEAD_MS) / 1000, 1)
+        elif deadline.remaining_ms() >= DEADLINE_SHORT_LLM_MS + DEADLINE_OVERHEAD_MS:
+            llm_options = {'token_budget': DEADLINE_SHORT_PROMPT_TOKENS,
+                           'timeout_s': round((deadline.remaining_ms() - DEADLINE_OVERHEAD_MS) / 1000, 1)}
+            deadline.degrade('short_prompt', **llm_options)
+        else:
+            llm_options['allow_call'] = False
+            deadline.degrade('skip_llm')
+
+    def infer_for(mode: str) -> Dict[str, Any]:
+        return infer_or_reuse_decisions(
+            market_name=market_name,
+            view_mode=mode,
+            version_id=version_id,
+            signature=signature,
+            bio_business_signals=bio_business_signals,
+            force_llm=input_data.get('force_llm', False),
+            n_leads=n_analysed,
+            topic_keywords=all_topic_keywords,
+            representative_bios=all_representative_bios,
+            use_llm_cache=input_data.get('use_llm_cache', True) and not input_data.get('force_llm', False),
+            **llm_options,
+        )
 
-    # Step 11: Generate product definition
-    print(f"[D2P] Generating product definition...", file=sys.stderr)
-    product = generate_product_definition(
-        market_name=market_name,
-        dominant_decision=dominant_decision,
-        dominant_friction=dominant_friction,
-        product_type=product_type,
-        workaround_tools=workaround_tools,
-        d2p_score=d2p_score,
-        micro_decisions=micro_decisions,
-    )
+    with timer.span('llm', perspectives=len(view_modes)):
+        if len(view_modes) == 1:
+            owner_analyses = {view_mode: infer_for(view_mode)}
+        else:
+            with ThreadPoolExecutor(max_workers=len(view_modes)) as pool:
+                owner_analyses = dict(zip(view_modes, pool.map(infer_for, view_modes)))
+
+    # Steps 8-11 per perspective: product type, dominant decision, micro-decisions, product definition
+    with timer.span('product_definition'):
+        perspectives = {
+            mode: build_perspective(market_name, mode, owner_analyses[mode], global_workarounds,
+                                    workaround_tools, d2p_score)
+            for mode in view_modes
+        }
+    primary = perspectives[view_mode]
+    product = primary['product']
+    # Partial: the deadline left no room for the LLM and nothing stored could stand in
+    partial = any(analysis['source'] == 'skipped' for analysis in owner_analyses.values())
 
     # Metrics
     friction_count = sum(1 for f in friction_units if f['is_friction'])
@@ -1265,16 +2344,29 @@ def run_analysis(input_data: Dict) -> Dict[str, Any]:
     friction_density = friction_count / len(friction_units) if friction_units else 0
 
     duration_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+    timer.stop()
+    timings = timer.summary()
+    trace_path = input_data.get('trace_file') or (
+        os.path.join(TRACE_DIR, f"{version_id}_{os.getpid()}_{int(start_time.timestamp())}.trace.json")
+        if TRACE_DIR else None
+    )
+    if trace_path:
+        try:
+            timings['trace_file'] = timer.write_chrome_trace(
+                trace_path, {'market_name': market_name, 'view_mode': view_mode, 'version_id': version_id}
+            )
+        except OSError as e:
+            print(f"[D2P] Could not write trace file: {e}", file=sys.stderr)
 
     print(f"[D2P] Analysis complete in {duration_ms}ms", file=sys.stderr)
     print(f"[D2P] Product: {product['suggested_name']} ({product['type']})", file=sys.stderr)
     print(f"[D2P] D2P Score: {d2p_score['total']}/5 - {d2p_score['verdict']}", file=sys.stderr)
 
-    return {
+    result = {
         'success': True,
         'market_name': market_name,
         'version_id': version_id,
-        'search_mode': 'demand' if view_mode == 'cliente' else 'identity',
+        'search_mode': primary['search_mode'],
 
         # Search stats (from pgvector, passed through)
         'leads_selected': n_selected,
@@ -1284,8 +2376,8 @@ def run_analysis(input_data: Dict) -> Dict[str, Any]:
         # BERTopic results
         'topics_discovered': len(valid_topics),
         'topics_detail': [
-            {'topic_id': int(row['Topic']), 'label': row.get('Name', ''), 'count': int(row['Count'])}
-            for _, row in valid_topics.iterrows()
+            {'topic_id': topic_id, 'label': label, 'count': count}
+            for topic_id, label, count in valid_topics
         ],
         'coverage_percentage': round(coverage, 2),
         'friction_units': friction_units,
@@ -1297,10 +2389,10 @@ def run_analysis(input_data: Dict) -> Dict[str, Any]:
         'friction_density': round(friction_density, 3),
 
         # D2P Core
-        'dominant_pain': dominant_friction,
-        'dominant_decision': dominant_decision,
-        'product_type': product['type'],
-        'product_type_name': product['type_name'],
+        'dominant_pain': primary['dominant_pain'],
+        'dominant_decision': primary['dominant_decision'],
+        'product_type': primary['product_type'],
+        'product_type_name': primary['product_type_name'],
 
         # Product Definition
         'product': product,
@@ -1310,10 +2402,10 @@ def run_analysis(input_data: Dict) -> Dict[str, Any]:
 
         # Legacy compatibility
         'product_potential_score': d2p_score['total'] * 20,
-        'product_definition': product['product_definition'],
-        'product_tagline': product['tagline'],
-        'mvp_does': product['mvp_does'],
-        'mvp_does_not': product['mvp_does_not'],
+        'product_definition': primary['product_definition'],
+        'product_tagline': primary['product_tagline'],
+        'mvp_does': primary['mvp_does'],
+        'mvp_does_not': primary['mvp_does_not'],
         'd2p_score': {
             'frequency': d2p_score['scores']['frequency'],
             'volume': d2p_score['scores']['volume'],
@@ -1329,24 +2421,47 @@ def run_analysis(input_data: Dict) -> Dict[str, Any]:
         'detected_professions': detected_professions,
 
         # Business Owner Analysis (the real pain)
-        'owner_analysis': {
-            'decisions': [
-                {'decision': od['decision'], 'friction': od['friction'],
-                 'type': od['product_type'], 'weight': round(od['weight'], 2)}
-                for od in owner_decisions
-            ],
-            'evidence': owner_analysis['evidence'],
-            'is_intermediary': owner_analysis['is_intermediary'],
-            'business_signals': owner_analysis['business_signal_counts'],
-        },
+        'owner_analysis': primary['owner_analysis'],
 
         # Micro-decisions (LLM only, no templates)
-        'micro_decisions': micro_decisions,
+        'micro_decisions': primary['micro_decisions'],
 
         # Meta
+        'dedup': dedup_report,
+        'embedding_cache': {'enabled': embedding_cache is not None, **embedding_cache_stats},
+        'encoder': {'backend': ENCODER_BACKEND, 'model': EMBEDDING_MODEL_ID, 'max_seq_length': ENCODER_MAX_SEQ_LENGTH},
+        'llm_cache': primary['llm_cache'],
+        'llm_usage': primary['llm_usage'],
+        'decision_reuse': primary['decision_reuse'],
+        'topic_model': topic_model_status,
+        'scale_mode': scale_mode,
+        'compute_profile': {k: profile[k] for k in ('name', 'reducer', 'clusterer')},
+        'sweep': sweep_report,
+        'threads': thread_report,
+        'deadline': {**deadline.report(), 'leads_sampled': n_analysed} if deadline is not None else None,
+        'partial': partial,
+        'timings': timings,
         'analysis_duration_ms': duration_ms
     }
 
+    # Several perspectives: top-level fields are the first one, all of them here
+    if len(view_modes) > 1:
+        result['view_modes'] = view_modes
+        result['perspectives'] = perspectives
+
+    # Only complete results are stored: a degraded one must not answer later
+    # requests that have time for the full run, nor a perspective whose LLM
+    # step failed (source 'none') answer every caller until the TTL expires
+    complete = all(analysis['source'] in ('llm', 'reused') or analysis['owner_decisions']
+                   for analysis in owner_analyses.values())
+    if result_cache is not None and complete and not (deadline is not None and deadline.degradations):
+        try:
+            result_cache.put(result_key, {'result': result, 'cached_at': datetime.now().isoformat()})
+        except Exception as e:
+            print(f"[D2P] Could not store result in cache: {e}", file=sys.stderr)
+    result['cache'] = 'miss'
+    return result
+
 
 # ==============================================================================
 # ENTRY POINT
@@ -1354,10 +2469,9 @@ def run_analysis(input_data: Dict) -> Dict[str, Any]:
 
 if __name__ == '__main__':
     try:
-        input_text = sys.stdin.read()
-        input_data = json.loads(input_text) if input_text.strip() else {}
+        input_data, prepared = read_input(sys.stdin.buffer)
 
-        result = run_analysis(input_data)
+        result = run_analysis(input_data, prepared)
         print(json.dumps(result, ensure_ascii=False))
 
     except json.JSONDecodeError as e:
@@ -0,0 +1,187 @@
+"""
+D2P Backends - pluggable dimensionality reduction and clustering for BERTopic
+
+Reducers (anything with fit/transform):
+    umap               UMAP, cosine metric (deterministic = random_state=42, single thread)
+    pca                L2-normalise + PCA
+    svd                L2-normalise + TruncatedSVD
+    random_projection  L2-normalise + Gaussian random projection
+
+Clusterers (fit → labels_, and predict or approximate_predict for new docs):
+    hdbscan            HDBSCAN, leaf selection, prediction data kept
+    graph              kNN graph + Leiden (leidenalg) or Louvain (networkx)
+
+Compute profiles name a (reducer, clusterer) pair:
+    exact   umap + hdbscan, deterministic — the historical behaviour
+    fast    umap + hdbscan, multi-threaded UMAP (no fixed seed)
+    huge    pca + graph
+
+Models are pickled by the topic store, so classes defined here must stay
+importable under the same names.
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sklearn.decomposition import PCA, TruncatedSVD
+from sklearn.neighbors import NearestNeighbors
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import Normalizer
+from sklearn.random_projection import GaussianRandomProjection
+
+try:
+    import igraph
+    import leidenalg
+    _leiden_available = True
+except ImportError:
+    _leiden_available = False
+
+try:
+    import networkx
+    _networkx_available = True
+except ImportError:
+    _networkx_available = False
+
+REDUCERS = ('umap', 'pca', 'svd', 'random_projection')
+CLUSTERERS = ('hdbscan', 'graph')
+
+COMPUTE_PROFILES: Dict[str, Dict[str, Any]] = {
+    'exact': {'reducer': 'umap', 'clusterer': 'hdbscan', 'deterministic': True},
+    'fast': {'reducer': 'umap', 'clusterer': 'hdbscan', 'deterministic': False},
+    'huge': {'reducer': 'pca', 'clusterer': 'graph', 'deterministic': False},
+}
+
+SEED = 42
+
+
+def graph_clustering_available() -> bool:
+    return _leiden_available or _networkx_available
+
+
+def resolve_profile(name: Optional[str], reducer: Optional[str] = None,
+                    clusterer: Optional[str] = None) -> Dict[str, Any]:
+    """Profile settings with optional per-backend overrides; unknown names raise ValueError."""
+    name = name or 'exact'
+    if name not in COMPUTE_PROFILES:
+        raise ValueError(f"Unknown compute profile '{name}' (expected one of {', '.join(COMPUTE_PROFILES)})")
+    profile = {'name': name, **COMPUTE_PROFILES[name]}
+    if reducer:
+        if reducer not in REDUCERS:
+            raise ValueError(f"Unknown reducer '{reducer}' (expected one of {', '.join(REDUCERS)})")
+        profile['reducer'] = reducer
+    if clusterer:
+        if clusterer not in CLUSTERERS:
+            raise ValueError(f"Unknown clusterer '{clusterer}' (expected one of {', '.join(CLUSTERERS)})")
+        profile['clusterer'] = clusterer
+    if profile['clusterer'] == 'graph' and not graph_clustering_available():
+        profile['clusterer'] = 'hdbscan'
+        profile['fallback'] = 'graph clustering needs leidenalg or networkx'
+    return profile
+
+
+def make_reducer(name: str, n_components: int, n_neighbors: int, deterministic: bool = True):
+    if name == 'umap':
+        from umap import UMAP
+        return UMAP(
+            n_neighbors=n_neighbors,
+            n_components=n_components,
+            min_dist=0.05,  # slightly > 0 to spread clusters apart
+            metric='cosine',
+            random_state=SEED if deterministic else None,
+            n_jobs=1 if deterministic else -1,
+            low_memory=True,
+            verbose=False
+        )
+    if name == 'pca':
+        return make_pipeline(Normalizer(), PCA(n_components=n_components, random_state=SEED))
+    if name == 'svd':
+        return make_pipeline(Normalizer(), TruncatedSVD(n_components=n_components, random_state=SEED))
+    if name == 'random_projection':
+        return make_pipeline(Normalizer(), GaussianRandomProjection(n_components=n_components, random_state=SEED))
+    raise ValueError(f"Unknown reducer '{name}'")
+
+
+def make_clusterer(name: str, min_cluster_size: int, min_samples: int, n_neighbors: int = 15,
+                   n_jobs: Optional[int] = None):
+    if name == 'hdbscan':
+        from hdbscan import HDBSCAN
+        return HDBSCAN(
+            min_cluster_size=min_cluster_size,
+            min_samples=min_samples,
+            metric='euclidean',
+            cluster_selection_method='leaf',  # 'leaf' finds more fine-grained clusters than 'eom'
+            prediction_data=True,
+            core_dist_n_jobs=n_jobs or 4,  # HDBSCAN's own default when no thread budget is set
+        )
+    if name == 'graph':
+        return KNNGraphClusterer(n_neighbors=n_neighbors, min_cluster_size=min_cluster_size)
+    raise ValueError(f"Unknown clusterer '{name}'")
+
+
+class KNNGraphClusterer:
+    """
+    Community detection on a symmetric kNN graph (weights 1 / (1 + distance)).
+
+    Communities smaller than min_cluster_size become outliers (-1), the rest
+    are numbered by size. predict() assigns new points by a distance-weighted
+    vote of their nearest training points, so BERTopic.transform works on it.
+    """
+
+    def __init__(self, n_neighbors: int = 15, min_cluster_size: int = 10,
+                 resolution: float = 1.0, random_state: int = SEED):
+        self.n_neighbors = n_neighbors
+        self.min_cluster_size = min_cluster_size
+        self.resolution = resolution
+        self.random_state = random_state
+
+    def _communities(self, n: int, edges: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        if _leiden_available:
+            graph = igraph.Graph(n=n, edges=edges.tolist(), directed=False)
+            graph.es['weight'] = weights.tolist()
+            graph = graph.simplify(combine_edges='max')
+            partition = leidenalg.find_partition(
+                graph, leidenalg.RBConfigurationVertexPartition, weights='weight',
+                resolution_parameter=self.resolution, seed=self.random_state,
+            )
+            self.method_ = 'leiden'
+            return np.asarray(partition.membership)
+
+        graph = networkx.Graph()
+        graph.add_nodes_from(range(n))
+        graph.add_weighted_edges_from(zip(edges[:, 0].tolist(), edges[:, 1].tolist(), weights.tolist()))
+        communities = networkx.community.louvain_communities(
+            graph, weight='weight', resolution=self.resolution, seed=self.random_state,
+        )
+        membership = np.empty(n, dtype=int)
+        for label, members in enumerate(communities):
+            membership[list(members)] = label
+        self.method_ = 'louvain'
+        return membership
+
+    def fit(self, X, y=None) -> 'KNNGraphClusterer':
+        X = np.asarray(X, dtype=np.float32)
+        k = min(self.n_neighbors, len(X) - 1)
+        self._nn = NearestNeighbors(n_neighbors=k + 1).fit(X)
+        dist, idx = self._nn.kneighbors(X)
+
+        sources = np.repeat(np.arange(len(X)), k)
+        edges = np.column_stack([sources, idx[:, 1:].ravel()])
+        membership = self._communities(len(X), edges, 1.0 / (1.0 + dist[:, 1:].ravel()))
+
+        sizes = np.bincount(membership)
+        kept = [c for c in np.argsort(-sizes, kind='stable') if sizes[c] >= self.min_cluster_size]
+        remap = np.full(len(sizes), -1)
+        remap[kept] = np.arange(len(kept))
+        self.labels_ = remap[membership]
+        self.n_clusters_ = len(kept)
+        return self
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        dist, idx = self._nn.kneighbors(X, n_neighbors=min(self.n_neighbors, len(self.labels_)))
+        votes = self.labels_[idx] + 1  # shift so outliers (-1) occupy column 0
+        n_labels = self.n_clusters_ + 1
+        rows = np.repeat(np.arange(len(X)), votes.shape[1])
+        tally = np.bincount(rows * n_labels + votes.ravel(), weights=(1.0 / (1.0 + dist)).ravel(),
+                            minlength=len(X) * n_labels).reshape(len(X), n_labels)
+        return tally.argmax(axis=1) - 1
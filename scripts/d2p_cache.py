@@ -0,0 +1,105 @@
+"""
+D2P Cache - small SQLite key/value store with TTL + LRU eviction
+
+Used for whole run_analysis results (keyed by lead-set fingerprint). Values
+are JSON; entries older than ttl_seconds are treated as misses and purged,
+and when more than max_entries are stored the least recently used go first.
+Safe to share between processes (WAL mode; one connection per process) and
+between threads of a process (the connection is guarded by a lock).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+
+def fingerprint(parts: Iterable[str]) -> str:
+    """Order-independent sha256 over a collection of strings."""
+    h = hashlib.sha256()
+    for part in sorted(parts):
+        h.update(part.encode('utf-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def make_key(**fields: Any) -> str:
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class SqliteCache:
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)')
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        row = self._db.execute('SELECT value, created_at FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            if row is not None:
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                self._db.commit()
+            self.misses += 1
+            return None
+        self._db.execute('UPDATE entries SET last_used = ? WHERE key = ?', (now, key))
+        self._db.commit()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries (key, value, created_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._db.commit()
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._db.commit()
+
+    def evict(self) -> int:
+        """Purge expired entries, then least recently used ones beyond max_entries."""
+        with self._lock:
+            return self._evict()
+
+    def _evict(self) -> int:
+        cur = self._db.execute('DELETE FROM entries WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+        evicted = cur.rowcount
+        cur = self._db.execute(
+            'DELETE FROM entries WHERE key IN ('
+            ' SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+        evicted += cur.rowcount
+        self._db.commit()
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        return {'entries': n, 'max_entries': self.max_entries, 'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,84 @@
+"""
+D2P Coreset - stratified, similarity-weighted sample for fitting on big lead sets
+
+UMAP + HDBSCAN cost grows super-linearly with the number of docs, so above a
+configurable size the topic model is fitted on a coreset only and the rest of
+the leads are assigned out-of-sample (UMAP transform + HDBSCAN
+approximate_predict) in batches.
+
+Strata = similarity decile × random-hyperplane LSH bucket of the embedding,
+so both the relevance range and the regions of embedding space are covered.
+Each stratum gets a share of the sample proportional to its size; within a
+stratum leads are drawn without replacement with probability ∝ similarity.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+N_SIMILARITY_BINS = 10
+N_LSH_BITS = 4
+
+
+def _lsh_buckets(embeddings: np.ndarray, n_bits: int, rng: np.random.Generator) -> np.ndarray:
+    planes = rng.standard_normal((embeddings.shape[1], n_bits)).astype(embeddings.dtype, copy=False)
+    bits = (embeddings @ planes) > 0
+    return bits @ (1 << np.arange(n_bits))
+
+
+def _similarity_bins(similarities: np.ndarray, n_bins: int) -> np.ndarray:
+    edges = np.unique(np.quantile(similarities, np.linspace(0, 1, n_bins + 1)[1:-1]))
+    return np.searchsorted(edges, similarities, side='right')
+
+
+def coreset_indices(
+    embeddings: np.ndarray,
+    similarities: Optional[Sequence[float]],
+    size: int,
+    seed: int = 42,
+) -> np.ndarray:
+    """Sorted indices of a stratified, similarity-weighted sample of `size` rows."""
+    n = len(embeddings)
+    if size >= n:
+        return np.arange(n)
+
+    rng = np.random.default_rng(seed)
+    sims = np.asarray(similarities if similarities is not None and len(similarities) == n else np.ones(n),
+                      dtype=np.float64)
+    strata = _similarity_bins(sims, N_SIMILARITY_BINS) * (1 << N_LSH_BITS) + _lsh_buckets(
+        np.asarray(embeddings), N_LSH_BITS, rng)
+
+    _, inverse, counts = np.unique(strata, return_inverse=True, return_counts=True)
+
+    # Largest-remainder allocation so quotas add up to exactly `size`
+    exact = counts * size / n
+    quotas = np.floor(exact).astype(int)
+    remainder = size - quotas.sum()
+    if remainder > 0:
+        quotas[np.argsort(-(exact - quotas), kind='stable')[:remainder]] += 1
+
+    weights = np.clip(sims, 1e-6, None)
+    chosen: List[np.ndarray] = []
+    for stratum, quota in enumerate(quotas):
+        if quota == 0:
+            continue
+        members = np.flatnonzero(inverse == stratum)
+        p = weights[members] / weights[members].sum()
+        chosen.append(rng.choice(members, size=min(quota, len(members)), replace=False, p=p))
+
+    return np.sort(np.concatenate(chosen))
+
+
+def coreset_report(topics: Sequence[int], sample_idx: np.ndarray, n_batches: int) -> Dict:
+    """Coverage of the fitted sample vs the whole set after out-of-sample assignment."""
+    topics = np.asarray(topics)
+    sample_topics = topics[sample_idx]
+    return {
+        'enabled': True,
+        'n_total': int(len(topics)),
+        'sample_size': int(len(sample_idx)),
+        'assigned_out_of_sample': int(len(topics) - len(sample_idx)),
+        'assign_batches': n_batches,
+        'sample_coverage_percentage': round(float((sample_topics != -1).mean()) * 100, 2),
+        'coverage_percentage': round(float((topics != -1).mean()) * 100, 2),
+    }
@@ -0,0 +1,72 @@
+"""
+D2P Deadline - time budget and ordered degradations for run_analysis
+
+With a deadline_ms the engine checks the remaining budget before each
+expensive stage and, when its cost estimate does not fit, degrades in a
+fixed order (DEGRADATIONS), each step only when the previous ones were not
+enough:
+
+    sample_leads    analyse a seeded random sample of the leads (not below a floor)
+    fast_reduction  switch the reducer to a cheaper one (exact UMAP → parallel UMAP → PCA)
+    short_prompt    LLM prompt trimmed to a smaller token budget, call timeout = time left
+    skip_llm        no LLM call (stored / cached decisions still used) → partial result
+
+Estimates are per-doc costs calibrated on the fly: the encode stage's measured
+ms/doc against its nominal cost gives a speed factor for the host, applied to
+the fit estimates that follow.
+
+report() lists the degradations applied and the elapsed time at each check.
+"""
+
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+DEGRADATIONS = ('sample_leads', 'fast_reduction', 'short_prompt', 'skip_llm')
+
+
+class Deadline:
+    def __init__(self, deadline_ms: float, started: Optional[float] = None):
+        self.deadline_ms = float(deadline_ms)
+        self.started = time.perf_counter() if started is None else started
+        self.speed = 1.0
+        self.degradations: List[Dict[str, Any]] = []
+        self.checks: List[Dict[str, Any]] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def remaining_ms(self) -> float:
+        return self.deadline_ms - self.elapsed_ms()
+
+    def fits(self, stage: str, estimated_ms: float) -> bool:
+        """Record a check before `stage`; True when its estimate fits in the remaining time."""
+        remaining = self.remaining_ms()
+        self.checks.append({'stage': stage, 'elapsed_ms': round(self.elapsed_ms(), 1),
+                            'estimated_ms': round(estimated_ms, 1), 'remaining_ms': round(remaining, 1)})
+        return estimated_ms <= remaining
+
+    def calibrate(self, measured_ms: float, nominal_ms: float) -> None:
+        """Host speed factor from a stage that ran (measured vs nominal cost), kept in [0.25, 8]."""
+        if nominal_ms > 0 and measured_ms > 0:
+            self.speed = min(8.0, max(0.25, measured_ms / nominal_ms))
+
+    def degrade(self, step: str, **details: Any) -> None:
+        assert step in DEGRADATIONS, step
+        entry = {'step': step, 'elapsed_ms': round(self.elapsed_ms(), 1), **details}
+        self.degradations.append(entry)
+        print(f"[D2P] Deadline: {step} {details} ({self.remaining_ms():.0f}ms left)", file=sys.stderr)
+
+    def applied(self, step: str) -> bool:
+        return any(d['step'] == step for d in self.degradations)
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = self.elapsed_ms()
+        return {
+            'deadline_ms': self.deadline_ms,
+            'elapsed_ms': round(elapsed, 1),
+            'met': elapsed <= self.deadline_ms,
+            'speed_factor': round(self.speed, 3),
+            'degradations': self.degradations,
+            'checks': self.checks,
+        }
@@ -0,0 +1,131 @@
+"""
+D2P Decision Store - LLM owner decisions kept per market + view mode for reuse
+
+Successive versions of a market usually rediscover nearly the same topics.
+After each LLM inference the decisions are stored with the topic signature
+they were inferred from (per topic: embedding centroid, keywords, share of
+leads). A new run matches its own signature against the stored one; when the
+overlap clears the threshold the stored decisions are reused and the GPT call
+is skipped.
+
+Topic similarity = CENTROID_WEIGHT × cosine(centroids)
+                 + (1 - CENTROID_WEIGHT) × Jaccard(top keywords)
+Topics are paired one-to-one (Hungarian assignment); overlap is the
+share-weighted mean similarity of the pairs, taken from both sides (min), so
+topics that appeared or vanished count as zero on their side.
+
+Entry: <root>/<market_slug>__<view_mode>.json
+"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from d2p_topic_store import embedding_centroid, market_slug
+
+CENTROID_WEIGHT = 0.7
+N_KEYWORDS = 10
+
+
+def topic_signature(
+    topics: Sequence[int],
+    embeddings: np.ndarray,
+    friction_units: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Centroid, top keywords and lead share of every topic in friction_units."""
+    topics = np.asarray(topics)
+    n = max(1, len(topics))
+    signature = []
+    for fu in friction_units:
+        mask = topics == fu['topic_id']
+        if not mask.any():
+            continue
+        signature.append({
+            'topic_id': fu['topic_id'],
+            'keywords': fu.get('keywords', [])[:N_KEYWORDS],
+            'share': float(mask.sum()) / n,
+            'centroid': embedding_centroid(np.asarray(embeddings)[mask]).round(5).tolist(),
+        })
+    return signature
+
+
+def _keyword_jaccard(a: List[str], b: List[str]) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+def match_topics(current: List[Dict[str, Any]], previous: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One-to-one topic pairing and the overall share-weighted overlap in [0, 1]."""
+    if not current or not previous:
+        return {'similarity': 0.0, 'matches': []}
+
+    cur_c = np.asarray([t['centroid'] for t in current], dtype=np.float64)
+    prev_c = np.asarray([t['centroid'] for t in previous], dtype=np.float64)
+    cosine = np.clip(cur_c @ prev_c.T, 0.0, 1.0)
+    jaccard = np.asarray([[_keyword_jaccard(c['keywords'], p['keywords']) for p in previous] for c in current])
+    sim = CENTROID_WEIGHT * cosine + (1 - CENTROID_WEIGHT) * jaccard
+
+    rows, cols = linear_sum_assignment(-sim)
+    cur_share = np.asarray([t['share'] for t in current])
+    prev_share = np.asarray([t['share'] for t in previous])
+    cur_share = cur_share / (cur_share.sum() or 1)
+    prev_share = prev_share / (prev_share.sum() or 1)
+
+    pair_sim = sim[rows, cols]
+    overlap = min(float((cur_share[rows] * pair_sim).sum()), float((prev_share[cols] * pair_sim).sum()))
+    matches = sorted((
+        {'topic_id': current[r]['topic_id'], 'previous_topic_id': previous[c]['topic_id'],
+         'similarity': round(float(s), 3)}
+        for r, c, s in zip(rows, cols, pair_sim)
+    ), key=lambda m: -m['similarity'])
+    return {'similarity': round(overlap, 4), 'matches': matches}
+
+
+class DecisionStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, market_name: str, view_mode: str) -> str:
+        return os.path.join(self.root, f"{market_slug(market_name)}__{view_mode}.json")
+
+    def load(self, market_name: str, view_mode: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(market_name, view_mode)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(
+        self,
+        market_name: str,
+        view_mode: str,
+        version_id: str,
+        embedding_model: str,
+        signature: List[Dict[str, Any]],
+        owner_analysis: Dict[str, Any],
+    ) -> None:
+        entry = {
+            'market_name': market_name,
+            'view_mode': view_mode,
+            'version_id': version_id,
+            'embedding_model': embedding_model,
+            'topics': signature,
+            'decisions': owner_analysis['owner_decisions'],
+            'evidence': owner_analysis['evidence'],
+            'saved_at': time.time(),
+        }
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.tmp_', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, self._path(market_name, view_mode))
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
@@ -0,0 +1,141 @@
+"""
+D2P Dedup - collapse exact and near-duplicate BERTopic docs before encoding
+
+Bios in one market repeat a lot (franchises, templates, copy-paste), and
+encoding every copy costs time. Docs are grouped in two passes:
+
+1. exact: identical after normalization (lowercase, accents, punctuation and
+   digits folded, whitespace collapsed)
+2. near: MinHash over word 3-gram shingles (NUM_PERM permutations), LSH with
+   N_BANDS bands to find candidates, kept when the estimated Jaccard
+   similarity is >= threshold
+
+Each group is represented by its first doc and `assignment` maps every doc
+to its representative's position. Only representatives are encoded;
+indexing their embeddings by `assignment` gives every doc a row again, so
+clustering keeps each group's full weight (a 40-copy template is 40 points,
+not one). Dedup therefore saves encode time only: the reducer and the
+clusterer still see every doc, and fitting them on the representatives
+instead would change the UMAP manifold and with it the topics.
+"""
+
+import re
+import unicodedata
+import zlib
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+NUM_PERM = 128
+N_BANDS = 16
+SHINGLE_SIZE = 3
+_PRIME = (1 << 31) - 1
+
+
+def normalize_doc(doc: str) -> str:
+    text = unicodedata.normalize('NFKD', doc.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'\d+', '0', text)
+    text = re.sub(r'[^\w\s]+', ' ', text)
+    return ' '.join(text.split())
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    words = text.split()
+    if len(words) <= SHINGLE_SIZE:
+        shingles = [text]
+    else:
+        shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) % _PRIME for s in shingles), dtype=np.uint64)
+
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = NUM_PERM, seed: int = 42) -> np.ndarray:
+    """(len(texts), num_perm) uint64 MinHash signatures under (a·x + b) mod p permutations."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = _shingle_hashes(text)
+        signatures[i] = ((hashes[:, None] * a + b) % _PRIME).min(axis=0)
+    return signatures
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x: int, y: int) -> None:
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            # Smallest index stays root, so the first occurrence represents the group
+            self.parent[max(rx, ry)] = min(rx, ry)
+
+
+def dedup_docs(docs: Sequence[str], threshold: float = 0.85, near: bool = True) -> Dict[str, Any]:
+    """
+    Returns {'rep_idx', 'assignment', 'stats'}: rep_idx are the doc indices
+    kept (in doc order), assignment[i] the position in rep_idx that doc i
+    collapses to.
+    """
+    n = len(docs)
+    uf = _UnionFind(n)
+
+    # 1. exact duplicates after normalization
+    normalized = [normalize_doc(d) for d in docs]
+    first_seen: Dict[str, int] = {}
+    for i, text in enumerate(normalized):
+        if text in first_seen:
+            uf.union(first_seen[text], i)
+        else:
+            first_seen[text] = i
+    exact_groups_idx = list(first_seen.values())
+    exact_duplicates = n - len(exact_groups_idx)
+
+    # 2. near duplicates among the exact-unique docs
+    if near and len(exact_groups_idx) > 1:
+        signatures = minhash_signatures([normalized[i] for i in exact_groups_idx])
+        rows = NUM_PERM // N_BANDS
+        for band in range(N_BANDS):
+            buckets: Dict[bytes, List[int]] = {}
+            band_sig = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+            for pos in range(len(exact_groups_idx)):
+                buckets.setdefault(band_sig[pos].tobytes(), []).append(pos)
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                # Compare against the bucket's anchors only (members that did
+                # not match an earlier anchor), not all pairs
+                anchors: List[int] = []
+                for pos in members:
+                    for anchor in anchors:
+                        if (signatures[anchor] == signatures[pos]).mean() >= threshold:
+                            uf.union(exact_groups_idx[anchor], exact_groups_idx[pos])
+                            break
+                    else:
+                        anchors.append(pos)
+
+    roots = np.fromiter((uf.find(i) for i in range(n)), dtype=np.int64, count=n)
+    rep_idx = np.unique(roots)
+    assignment = np.searchsorted(rep_idx, roots)
+    group_sizes = np.bincount(assignment, minlength=len(rep_idx))
+
+    return {
+        'rep_idx': rep_idx,
+        'assignment': assignment,
+        'stats': {
+            'n_docs': n,
+            'n_unique': int(len(rep_idx)),
+            'exact_duplicates': exact_duplicates,
+            'near_duplicates': int(n - exact_duplicates - len(rep_idx)),
+            'duplicate_rate': round(1 - len(rep_idx) / max(1, n), 4),
+            'largest_group': int(group_sizes.max()) if len(group_sizes) else 0,
+            'threshold': threshold if near else None,
+        },
+    }
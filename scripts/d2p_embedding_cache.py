@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+D2P Embedding Cache - content-addressed on-disk store for sentence embeddings
+
+Key:    sha256(model_name + '\\0' + document_text)
+Values: float32 rows in memory-mapped .npy shards, one shard per write batch
+Index:  SQLite (key → shard, row, last_used) next to the shards
+
+Eviction is shard-granular LRU: when the shards exceed the size budget, the
+shard whose most recent hit is oldest is dropped together with its index rows.
+
+Uso:
+    python scripts/d2p_embedding_cache.py prefill [--source supabase|parquet] [--limit 0]
+    python scripts/d2p_embedding_cache.py stats
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_MAX_MB = 2048
+SQLITE_MAX_VARS = 900  # stay below SQLITE_MAX_VARIABLE_NUMBER on old builds
+
+
+class EmbeddingCache:
+    """Persistent embedding store shared by every run (and every worker)."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY, shard TEXT NOT NULL, row INTEGER NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_shard ON entries(shard)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS shards ('
+            ' name TEXT PRIMARY KEY, n_rows INTEGER NOT NULL, bytes INTEGER NOT NULL, created_at REAL NOT NULL)'
+        )
+        self._db.commit()
+        self._shards: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def _shard(self, name: str) -> np.ndarray:
+        if name not in self._shards:
+            self._shards[name] = np.load(os.path.join(self.cache_dir, name), mmap_mode='r')
+        return self._shards[name]
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return {key: vector} for every key present in the cache."""
+        found: Dict[str, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+
+        for i in range(0, len(unique_keys), SQLITE_MAX_VARS):
+            chunk = unique_keys[i:i + SQLITE_MAX_VARS]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._db.execute(
+                f'SELECT key, shard, row FROM entries WHERE key IN ({placeholders})', chunk
+            ).fetchall()
+            for key, shard, row in rows:
+                try:
+                    found[key] = np.array(self._shard(shard)[row], dtype=np.float32)
+                except (OSError, IndexError, ValueError):
+                    # Shard evicted/removed by another process: treat as a miss
+                    continue
+            if rows:
+                self._db.execute(
+                    f'UPDATE entries SET last_used = ? WHERE key IN ({placeholders})', [now, *chunk]
+                )
+
+        self._db.commit()
+        return found
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        if len(keys) == 0:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        name = f"shard_{int(time.time())}_{uuid.uuid4().hex[:8]}.npy"
+        path = os.path.join(self.cache_dir, name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, vectors)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        self._db.execute(
+            'INSERT OR REPLACE INTO shards (name, n_rows, bytes, created_at) VALUES (?, ?, ?, ?)',
+            (name, len(keys), os.path.getsize(path), now),
+        )
+        self._db.executemany(
+            'INSERT OR REPLACE INTO entries (key, shard, row, last_used) VALUES (?, ?, ?, ?)',
+            [(key, name, row, now) for row, key in enumerate(keys)],
+        )
+        self._db.commit()
+        self.evict()
+
+    def total_bytes(self) -> int:
+        return self._db.execute('SELECT COALESCE(SUM(bytes), 0) FROM shards').fetchone()[0]
+
+    def evict(self) -> int:
+        """Drop least-recently-used shards until the cache fits max_bytes."""
+        evicted = 0
+        while self.total_bytes() > self.max_bytes:
+            row = self._db.execute(
+                'SELECT s.name FROM shards s LEFT JOIN entries e ON e.shard = s.name '
+                'GROUP BY s.name ORDER BY COALESCE(MAX(e.last_used), 0), s.created_at LIMIT 1'
+            ).fetchone()
+            if not row:
+                break
+            name = row[0]
+            self._db.execute('DELETE FROM entries WHERE shard = ?', (name,))
+            self._db.execute('DELETE FROM shards WHERE name = ?', (name,))
+            self._db.commit()
+            self._shards.pop(name, None)
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            evicted += 1
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        n_entries = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        n_shards = self._db.execute('SELECT COUNT(*) FROM shards').fetchone()[0]
+        return {'entries': n_entries, 'shards': n_shards, 'bytes': self.total_bytes(), 'max_bytes': self.max_bytes}
+
+
+def encode_with_cache(
+    model,
+    model_name: str,
+    docs: List[str],
+    cache: EmbeddingCache,
+    batch_size: int = 64,
+) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Encode docs, reading hits from the cache and encoding only the misses.
+    Duplicate docs within the same call are encoded once.
+    Returns (embeddings in input order, {'hits', 'misses'}).
+    """
+    keys = [EmbeddingCache.make_key(model_name, doc) for doc in docs]
+    cached = cache.get_many(keys)
+
+    hits = sum(1 for k in keys if k in cached)
+    miss_keys = [k for k in dict.fromkeys(keys) if k not in cached]
+    if miss_keys:
+        text_by_key = dict(zip(keys, docs))
+        miss_docs = [text_by_key[k] for k in miss_keys]
+        encoded = model.encode(miss_docs, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+        encoded = np.asarray(encoded, dtype=np.float32)
+        cache.put_many(miss_keys, encoded)
+        cached.update(zip(miss_keys, encoded))
+
+    embeddings = np.vstack([cached[k] for k in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+    return embeddings, {'hits': hits, 'misses': len(keys) - hits}
+
+
+# ==============================================================================
+# CLI - overnight prefill from the whole lead corpus
+# ==============================================================================
+
+def _iter_supabase_leads(page_size: int, limit: int):
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    offset = 0
+    while True:
+        response = supabase.table('instagram_leads').select(
+            'bio, profession'
+        ).not_.is_('bio', 'null').order('id').range(offset, offset + page_size - 1).execute()
+        if not response.data:
+            break
+        yield response.data
+        offset += page_size
+        if len(response.data) < page_size or (limit and offset >= limit):
+            break
+
+
+def _iter_parquet_leads(path: str, page_size: int, limit: int):
+    import pandas as pd
+
+    df = pd.read_parquet(path, columns=['bio', 'profession'])
+    if limit:
+        df = df.head(limit)
+    for start in range(0, len(df), page_size):
+        yield df.iloc[start:start + page_size].to_dict('records')
+
+
+def prefill(source: str, page_size: int, limit: int, parquet_path: str) -> None:
+    import d2p_analysis_engine as engine
+
+    cache = engine.get_embedding_cache()
+    if cache is None:
+        print("[D2P-CACHE] Embedding cache disabled (D2P_EMBEDDING_CACHE=0)", file=sys.stderr)
+        return
+    model = engine.get_sentence_model()
+
+    pages = (_iter_parquet_leads(parquet_path, page_size, limit) if source == 'parquet'
+             else _iter_supabase_leads(page_size, limit))
+
+    totals = {'hits': 0, 'misses': 0}
+    started = time.time()
+    for page in pages:
+        bios = [engine.lead_bio_text(lead) for lead in page]
+        docs = engine.prepare_bertopic_docs(bios, '')
+        _, stats = encode_with_cache(model, engine.EMBEDDING_MODEL_ID, docs, cache)
+        totals['hits'] += stats['hits']
+        totals['misses'] += stats['misses']
+        print(f"[D2P-CACHE] {totals['hits'] + totals['misses']} docs "
+              f"(hits={totals['hits']}, encoded={totals['misses']}, {time.time() - started:.0f}s)",
+              file=sys.stderr)
+
+    print(f"[D2P-CACHE] Prefill done: {cache.stats()}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="D2P sentence embedding cache")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_prefill = sub.add_parser('prefill', help="Warm the cache from the whole lead corpus")
+    p_prefill.add_argument("--source", choices=['supabase', 'parquet'], default='supabase')
+    p_prefill.add_argument("--parquet", default=os.path.join(os.path.dirname(__file__), '..', 'data',
+                                                             'lead_embeddings.parquet'))
+    p_prefill.add_argument("--page-size", type=int, default=1000)
+    p_prefill.add_argument("--limit", type=int, default=0, help="Max leads (0=all)")
+    sub.add_parser('stats', help="Print cache size")
+    args = parser.parse_args()
+
+    if args.command == 'prefill':
+        prefill(args.source, args.page_size, args.limit, args.parquet)
+    else:
+        import d2p_analysis_engine as engine
+        cache = engine.get_embedding_cache()
+        print(cache.stats() if cache else {'enabled': False})
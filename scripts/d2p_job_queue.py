@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+D2P Job Queue - prioritised, single-flight scheduler in front of run_analysis
+
+Several dashboard users triggering the same market analysis at once used to
+start one engine process each. The queue keeps jobs in SQLite and runs them
+on the pre-forked d2p_worker pool, one job per worker at a time:
+
+- priorities: higher first, FIFO within a priority
+- single-flight: a submission whose coalescing key (market, view modes,
+  options and lead-set fingerprint — the result cache key — plus deadline_ms)
+  matches a queued or running job joins that job instead of starting
+  another; the job keeps the highest priority asked for
+- results by polling (GET /jobs/<id>?wait=30 long-polls) or by callback:
+  every submitter's callback_url gets a POST when the job finishes
+- jobs left running by a previous server are re-queued on start; finished
+  jobs are kept for D2P_QUEUE_RETENTION_HOURS
+
+HTTP API (JSON):
+    POST /jobs          {"input": {<engine payload>}, "priority": 0, "callback_url": null}
+                        → 202 {"job_id", "status", "coalesced", "position"}
+    GET  /jobs/<id>     → {"job_id", "status", "priority", "requests", "wait_ms", "run_ms", "result"?}
+                          ?wait=N blocks up to N seconds for the job to finish
+    GET  /metrics       → queue depth (per priority), running, oldest wait, wait / run time
+                          percentiles and coalesced submissions over the last hour
+    GET  /health
+
+Uso:
+    python scripts/d2p_job_queue.py [--port 8765] [--workers 2] [--threads N] [--db path]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import d2p_analysis_engine as engine
+from d2p_cache import make_key
+from d2p_threads import budget_from_env
+from d2p_worker import DEFAULT_MAX_JOBS, DEFAULT_MAX_RSS_MB, DEFAULT_WORKERS, WorkerPool
+
+DEFAULT_PORT = 8765
+RETENTION_HOURS = float(os.environ.get('D2P_QUEUE_RETENTION_HOURS', '24'))
+METRICS_WINDOW_S = 3600
+CALLBACK_ATTEMPTS = 3
+CALLBACK_TIMEOUT_S = 10
+TERMINAL = ('done', 'failed')
+
+
+def coalesce_key(input_data: Dict[str, Any]) -> str:
+    """Result cache key of the request (+ deadline_ms, which changes what a run may skip)."""
+    leads = input_data.get('leads')
+    if leads:
+        lead_set = engine.lead_set_fingerprint(
+            [lead.get('lead_id') or '' for lead in leads], [engine.lead_bio_text(lead) for lead in leads]
+        )
+    else:
+        lead_set = f"session:{input_data.get('session_id')}"
+    return make_key(result_key=engine.result_cache_key(input_data, lead_set), deadline_ms=input_data.get('deadline_ms'))
+
+
+def _percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {'p50': round(pick(0.5), 1), 'p95': round(pick(0.95), 1), 'max': round(values[-1], 1)}
+
+
+class JobStore:
+    """Jobs table in SQLite; one connection shared by the server's threads under a lock."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                coalesce_key TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                payload TEXT,
+                result TEXT,
+                market_name TEXT,
+                requests INTEGER NOT NULL DEFAULT 1,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_queue ON jobs(status, priority DESC, submitted_at);
+            CREATE INDEX IF NOT EXISTS jobs_key ON jobs(coalesce_key, status);
+            CREATE TABLE IF NOT EXISTS callbacks (job_id TEXT NOT NULL, url TEXT NOT NULL);
+        ''')
+        self._db.commit()
+
+    def submit(self, input_data: Dict[str, Any], key: str, priority: int = 0,
+               callback_url: Optional[str] = None) -> Tuple[str, bool]:
+        """(job_id, coalesced): joins an in-flight job with the same key, else queues a new one."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE coalesce_key = ? AND status IN ('queued', 'running') LIMIT 1", (key,)
+            ).fetchone()
+            if row is not None:
+                job_id, coalesced = row[0], True
+                self._db.execute('UPDATE jobs SET requests = requests + 1, priority = MAX(priority, ?) WHERE id = ?',
+                                 (priority, job_id))
+            else:
+                job_id, coalesced = uuid.uuid4().hex, False
+                self._db.execute(
+                    'INSERT INTO jobs (id, coalesce_key, priority, status, payload, market_name, submitted_at) '
+                    "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, key, priority, json.dumps(input_data, ensure_ascii=False),
+                     input_data.get('market_name'), time.time()),
+                )
+            if callback_url:
+                self._db.execute('INSERT INTO callbacks (job_id, url) VALUES (?, ?)', (job_id, callback_url))
+            self._db.commit()
+        return job_id, coalesced
+
+    def claim_next(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Highest-priority, oldest queued job, marked running."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY priority DESC, submitted_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 "
+                             "WHERE id = ?", (time.time(), row[0]))
+            self._db.commit()
+        return row[0], json.loads(row[1])
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> List[str]:
+        """Store the result (the payload is dropped); returns the callback URLs to notify."""
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, result = ?, payload = NULL, finished_at = ? WHERE id = ?',
+                ('done' if result.get('success') else 'failed', json.dumps(result, ensure_ascii=False),
+                 time.time(), job_id),
+            )
+            urls = [r[0] for r in self._db.execute('SELECT url FROM callbacks WHERE job_id = ?', (job_id,))]
+            self._db.execute('DELETE FROM callbacks WHERE job_id = ?', (job_id,))
+            self._db.commit()
+        return urls
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT status, priority, requests, submitted_at, started_at, finished_at, result, market_name '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            status, priority, requests, submitted_at, started_at, finished_at, result, market_name = row
+            job: Dict[str, Any] = {
+                'job_id': job_id, 'status': status, 'priority': priority, 'requests': requests,
+                'market_name': market_name,
+                'wait_ms': round(((started_at or time.time()) - submitted_at) * 1000, 1),
+                'run_ms': round((finished_at - started_at) * 1000, 1) if finished_at and started_at else None,
+            }
+            if status == 'queued':
+                job['position'] = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                    '(priority > ? OR (priority = ? AND submitted_at < ?))', (priority, priority, submitted_at)
+                ).fetchone()[0]
+        if result is not None:
+            job['result'] = json.loads(result)
+        return job
+
+    def requeue_running(self) -> int:
+        """Jobs a previous server left running go back to the queue."""
+        with self._lock:
+            cur = self._db.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+            self._db.commit()
+        return cur.rowcount
+
+    def purge(self, retention_s: float) -> int:
+        with self._lock:
+            cur = self._db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                                   (time.time() - retention_s,))
+            self._db.commit()
+        return cur.rowcount
+
+    def metrics(self, window_s: float = METRICS_WINDOW_S) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            depth = dict(self._db.execute(
+                "SELECT priority, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY priority"
+            ).fetchall())
+            running = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+            oldest = self._db.execute("SELECT MIN(submitted_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            finished = self._db.execute(
+                'SELECT status, submitted_at, started_at, finished_at FROM jobs WHERE finished_at >= ?',
+                (now - window_s,)
+            ).fetchall()
+            coalesced = self._db.execute(
+                'SELECT COALESCE(SUM(requests - 1), 0) FROM jobs WHERE submitted_at >= ?', (now - window_s,)
+            ).fetchone()[0]
+        return {
+            'queue_depth': sum(depth.values()),
+            'queue_depth_by_priority': {str(p): n for p, n in sorted(depth.items(), reverse=True)},
+            'running': running,
+            'oldest_queued_ms': round((now - oldest) * 1000, 1) if oldest else None,
+            'window_s': window_s,
+            'completed': sum(1 for r in finished if r[0] == 'done'),
+            'failed': sum(1 for r in finished if r[0] == 'failed'),
+            'coalesced_requests': coalesced,
+            'wait_ms': _percentiles([(r[2] - r[1]) * 1000 for r in finished if r[2]]),
+            'run_ms': _percentiles([(r[3] - r[2]) * 1000 for r in finished if r[2]]),
+        }
+
+
+class JobScheduler:
+    """Feeds queued jobs to a WorkerPool, never more than one per worker."""
+
+    def __init__(self, store: JobStore, n_workers: int, max_jobs: int, max_rss_mb: float,
+                 threads: Optional[int] = None):
+        self.store = store
+        self.pool = WorkerPool(n_workers, max_jobs, max_rss_mb, threads, on_result=self._on_result)
+        self._slots = threading.Semaphore(n_workers)
+        self._wakeup = threading.Condition()
+        self._finished = threading.Condition()
+        self._stopping = False
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        requeued = self.store.requeue_running()
+        if requeued:
+            print(f"[D2P-QUEUE] Re-queued {requeued} job(s) left running", file=sys.stderr)
+        self.store.purge(RETENTION_HOURS * 3600)
+        self.pool.start()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def stop(self) -> None:
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        self.pool.shutdown()
+
+    def submit(self, input_data: Dict[str, Any], priority: int = 0, callback_url: Optional[str] = None) -> Dict:
+        job_id, coalesced = self.store.submit(input_data, coalesce_key(input_data), priority, callback_url)
+        with self._wakeup:
+            self._wakeup.notify()
+        job = self.store.get(job_id)
+        return {'job_id': job_id, 'status': job['status'], 'coalesced': coalesced, 'position': job.get('position')}
+
+    def wait(self, job_id: str, timeout_s: float) -> Optional[Dict[str, Any]]:
+        """The job once finished, or as it stands after timeout_s."""
+        deadline = time.monotonic() + timeout_s
+        with self._finished:
+            while True:
+                job = self.store.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job['status'] in TERMINAL or remaining <= 0:
+                    return job
+                self._finished.wait(remaining)
+
+    def _dispatch(self) -> None:
+        last_purge = time.monotonic()
+        while not self._stopping:
+            self._slots.acquire()
+            claimed = None
+            while claimed is None and not self._stopping:
+                claimed = self.store.claim_next()
+                if claimed is None:
+                    with self._wakeup:
+                        self._wakeup.wait(timeout=1.0)
+                if time.monotonic() - last_purge > 3600:
+                    self.store.purge(RETENTION_HOURS * 3600)
+                    last_purge = time.monotonic()
+            if claimed is None:
+                self._slots.release()
+                return
+            job_id, input_data = claimed
+            self.pool.submit(job_id, input_data)
+
+    def _on_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        urls = self.store.finish(job_id, result)
+        self._slots.release()
+        with self._finished:
+            self._finished.notify_all()
+        for url in urls:
+            threading.Thread(target=_post_callback, args=(url, job_id, result), daemon=True).start()
+
+
+def _post_callback(url: str, job_id: str, result: Dict[str, Any]) -> None:
+    body = json.dumps({'job_id': job_id, 'status': 'done' if result.get('success') else 'failed',
+                       'result': result}, ensure_ascii=False).encode('utf-8')
+    for attempt in range(CALLBACK_ATTEMPTS):
+        try:
+            request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(request, timeout=CALLBACK_TIMEOUT_S):
+                return
+        except Exception as e:
+            print(f"[D2P-QUEUE] Callback {url} for {job_id} failed (attempt {attempt + 1}): {e}", file=sys.stderr)
+            time.sleep(2 ** attempt)
+
+
+def make_handler(scheduler: JobScheduler):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self) -> None:
+            if urlparse(self.path).path != '/jobs':
+                return self._reply(404, {'error': 'not found'})
+            try:
+                message = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+            except json.JSONDecodeError as e:
+                return self._reply(400, {'error': f'Invalid JSON input: {e}'})
+            input_data = message['input'] if 'input' in message else message
+            try:
+                submitted = scheduler.submit(input_data, int(message.get('priority', 0)), message.get('callback_url'))
+            except Exception as e:
+                return self._reply(400, {'error': f'Could not queue job: {e}'})
+            self._reply(202, submitted)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path == '/metrics':
+                return self._reply(200, {**scheduler.store.metrics(), 'workers': scheduler.pool.n_workers,
+                                         'pool': scheduler.pool.stats})
+            if url.path == '/health':
+                return self._reply(200, {'ok': True})
+            if url.path.startswith('/jobs/'):
+                wait_s = float(parse_qs(url.query).get('wait', ['0'])[0])
+                job_id = url.path[len('/jobs/'):]
+                job = scheduler.wait(job_id, min(wait_s, 300)) if wait_s > 0 else scheduler.store.get(job_id)
+                return self._reply(200, job) if job else self._reply(404, {'error': 'unknown job'})
+            self._reply(404, {'error': 'not found'})
+
+        def log_message(self, fmt: str, *args) -> None:
+            pass
+
+    return Handler
+
+
+def serve(port: int, db_path: str, n_workers: int, max_jobs: int, max_rss_mb: float,
+          threads: Optional[int] = None, host: str = '127.0.0.1') -> None:
+    scheduler = JobScheduler(JobStore(db_path), n_workers, max_jobs, max_rss_mb, threads)
+    scheduler.start()
+    server = ThreadingHTTPServer((host, port), make_handler(scheduler))
+    print(f"[D2P-QUEUE] Listening on http://{host}:{port} ({n_workers} workers, "
+          f"{scheduler.pool.threads} threads each, db={db_path})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="D2P analysis job queue (HTTP)")
+    parser.add_argument("--host", default=os.environ.get('D2P_QUEUE_HOST', '127.0.0.1'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('D2P_QUEUE_PORT', DEFAULT_PORT)))
+    parser.add_argument("--db", default=os.environ.get('D2P_QUEUE_DB', os.path.join(engine.CACHE_DIR, 'jobs.sqlite')))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('D2P_WORKERS', DEFAULT_WORKERS)))
+    parser.add_argument("--threads", type=int, default=budget_from_env(),
+                        help="Thread budget per worker (default D2P_THREADS, else cores / workers)")
+    parser.add_argument("--max-jobs", type=int, default=int(os.environ.get('D2P_WORKER_MAX_JOBS', DEFAULT_MAX_JOBS)))
+    parser.add_argument("--max-rss-mb", type=float,
+                        default=float(os.environ.get('D2P_WORKER_MAX_RSS_MB', DEFAULT_MAX_RSS_MB)))
+    args = parser.parse_args()
+
+    serve(args.port, args.db, max(1, args.workers), max(1, args.max_jobs), args.max_rss_mb, args.threads, args.host)
@@ -0,0 +1,104 @@
+"""
+D2P Lexicon Matcher - single-pass multi-pattern matching over every signal list
+
+One Aho-Corasick automaton is compiled over all lexicons (business owner
+signals, frequency/volume/manual signals, operational verbs, context nouns,
+workaround tools). Scanning a text once yields every term it contains,
+grouped per lexicon — exactly the set of terms for which `term in text`
+is True, overlapping matches included.
+
+Uses the pyahocorasick C extension when installed, otherwise a pure-Python
+automaton with identical results.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+try:
+    import ahocorasick
+    _ahocorasick_available = True
+except ImportError:
+    _ahocorasick_available = False
+
+
+class LexiconMatcher:
+    """Compiled automaton over {lexicon_name: [terms]}; terms must be lowercase."""
+
+    def __init__(self, lexicons: Dict[str, Iterable[str]]):
+        # term → lexicons it belongs to (a term may live in several lists)
+        self._owners: Dict[str, Tuple[str, ...]] = {}
+        for name, terms in lexicons.items():
+            for term in terms:
+                if term:
+                    self._owners[term] = self._owners.get(term, ()) + (name,)
+
+        self.lexicon_names = tuple(lexicons)
+        self.backend = 'pyahocorasick' if _ahocorasick_available else 'python'
+        if _ahocorasick_available:
+            self._automaton = ahocorasick.Automaton()
+            for term in self._owners:
+                self._automaton.add_word(term, term)
+            self._automaton.make_automaton()
+        else:
+            self._build_python_automaton()
+
+    def _build_python_automaton(self) -> None:
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Tuple[str, ...]] = [()]
+
+        for term in self._owners:
+            state = 0
+            for ch in term:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    goto.append({})
+                    out.append(())
+                    nxt = len(goto) - 1
+                    goto[state][ch] = nxt
+                state = nxt
+            out[state] = out[state] + (term,)
+
+        # BFS for failure links; outputs are merged along the fail chain so a
+        # state reports every term ending at that position.
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Yield (start, end, term) for every occurrence; text[start:end] == term."""
+        if _ahocorasick_available:
+            for end_idx, term in self._automaton.iter(text):
+                yield end_idx - len(term) + 1, end_idx + 1, term
+            return
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for term in out[state]:
+                    yield i - len(term) + 1, i + 1, term
+
+    def group(self, terms: Iterable[str]) -> Dict[str, Set[str]]:
+        """Group matched terms by lexicon: {lexicon_name: {terms}} (hit lexicons only)."""
+        hits: Dict[str, Set[str]] = {}
+        for term in terms:
+            for name in self._owners[term]:
+                hits.setdefault(name, set()).add(term)
+        return hits
+
+    def scan(self, text: str) -> Dict[str, Set[str]]:
+        """Per-lexicon hit sets for a (lowercased) text, in a single pass."""
+        return self.group({term for _, _, term in self.iter_matches(text)})
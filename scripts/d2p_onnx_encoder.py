@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+D2P ONNX Encoder - int8 ONNX Runtime drop-in for the SentenceTransformer model
+
+The sentence model's transformer is exported to ONNX once (needs torch +
+sentence-transformers, i.e. the regular install), dynamically quantized to
+int8 weights and kept under <cache_dir>/<model>/ together with its
+tokenizer.json and pooling settings. At runtime only onnxruntime and
+tokenizers are used.
+
+encode() mirrors SentenceTransformer.encode for the arguments the engine
+uses. Sentences are tokenized once, sorted by length and packed into batches
+of up to batch_tokens padded tokens (and max_batch_size rows), so short bios
+are not padded to the length of the longest one; output order is the input
+order.
+
+Uso:
+    python scripts/d2p_onnx_encoder.py export [--model paraphrase-multilingual-MiniLM-L12-v2]
+"""
+
+import argparse
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    _onnx_available = True
+except ImportError:
+    _onnx_available = False
+
+DEFAULT_MAX_SEQ_LENGTH = 128
+DEFAULT_BATCH_TOKENS = 8192
+DEFAULT_MAX_BATCH_SIZE = 128
+
+
+def onnx_encoder_available() -> bool:
+    return _onnx_available
+
+
+def _model_dir(cache_dir: str, model_name: str) -> str:
+    return os.path.join(cache_dir, model_name.replace('/', '__'))
+
+
+def export_model(model_name: str, cache_dir: str, quantize: bool = True) -> str:
+    """Export (and quantize) the transformer of a SentenceTransformer; returns the model dir."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    target = _model_dir(cache_dir, model_name)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp_')
+
+    st = SentenceTransformer(model_name, device='cpu')
+    transformer = st[0].auto_model.eval()
+    pooling = st[1].get_pooling_mode_str() if len(st) > 1 and hasattr(st[1], 'get_pooling_mode_str') else 'mean'
+    normalize = any(type(module).__name__ == 'Normalize' for module in st)
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    dummy = st.tokenizer(["exemplo de bio"], return_tensors='pt')
+    fp32_path = os.path.join(tmp, 'model.onnx')
+    # TorchScript exporter: newer torch defaults to the dynamo one (needs onnxscript)
+    export_kwargs = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(transformer),
+            (dummy['input_ids'], dummy['attention_mask']),
+            fp32_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['last_hidden_state'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'seq'},
+                'attention_mask': {0: 'batch', 1: 'seq'},
+                'last_hidden_state': {0: 'batch', 1: 'seq'},
+            },
+            opset_version=14,
+            **export_kwargs,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(tmp, 'model.int8.onnx'), weight_type=QuantType.QInt8)
+
+    st.tokenizer.save_pretrained(tmp)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({
+            'model_name': model_name,
+            'pooling': pooling,
+            'normalize': normalize,
+            'dimension': st.get_sentence_embedding_dimension(),
+            'max_position': int(getattr(transformer.config, 'max_position_embeddings', 512)),
+        }, f)
+
+    old = None
+    if os.path.exists(target):
+        old = tempfile.mkdtemp(dir=cache_dir, prefix='.old_')
+        os.replace(target, os.path.join(old, 'entry'))
+    os.replace(tmp, target)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+    return target
+
+
+class OnnxSentenceEncoder:
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str,
+        max_seq_length: int = DEFAULT_MAX_SEQ_LENGTH,
+        quantized: bool = True,
+        batch_tokens: int = DEFAULT_BATCH_TOKENS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        intra_op_threads: int = 0,
+    ):
+        if not _onnx_available:
+            raise ImportError("onnxruntime and tokenizers are required for the ONNX encoder")
+        path = _model_dir(cache_dir, model_name)
+        model_file = 'model.int8.onnx' if quantized else 'model.onnx'
+        if not os.path.exists(os.path.join(path, model_file)):
+            print(f"[D2P] Exporting {model_name} to ONNX (one-time)...", file=sys.stderr)
+            export_model(model_name, cache_dir, quantize=True)
+
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta: Dict = json.load(f)
+        self.model_name = model_name
+        self.max_seq_length = min(max_seq_length, self.meta.get('max_position', 512) - 2)
+        self.quantized = quantized
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, 'tokenizer.json'))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        pad_ids = [self.tokenizer.token_to_id(t) for t in ('<pad>', '[PAD]')]
+        self._pad_id = next((i for i in pad_ids if i is not None), 0)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(path, model_file), options, providers=['CPUExecutionProvider']
+        )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta['dimension']
+
+    def _batches(self, lengths: Sequence[int], max_rows: int) -> List[np.ndarray]:
+        """Indices sorted by length, cut so each batch pads to at most batch_tokens."""
+        order = np.argsort(lengths, kind='stable')
+        batches, current, longest = [], [], 0
+        for idx in order:
+            longest_if_added = max(longest, lengths[idx])
+            if current and (longest_if_added * (len(current) + 1) > self.batch_tokens
+                            or len(current) >= max_rows):
+                batches.append(np.asarray(current))
+                current, longest_if_added = [], lengths[idx]
+            current.append(idx)
+            longest = longest_if_added
+        if current:
+            batches.append(np.asarray(current))
+        return batches
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.meta.get('pooling') == 'cls':
+            return hidden[:, 0]
+        weights = mask[:, :, None].astype(np.float32)
+        return (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences: Sequence[str],
+        batch_size: Optional[int] = None,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        out = np.zeros((len(sentences), self.meta['dimension']), dtype=np.float32)
+        if not len(sentences):
+            return out
+
+        encodings = self.tokenizer.encode_batch(list(sentences))
+        lengths = [len(e.ids) for e in encodings]
+        max_rows = self.max_batch_size if batch_size is None else min(batch_size, self.max_batch_size)
+
+        for batch in self._batches(lengths, max_rows):
+            width = max(lengths[i] for i in batch)
+            input_ids = np.full((len(batch), width), self._pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+            for row, i in enumerate(batch):
+                input_ids[row, :lengths[i]] = encodings[i].ids
+                attention_mask[row, :lengths[i]] = 1
+            hidden = self.session.run(None, {'input_ids': input_ids, 'attention_mask': attention_mask})[0]
+            out[batch] = self._pool(hidden, attention_mask)
+
+        if normalize_embeddings or self.meta.get('normalize'):
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out[0] if single else out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="D2P ONNX sentence encoder")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_export = sub.add_parser('export', help="Export + quantize the sentence model")
+    p_export.add_argument("--model", default='paraphrase-multilingual-MiniLM-L12-v2')
+    p_export.add_argument("--cache-dir", default=os.path.join(
+        os.environ.get('D2P_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')), 'onnx'))
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print(f"[D2P] Exported to {export_model(args.model, args.cache_dir)}", file=sys.stderr)
@@ -0,0 +1,116 @@
+"""
+D2P Prompt - token counting and budgeted rendering of the LLM data block
+
+Prompts are laid out as [static instructions][per-market data] so providers
+that cache identical prompt prefixes (OpenAI does automatically above 1024
+tokens) can reuse the instruction part across markets. Only the data block
+varies, and it is the part trimmed to fit the input token budget:
+
+    1. fewer / shorter representative bios per topic
+    2. fewer keywords per topic
+    3. drop the trailing (lowest friction score) topics
+
+Token counts use tiktoken when installed and its encoding loads (the BPE
+files are downloaded on first use), otherwise ~4 characters per token.
+"""
+
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+    _tiktoken_available = True
+except ImportError:
+    _tiktoken_available = False
+
+CHARS_PER_TOKEN = 4
+
+# (keywords per topic, bios per topic, chars per bio), most to least detailed
+TRIM_LEVELS = [
+    (6, 2, 150),
+    (6, 1, 150),
+    (6, 1, 80),
+    (4, 1, 80),
+    (4, 0, 0),
+    (3, 0, 0),
+]
+
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: str):
+    """tiktoken encoding for model; None (remembered) when it cannot be loaded, e.g. offline."""
+    if model not in _encodings:
+        try:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding('o200k_base')
+        except Exception as e:
+            print(f"[D2P] tiktoken encoding unavailable for {model} ({e}), "
+                  f"estimating {CHARS_PER_TOKEN} chars per token", file=sys.stderr)
+            _encodings[model] = None
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = 'gpt-4o-mini') -> int:
+    encoding = _encoding(model) if _tiktoken_available else None
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_topics(
+    topic_keywords: List[List[str]],
+    representative_bios: Optional[List[List[str]]],
+    n_keywords: int,
+    n_bios: int,
+    bio_chars: int,
+) -> str:
+    topics_formatted = []
+    for i, kws in enumerate(topic_keywords):
+        if not kws:
+            continue
+        topic_line = f"Tópico {i}: palavras-chave=[{', '.join(kws[:n_keywords])}]"
+        # Attach representative bios if available
+        if n_bios and representative_bios and i < len(representative_bios) and representative_bios[i]:
+            bios_text = " | ".join(b[:bio_chars] for b in representative_bios[i][:n_bios])
+            topic_line += f" — exemplos de bios: \"{bios_text}\""
+        topics_formatted.append(topic_line)
+    if not topics_formatted:
+        return ""
+    return "- Tópicos BERTopic descobertos nos dados:\n  " + "\n  ".join(topics_formatted)
+
+
+def fit_topics_to_budget(
+    topic_keywords: Optional[List[List[str]]],
+    representative_bios: Optional[List[List[str]]],
+    max_tokens: Optional[int],
+    model: str = 'gpt-4o-mini',
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Most detailed topic block that fits in max_tokens (None = no limit).
+    Returns (text, trim) where trim records the level used and topics kept.
+    """
+    topic_keywords = topic_keywords or []
+    trim: Dict[str, Any] = {'level': 0, 'topics_total': len(topic_keywords), 'topics_kept': len(topic_keywords)}
+    if not topic_keywords:
+        return "", trim
+
+    text = ""
+    for level, (n_keywords, n_bios, bio_chars) in enumerate(TRIM_LEVELS):
+        text = format_topics(topic_keywords, representative_bios, n_keywords, n_bios, bio_chars)
+        if max_tokens is None or count_tokens(text, model) <= max_tokens:
+            trim['level'] = level
+            return text, trim
+
+    # Still too long at the leanest level: drop topics from the end (friction
+    # units arrive sorted by friction score, so the weakest go first)
+    n_keywords, n_bios, bio_chars = TRIM_LEVELS[-1]
+    trim['level'] = len(TRIM_LEVELS) - 1
+    kept = len(topic_keywords)
+    while kept > 0 and count_tokens(text, model) > max_tokens:
+        kept -= 1
+        text = format_topics(topic_keywords[:kept], representative_bios, n_keywords, n_bios, bio_chars)
+    trim['topics_kept'] = kept
+    return text, trim
@@ -0,0 +1,271 @@
+"""
+D2P Sweep - reduce once, then grid-search HDBSCAN parameters in parallel
+
+Tuning min_cluster_size / min_samples by re-running the pipeline pays for
+UMAP every time, although only the clustering changes. Sweep mode:
+
+1. reduces the embeddings once; the reduced matrix and the fitted reducer are
+   cached on disk (keyed by embeddings + reducer settings), so repeated sweeps
+   over the same leads skip the reduction entirely
+2. fits HDBSCAN for every (min_cluster_size, min_samples) pair of the grid in
+   a process pool (SweepRunner), spread across cores — inline under
+   d2p_worker, whose daemonic children cannot start one
+3. scores each config:
+       SCORE_WEIGHTS['dbcv']     × relative_validity_ (HDBSCAN's fast DBCV), clipped at 0
+     + SCORE_WEIGHTS['coverage'] × share of docs not marked as outliers
+     + SCORE_WEIGHTS['topics']   × 1 inside [topics_min, topics_max], decaying outside
+
+The winner is fitted by BERTopic through PrefittedReducer, which hands back
+the cached reduced matrix for the fit and delegates transform() of new docs
+to the fitted reducer — so the stored model still supports warm starts.
+"""
+
+import hashlib
+import multiprocessing as mp
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from d2p_backends import make_reducer
+
+SCORE_WEIGHTS = {'dbcv': 0.4, 'coverage': 0.4, 'topics': 0.2}
+MIN_CLUSTER_FACTORS = (0.5, 0.75, 1.0, 1.5, 2.0)
+MIN_SAMPLES_FACTORS = (0.15, 0.33, 0.66)
+
+
+def default_grid(min_cluster_size: int, min_samples: int) -> List[Tuple[int, int]]:
+    """Pairs around the heuristic values create_bertopic_model would use."""
+    sizes = sorted({max(5, round(min_cluster_size * f)) for f in MIN_CLUSTER_FACTORS})
+    grid = set()
+    for size in sizes:
+        for f in MIN_SAMPLES_FACTORS:
+            grid.add((size, max(1, round(size * f))))
+        grid.add((size, min(size, min_samples)))
+    return sorted(grid)
+
+
+class PrefittedReducer:
+    """
+    Reducer that was already fitted on the training embeddings: fit_transform
+    returns the cached reduction, transform() goes to the fitted reducer.
+    The cached matrix is not pickled.
+    """
+
+    def __init__(self, reducer, reduced: np.ndarray):
+        self.reducer = reducer
+        self.reduced = reduced
+
+    def fit(self, X, y=None) -> 'PrefittedReducer':
+        return self
+
+    def fit_transform(self, X, y=None) -> np.ndarray:
+        if self.reduced is not None and len(X) == len(self.reduced):
+            return self.reduced
+        return self.reducer.fit_transform(X)
+
+    def transform(self, X) -> np.ndarray:
+        return self.reducer.transform(X)
+
+    def __getstate__(self):
+        return {'reducer': self.reducer, 'reduced': None}
+
+
+class ReducedMatrixCache:
+    """<root>/<key>.npy (reduced matrix) + <key>.pkl (fitted reducer), newest max_entries kept."""
+
+    def __init__(self, root: str, max_entries: int = 8):
+        self.root = root
+        self.max_entries = max_entries
+
+    @staticmethod
+    def key(embeddings: np.ndarray, **settings: Any) -> str:
+        h = hashlib.sha1(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        h.update(repr(sorted(settings.items())).encode('utf-8'))
+        return h.hexdigest()
+
+    def load(self, key: str) -> Optional[Tuple[Any, np.ndarray]]:
+        try:
+            reduced = np.load(os.path.join(self.root, f"{key}.npy"))
+            with open(os.path.join(self.root, f"{key}.pkl"), 'rb') as f:
+                reducer = pickle.load(f)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        os.utime(os.path.join(self.root, f"{key}.npy"))
+        return reducer, reduced
+
+    def save(self, key: str, reducer, reduced: np.ndarray) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        for suffix, write in (('.pkl', lambda f: pickle.dump(reducer, f)), ('.npy', lambda f: np.save(f, reduced))):
+            tmp = os.path.join(self.root, f".tmp_{os.getpid()}_{key}{suffix}")
+            with open(tmp, 'wb') as f:
+                write(f)
+            os.replace(tmp, os.path.join(self.root, f"{key}{suffix}"))
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(
+            (e for e in os.scandir(self.root) if e.name.endswith('.npy') and not e.name.startswith('.')),
+            key=lambda e: e.stat().st_mtime, reverse=True,
+        )
+        for entry in entries[self.max_entries:]:
+            for suffix in ('.npy', '.pkl'):
+                try:
+                    os.unlink(entry.path[:-4] + suffix)
+                except OSError:
+                    pass
+
+
+def reduce_once(
+    embeddings: np.ndarray,
+    reducer_name: str,
+    n_components: int,
+    n_neighbors: int,
+    deterministic: bool,
+    cache: Optional[ReducedMatrixCache] = None,
+) -> Tuple[PrefittedReducer, Dict[str, Any]]:
+    settings = {'reducer': reducer_name, 'n_components': n_components, 'n_neighbors': n_neighbors,
+                'deterministic': deterministic}
+    key = ReducedMatrixCache.key(embeddings, **settings) if cache is not None else None
+    t0 = time.perf_counter()
+    cached = cache.load(key) if cache is not None else None
+    if cached is not None:
+        reducer, reduced = cached
+        status = 'hit'
+    else:
+        reducer = make_reducer(reducer_name, n_components, n_neighbors, deterministic)
+        reduced = np.nan_to_num(np.asarray(reducer.fit_transform(embeddings), dtype=np.float32))
+        status = 'miss' if cache is not None else 'disabled'
+        if cache is not None:
+            try:
+                cache.save(key, reducer, reduced)
+            except OSError:
+                status = 'miss_not_saved'
+    report = {**settings, 'cache': status, 'reduce_ms': round((time.perf_counter() - t0) * 1000, 1)}
+    return PrefittedReducer(reducer, reduced), report
+
+
+def _evaluate(reduced: np.ndarray, params: Tuple[int, int]) -> Dict[str, Any]:
+    from hdbscan import HDBSCAN
+    min_cluster_size, min_samples = params
+    t0 = time.perf_counter()
+    clusterer = HDBSCAN(
+        min_cluster_size=min_cluster_size,
+        min_samples=min_samples,
+        metric='euclidean',
+        cluster_selection_method='leaf',
+        gen_min_span_tree=True,
+        core_dist_n_jobs=1,
+    ).fit(reduced)
+    labels = clusterer.labels_
+    n_topics = int(labels.max()) + 1 if len(labels) else 0
+    try:
+        dbcv = float(clusterer.relative_validity_) if n_topics > 1 else 0.0
+    except (ValueError, ZeroDivisionError):
+        dbcv = 0.0
+    return {
+        'min_cluster_size': min_cluster_size,
+        'min_samples': min_samples,
+        'topics': n_topics,
+        'coverage': round(float((labels != -1).mean()), 4),
+        'dbcv': round(dbcv if np.isfinite(dbcv) else 0.0, 4),
+        'fit_ms': round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+
+def _topic_count_score(n_topics: int, topics_min: int, topics_max: int) -> float:
+    if n_topics < topics_min:
+        return n_topics / topics_min
+    if n_topics > topics_max:
+        return topics_max / n_topics
+    return 1.0
+
+
+def _warm_up() -> None:
+    """Pool initializer: import what _evaluate needs before the first config arrives."""
+    import hdbscan  # noqa: F401  (already loaded when the forkserver preloaded it)
+
+
+def _pool_context():
+    """forkserver with this module (and hdbscan) preloaded once; spawn where unavailable."""
+    if 'forkserver' not in mp.get_all_start_methods():
+        return mp.get_context('spawn')
+    ctx = mp.get_context('forkserver')
+    ctx.set_forkserver_preload(['d2p_sweep', 'hdbscan'])
+    return ctx
+
+
+class SweepRunner:
+    """
+    Evaluates the grid in a process pool of min(workers, configs) processes.
+
+    Workers come from a forkserver (spawn where there is none), never from a
+    fork of the engine: a forked child inherits the locks of the parent's
+    numba / OpenMP / torch threads, and the parent then hangs at exit. The
+    forkserver imports this module and hdbscan once; every worker runs
+    _warm_up on start, which does the import itself under spawn.
+    Pre-forked d2p_worker children are daemonic and cannot start a pool, so
+    there (and with a single worker) configs run inline; run() says why.
+    """
+
+    def __init__(self, n_configs: int, workers: Optional[int] = None):
+        self.workers = max(1, min(workers or os.cpu_count() or 1, n_configs))
+        self.parallel = 'process_pool'
+        self.note: Optional[str] = None
+        if mp.current_process().daemon:
+            self.workers, self.parallel = 1, 'inline (daemon process)'
+            self.note = ('d2p_worker processes are daemonic and cannot start a process pool, '
+                         'so the grid ran inline on one core')
+        elif self.workers == 1:
+            self.parallel = 'inline'
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> 'SweepRunner':
+        if self.workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context(),
+                                             initializer=_warm_up)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def run(
+        self,
+        reduced: np.ndarray,
+        grid: Sequence[Tuple[int, int]],
+        topics_min: int = 5,
+        topics_max: int = 40,
+    ) -> Dict[str, Any]:
+        """Evaluate every grid point; scoreboard sorted best first."""
+        t0 = time.perf_counter()
+        evaluate = partial(_evaluate, reduced)
+        if self._pool is None:
+            rows = [evaluate(p) for p in grid]
+        else:
+            # One chunk per worker, so the matrix is pickled once per process
+            rows = list(self._pool.map(evaluate, grid, chunksize=-(-len(grid) // self.workers)))
+
+        for row in rows:
+            row['score'] = round(
+                SCORE_WEIGHTS['dbcv'] * max(0.0, row['dbcv'])
+                + SCORE_WEIGHTS['coverage'] * row['coverage']
+                + SCORE_WEIGHTS['topics'] * _topic_count_score(row['topics'], topics_min, topics_max), 4)
+        rows.sort(key=lambda r: (-r['score'], -r['min_cluster_size']))
+
+        return {
+            'best': rows[0] if rows else None,
+            'scoreboard': rows,
+            'configs': len(rows),
+            'workers': self.workers,
+            'parallel': self.parallel,
+            **({'note': self.note} if self.note else {}),
+            'grid_ms': round((time.perf_counter() - t0) * 1000, 1),
+            'topics_range': [topics_min, topics_max],
+            'weights': SCORE_WEIGHTS,
+        }
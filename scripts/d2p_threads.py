@@ -0,0 +1,99 @@
+"""
+D2P Threads - one thread budget for every native pool run_analysis touches
+
+Left alone, each runtime sizes its pool to all cores: torch intra-op,
+numba (UMAP / pynndescent), OpenMP and BLAS (numpy, scikit-learn, HDBSCAN),
+HuggingFace tokenizers (rayon) and onnxruntime. Two or three analyses on one
+host then run 3× oversubscribed.
+
+A budget of N threads is applied in two layers:
+
+    configure_env(N)  environment caps, read by the runtimes when they load —
+                      must run before the heavy imports (the engine calls it
+                      first thing with D2P_THREADS)
+    apply_budget(N)   runtime limits for libraries already loaded (threadpoolctl,
+                      torch.set_num_threads, numba.set_num_threads); numba can
+                      only go down from the pool size it started with
+
+current_budget() is what the engine hands to pools it sizes itself (HDBSCAN
+core-distance jobs, sweep workers, onnxruntime intra-op threads).
+effective_threads() reports what each runtime actually ended up with.
+"""
+
+import os
+import sys
+from typing import Any, Dict, Optional
+
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+    'NUMBA_NUM_THREADS',
+    'RAYON_NUM_THREADS',   # tokenizers
+    'RAYON_RS_NUM_CPUS',   # tokenizers < 0.14
+)
+
+_budget: Optional[int] = None
+_blas_limits = None
+
+
+def budget_from_env() -> Optional[int]:
+    """D2P_THREADS as a positive int, None when unset / 0 (= runtime defaults)."""
+    try:
+        threads = int(os.environ.get('D2P_THREADS', '0'))
+    except ValueError:
+        return None
+    return threads if threads > 0 else None
+
+
+def current_budget() -> Optional[int]:
+    return _budget
+
+
+def configure_env(threads: Optional[int]) -> None:
+    """Export the budget to the thread env vars; no effect on pools already started."""
+    global _budget
+    if not threads:
+        return
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    _budget = threads
+
+
+def apply_budget(threads: Optional[int]) -> Dict[str, Any]:
+    """Limit the pools of already imported runtimes; returns effective_threads()."""
+    global _budget, _blas_limits
+    if threads:
+        threads = int(threads)
+        os.environ['RAYON_NUM_THREADS'] = str(threads)
+        try:
+            from threadpoolctl import threadpool_limits
+            _blas_limits = threadpool_limits(limits=threads)
+        except ImportError:
+            pass
+        if 'torch' in sys.modules:
+            sys.modules['torch'].set_num_threads(threads)
+        if 'numba' in sys.modules:
+            numba = sys.modules['numba']
+            numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+        _budget = threads
+    return effective_threads()
+
+
+def effective_threads() -> Dict[str, Any]:
+    report: Dict[str, Any] = {'budget': _budget, 'cpu_count': os.cpu_count()}
+    if 'torch' in sys.modules:
+        report['torch'] = sys.modules['torch'].get_num_threads()
+    if 'numba' in sys.modules:
+        report['numba'] = sys.modules['numba'].get_num_threads()
+    try:
+        from threadpoolctl import threadpool_info
+        report['native'] = {f"{pool['internal_api']}:{pool['user_api']}": pool['num_threads']
+                            for pool in threadpool_info()}
+    except ImportError:
+        pass
+    report['tokenizers'] = int(os.environ['RAYON_NUM_THREADS']) if os.environ.get('RAYON_NUM_THREADS') else None
+    return report
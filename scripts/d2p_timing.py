@@ -0,0 +1,157 @@
+"""
+D2P Timing - per-stage spans (wall, CPU, memory) for run_analysis
+
+    timer = StageTimer()
+    with timer.span('encode'):
+        ...
+    timer.summary()               → {'total_ms', 'spans': [...]} for the result JSON
+    timer.write_chrome_trace(p)   → Trace Event JSON (chrome://tracing, Perfetto, speedscope)
+
+Spans nest: a span opened inside another records it as parent. Each span
+carries wall_ms, cpu_ms (process CPU, all threads), rss_mb at exit and the
+process RSS high-water mark; with trace_memory=True also the Python heap
+peak inside the span (tracemalloc — adds noticeable overhead, off by default).
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+def current_rss_mb() -> float:
+    """Resident set size of the calling process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        # Non-Linux: fall back to the peak, which is an upper bound
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Process RSS high-water mark in MB (ru_maxrss is KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _span_order(span: Dict[str, Any]):
+    # Spans are recorded on exit (children first); order by start, parents first
+    return span['start_ms'], -span['wall_ms']
+
+
+class StageTimer:
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.spans: List[Dict[str, Any]] = []
+        self._stack: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._started_tracemalloc = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[Dict[str, Any]]:
+        """Time a stage; the yielded dict can receive extra args while the span runs."""
+        record: Dict[str, Any] = {'name': name, 'parent': self._stack[-1]['name'] if self._stack else None}
+        record['args'] = dict(args)
+        if self.trace_memory:
+            # tracemalloc has a single peak counter: fold it into the open
+            # spans before resetting it for this one
+            self._fold_py_peak()
+            tracemalloc.reset_peak()
+            record['_py_peak'] = 0
+        self._stack.append(record)
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield record['args']
+        finally:
+            wall1 = time.perf_counter()
+            rss_mb = current_rss_mb()
+            if self.trace_memory:
+                self._fold_py_peak()
+            self._stack.pop()
+            record.update({
+                'start_ms': round((wall0 - self._origin) * 1000, 1),
+                'wall_ms': round((wall1 - wall0) * 1000, 1),
+                'cpu_ms': round((time.process_time() - cpu0) * 1000, 1),
+                'rss_mb': round(rss_mb, 1),
+                'rss_peak_mb': round(max(rss_mb, peak_rss_mb()), 1),
+            })
+            if self.trace_memory:
+                py_peak = record.pop('_py_peak')
+                if self._stack:
+                    self._stack[-1]['_py_peak'] = max(self._stack[-1]['_py_peak'], py_peak)
+                record['py_peak_mb'] = round(py_peak / 1024 / 1024, 1)
+            if not record['args']:
+                del record['args']
+            self.spans.append(record)
+
+    def _fold_py_peak(self) -> None:
+        peak = tracemalloc.get_traced_memory()[1]
+        for open_record in self._stack:
+            open_record['_py_peak'] = max(open_record['_py_peak'], peak)
+
+    @contextmanager
+    def instrument(self, obj: Any, methods: Dict[str, str]) -> Iterator[None]:
+        """
+        Wrap obj's methods in spans ({method_name: span_name}) for the duration
+        of the block. Wrappers live on the instance only and are removed on
+        exit, so the object stays picklable.
+        """
+        installed = []
+        for method_name, span_name in methods.items():
+            method = getattr(obj, method_name, None)
+            if method is None:
+                continue
+
+            def wrapper(*a, _method=method, _span=span_name, **kw):
+                with self.span(_span):
+                    return _method(*a, **kw)
+
+            setattr(obj, method_name, wrapper)
+            installed.append(method_name)
+        try:
+            yield
+        finally:
+            for method_name in installed:
+                obj.__dict__.pop(method_name, None)
+
+    def stop(self) -> None:
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def summary(self) -> Dict[str, Any]:
+        spans = sorted(self.spans, key=_span_order)
+        return {
+            'total_ms': round((time.perf_counter() - self._origin) * 1000, 1),
+            'trace_memory': self.trace_memory,
+            'spans': spans,
+        }
+
+    def write_chrome_trace(self, path: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Write the spans as complete ("X") Trace Event Format events."""
+        pid, tid = os.getpid(), threading.get_ident() % 2 ** 31
+        events = [{
+            'name': s['name'],
+            'cat': 'd2p',
+            'ph': 'X',
+            'ts': int(s['start_ms'] * 1000),
+            'dur': int(s['wall_ms'] * 1000),
+            'pid': pid,
+            'tid': tid,
+            'args': {**s.get('args', {}),
+                     **{k: v for k, v in s.items() if k not in ('name', 'parent', 'start_ms', 'args')}},
+        } for s in sorted(self.spans, key=_span_order)]
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'metadata': metadata or {}}, f)
+        return path
@@ -0,0 +1,116 @@
+"""
+D2P Topic Model Store - fitted BERTopic models persisted per market + view mode
+
+Each entry is a directory <market_slug>__<view_mode>/ holding:
+- model.pkl   BERTopic saved with pickle serialization, so the fitted UMAP,
+              HDBSCAN (with prediction data) and c-TF-IDF come back intact
+- state.json  what the model was fitted on: doc hashes, embedding centroid,
+              outlier share, embedding model, backends — used to decide warm vs cold
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def market_slug(name: str) -> str:
+    """Same slug as generateSlug() in src/services/d2p-unified.service.ts."""
+    normalized = unicodedata.normalize('NFD', name.lower())
+    stripped = ''.join(ch for ch in normalized if not unicodedata.combining(ch))
+    return re.sub(r'^_|_$', '', re.sub(r'[^a-z0-9]+', '_', stripped))
+
+
+def doc_hash(doc: str) -> str:
+    return hashlib.sha1(doc.encode('utf-8')).hexdigest()[:16]
+
+
+def embedding_centroid(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    centroid = (embeddings / np.where(norms == 0, 1, norms)).mean(axis=0)
+    return centroid / (np.linalg.norm(centroid) or 1)
+
+
+def centroid_drift(embeddings: np.ndarray, stored_centroid: Optional[List[float]]) -> float:
+    """Cosine distance between the current and the stored embedding centroid."""
+    if not stored_centroid:
+        return 1.0
+    return max(0.0, float(1.0 - embedding_centroid(embeddings) @ np.asarray(stored_centroid, dtype=np.float64)))
+
+
+class TopicModelStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, market_name: str, view_mode: str) -> str:
+        return os.path.join(self.root, f"{market_slug(market_name)}__{view_mode}")
+
+    def load_state(self, market_name: str, view_mode: str) -> Optional[Dict[str, Any]]:
+        """state.json alone (no model unpickling), None when nothing is stored."""
+        try:
+            with open(os.path.join(self._dir(market_name, view_mode), 'state.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, market_name: str, view_mode: str) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """Return (topic_model, state) or None when nothing usable is stored."""
+        path = self._dir(market_name, view_mode)
+        try:
+            with open(os.path.join(path, 'state.json')) as f:
+                state = json.load(f)
+            from bertopic import BERTopic
+            topic_model = BERTopic.load(os.path.join(path, 'model.pkl'))
+        except (OSError, ValueError, EOFError, ImportError, AttributeError):
+            return None
+        return topic_model, state
+
+    def save(
+        self,
+        market_name: str,
+        view_mode: str,
+        topic_model,
+        docs: List[str],
+        embeddings: np.ndarray,
+        topics: List[int],
+        embedding_model: str,
+        backends: str = 'umap+hdbscan',
+    ) -> None:
+        state = {
+            'market_name': market_name,
+            'view_mode': view_mode,
+            'embedding_model': embedding_model,
+            'backends': backends,
+            'n_docs': len(docs),
+            'doc_hashes': sorted({doc_hash(d) for d in docs}),
+            'centroid': embedding_centroid(embeddings).round(6).tolist(),
+            'outlier_share': sum(1 for t in topics if t == -1) / max(1, len(topics)),
+            'fitted_at': time.time(),
+        }
+
+        # Write to a sibling temp dir and swap it in, so concurrent workers
+        # never load a half-written model
+        target = self._dir(market_name, view_mode)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.root, prefix='.tmp_')
+        try:
+            topic_model.save(os.path.join(tmp, 'model.pkl'), serialization='pickle')
+            with open(os.path.join(tmp, 'state.json'), 'w') as f:
+                json.dump(state, f)
+            old = None
+            if os.path.exists(target):
+                old = tempfile.mkdtemp(dir=self.root, prefix='.old_')
+                os.replace(target, os.path.join(old, 'entry'))
+            os.replace(tmp, target)
+            if old:
+                shutil.rmtree(old, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
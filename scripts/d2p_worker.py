@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+D2P Analysis Worker - long-lived pool around d2p_analysis_engine.run_analysis
+
+Spawning d2p_analysis_engine.py per request pays for the bertopic/umap/hdbscan/
+sentence_transformers imports and the MiniLM load on every analysis. This
+worker loads everything ONCE in the parent process, then pre-forks a small
+pool of workers that share the model weights copy-on-write.
+
+Protocol (JSON lines on stdin/stdout):
+    → {"id": "job-1", "input": {<same payload as the one-shot engine>}}
+    ← {"id": "job-1", "result": {<run_analysis output>}}
+
+    A line without "input" is treated as the payload itself (id = line number).
+    Control lines: {"command": "stats"} | {"command": "shutdown"}
+    On startup the parent emits {"event": "ready", "workers": N, "threads_per_worker": T}.
+
+Workers are recycled after --max-jobs analyses or when their RSS exceeds
+--max-rss-mb, so fragmentation from BERTopic/UMAP runs never accumulates.
+
+Each worker gets a thread budget of --threads (default D2P_THREADS, else
+cores / workers) for torch, numba, BLAS/OpenMP, tokenizers and onnxruntime,
+so concurrent analyses do not oversubscribe the host; a job's own "threads"
+input overrides it for that job.
+
+Uso:
+    python scripts/d2p_worker.py [--workers 2] [--threads N] [--max-jobs 50] [--max-rss-mb 3072]
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import d2p_analysis_engine as engine
+from d2p_threads import apply_budget, budget_from_env
+from d2p_timing import current_rss_mb
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_JOBS = 50
+DEFAULT_MAX_RSS_MB = 3072
+
+
+def _worker_main(conn, max_jobs: int, max_rss_mb: float, threads: int) -> None:
+    """Worker loop: receive payloads, run the analysis, report back."""
+    # run_analysis re-applies D2P_THREADS per job, so this is the worker default
+    os.environ['D2P_THREADS'] = str(threads)
+    apply_budget(threads)
+    jobs_done = 0
+    while True:
+        try:
+            input_data = conn.recv()
+        except EOFError:
+            break
+        if input_data is None:
+            break
+
+        try:
+            result = engine.run_analysis(input_data)
+        except Exception as e:
+            result = {'success': False, 'error': f'Unexpected error: {str(e)}'}
+
+        jobs_done += 1
+        rss_mb = current_rss_mb()
+        retire = jobs_done >= max_jobs or rss_mb >= max_rss_mb
+        conn.send({'result': result, 'retire': retire, 'rss_mb': round(rss_mb, 1), 'jobs_done': jobs_done})
+        if retire:
+            break
+
+    conn.close()
+
+
+class WorkerPool:
+    """
+    Pre-forked pool of analysis workers fed from a shared job queue. Results
+    go to stdout as JSON lines, or to on_result(job_id, result) when given
+    (d2p_job_queue).
+    """
+
+    def __init__(self, n_workers: int, max_jobs: int, max_rss_mb: float, threads: Optional[int] = None,
+                 on_result: Optional[Callable[[Any, Dict[str, Any]], None]] = None):
+        self.n_workers = n_workers
+        self.on_result = on_result
+        self.threads = threads or max(1, (os.cpu_count() or 1) // n_workers)
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self._ctx = mp.get_context('fork')
+        self._jobs: 'queue.Queue[Optional[Dict[str, Any]]]' = queue.Queue()
+        # Guards stdout/stderr writes AND forks: a child must never be forked
+        # while another thread holds an I/O lock it will later need.
+        self._lock = threading.Lock()
+        self._threads = []
+        self.stats = {'jobs_completed': 0, 'jobs_failed': 0, 'workers_recycled': 0, 'worker_crashes': 0}
+
+    def _log(self, message: str) -> None:
+        with self._lock:
+            print(f"[D2P-WORKER] {message}", file=sys.stderr, flush=True)
+
+    def _deliver(self, job_id: Any, result: Dict[str, Any]) -> None:
+        if self.on_result is not None:
+            self.on_result(job_id, result)
+        else:
+            self.emit({'id': job_id, 'result': result})
+
+    def emit(self, payload: Dict[str, Any]) -> None:
+        line = json.dumps(payload, ensure_ascii=False)
+        with self._lock:
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        with self._lock:
+            proc = self._ctx.Process(
+                target=_worker_main,
+                args=(child_conn, self.max_jobs, self.max_rss_mb, self.threads),
+                daemon=True,
+            )
+            proc.start()
+        child_conn.close()
+        return proc, parent_conn
+
+    def _serve_slot(self, slot: int) -> None:
+        proc, conn = self._spawn()
+        self._log(f"slot {slot}: worker pid={proc.pid} started")
+
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                proc.join(timeout=5)
+                return
+
+            started = time.time()
+            try:
+                conn.send(job['input'])
+                reply = conn.recv()
+            except (EOFError, BrokenPipeError, OSError):
+                proc.join(timeout=5)
+                self.stats['worker_crashes'] += 1
+                self.stats['jobs_failed'] += 1
+                self._log(f"slot {slot}: worker pid={proc.pid} died (exitcode={proc.exitcode}), respawning")
+                self._deliver(job['id'], {
+                    'success': False,
+                    'error': f'Worker crashed (exitcode={proc.exitcode})',
+                })
+                proc, conn = self._spawn()
+                continue
+
+            result = reply['result']
+            if result.get('success'):
+                self.stats['jobs_completed'] += 1
+            else:
+                self.stats['jobs_failed'] += 1
+            self._deliver(job['id'], result)
+            self._log(f"slot {slot}: job {job['id']} done in {int((time.time() - started) * 1000)}ms "
+                      f"(rss={reply['rss_mb']}MB, jobs={reply['jobs_done']})")
+
+            if reply['retire']:
+                self.stats['workers_recycled'] += 1
+                proc.join(timeout=30)
+                conn.close()
+                proc, conn = self._spawn()
+                self._log(f"slot {slot}: recycled → worker pid={proc.pid}")
+
+    def start(self) -> None:
+        # Everything the workers need is imported/loaded now, so forked
+        # children share it. gc.freeze keeps the collector from touching
+        # (and thereby un-sharing) those pages in every child.
+        engine.get_sentence_model()
+        gc.collect()
+        gc.freeze()
+
+        for slot in range(self.n_workers):
+            t = threading.Thread(target=self._serve_slot, args=(slot,), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, job_id: Any, input_data: Dict[str, Any]) -> None:
+        self._jobs.put({'id': job_id, 'input': input_data})
+
+    def shutdown(self) -> None:
+        for _ in self._threads:
+            self._jobs.put(None)
+        for t in self._threads:
+            t.join()
+
+
+def serve(n_workers: int, max_jobs: int, max_rss_mb: float, threads: Optional[int] = None) -> None:
+    pool = WorkerPool(n_workers, max_jobs, max_rss_mb, threads)
+    pool.start()
+    pool.emit({'event': 'ready', 'workers': n_workers, 'threads_per_worker': pool.threads, 'pid': os.getpid()})
+
+    # Read through a separate file object: a forked worker closes sys.stdin on
+    # start, which blocks forever if this thread holds its lock mid-read
+    stdin = open(sys.stdin.fileno(), 'r', encoding='utf-8', closefd=False)
+    for line_no, line in enumerate(stdin, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError as e:
+            pool.emit({'id': line_no, 'result': {'success': False, 'error': f'Invalid JSON input: {str(e)}'}})
+            continue
+        if not isinstance(message, dict):
+            pool.emit({'id': line_no, 'result': {
+                'success': False, 'error': f'Invalid input: expected a JSON object, got {type(message).__name__}'}})
+            continue
+
+        command = message.get('command')
+        if command == 'shutdown':
+            break
+        if command == 'stats':
+            pool.emit({'event': 'stats', 'pending': pool._jobs.qsize(), **pool.stats})
+            continue
+
+        job_id = message.get('id', line_no)
+        input_data = message['input'] if 'input' in message else message
+        if not isinstance(input_data, dict):
+            pool.emit({'id': job_id, 'result': {
+                'success': False, 'error': f'Invalid input: expected a JSON object, got {type(input_data).__name__}'}})
+            continue
+        # One bad job must not take the server down
+        try:
+            pool.submit(job_id, input_data)
+        except Exception as e:
+            pool.emit({'id': job_id, 'result': {'success': False, 'error': f'Could not queue job: {e}'}})
+
+    pool.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Long-lived D2P analysis worker pool")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('D2P_WORKERS', DEFAULT_WORKERS)),
+                        help="Pre-forked worker processes")
+    parser.add_argument("--threads", type=int, default=budget_from_env(),
+                        help="Thread budget per worker (default D2P_THREADS, else cores / workers)")
+    parser.add_argument("--max-jobs", type=int, default=int(os.environ.get('D2P_WORKER_MAX_JOBS', DEFAULT_MAX_JOBS)),
+                        help="Recycle a worker after this many analyses")
+    parser.add_argument("--max-rss-mb", type=float,
+                        default=float(os.environ.get('D2P_WORKER_MAX_RSS_MB', DEFAULT_MAX_RSS_MB)),
+                        help="Recycle a worker once its RSS exceeds this ceiling")
+    args = parser.parse_args()
+
+    serve(max(1, args.workers), max(1, args.max_jobs), args.max_rss_mb, args.threads)
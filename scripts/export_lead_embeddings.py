@@ -3,9 +3,12 @@
 Export lead_embedding_final to Parquet for batch vector similarity.
 
 Exports:
-- lead_id, username, bio, profession
+- lead_id, username, bio, profession, business_category
 - embedding_final (1536 dims)
 
+Rows are grouped by business_category (leads with a bio first), so each
+market's analysable leads are one contiguous slice of the .npy (market-demand-discovery.py --source snapshot maps it).
+
 Run daily via cron or before D2P analysis.
 """
 
@@ -80,7 +83,7 @@ def export_to_parquet():
     for i in range(0, len(lead_ids), 500):
         batch_ids = lead_ids[i:i+500]
         response = supabase.table('instagram_leads').select(
-            'id, username, bio, profession'
+            'id, username, bio, profession, business_category'
         ).in_('id', batch_ids).execute()
 
         for row in response.data:
@@ -114,10 +117,17 @@ def export_to_parquet():
             'lead_id': lead_id,
             'username': meta.get('username'),
             'bio': meta.get('bio'),
-            'profession': meta.get('profession')
+            'profession': meta.get('profession'),
+            'business_category': meta.get('business_category')
         })
         embeddings.append(emb)
 
+    # Group by market: each business_category becomes one contiguous row range,
+    # leads with a bio first so the analysable ones stay contiguous too
+    order = sorted(range(len(rows)), key=lambda i: (rows[i]['business_category'] or '', not rows[i]['bio']))
+    rows = [rows[i] for i in order]
+    embeddings = [embeddings[i] for i in order]
+
     # Create DataFrame
     df = pd.DataFrame(rows)
     embeddings_array = np.array(embeddings, dtype=np.float32)
@@ -139,6 +149,7 @@ def export_to_parquet():
     meta = {
         'count': len(df),
         'embedding_dim': embeddings_array.shape[1] if len(embeddings_array) > 0 else 0,
+        'sorted_by': 'business_category',
         'exported_at': datetime.now().isoformat()
     }
 
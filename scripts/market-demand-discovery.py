@@ -10,15 +10,30 @@ Diferencial:
 - BERTopic++: encontra FRICÇÕES ("responder manualmente", "qualificar sem critério")
 
 Uso:
-    python scripts/market-demand-discovery.py
+    python scripts/market-demand-discovery.py [--source supabase|snapshot] [--snapshot-dir data]
+
+Com DATABASE_URL (conexão direta do Supabase) os leads de cada mercado vêm por
+COPY binário direto para uma matriz float32; sem ela, pela API REST paginada.
+O censo de mercados é uma agregação no servidor (market_census, migration 105).
+Os mercados são analisados em paralelo (processos, maior primeiro, limitados
+pela memória livre); MARKET_WORKERS=1 volta ao modo sequencial.
+MARKET_CLUSTERING=global faz um único ajuste sobre todos os mercados e recorta
+os tópicos por mercado (c-TF-IDF por mercado) — ver bench_market_clustering.py.
+--source snapshot lê data/lead_embeddings.{npy,parquet} (export_lead_embeddings.py)
+sem rede: o .npy é mapeado em memória e cada mercado é uma fatia dele.
 
 Autor: AIC Intelligence
 """
 
+import argparse
 import os
 import json
 import re
+import struct
+import multiprocessing as mp
 import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 from collections import Counter
@@ -34,12 +49,21 @@ from supabase import create_client, Client
 from bertopic import BERTopic
 from umap import UMAP
 from hdbscan import HDBSCAN
+from bertopic.vectorizers import ClassTfidfTransformer
 from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+import scipy.sparse as sp
+
+from d2p_threads import apply_budget, configure_env
 
 # Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Direct Postgres connection string (optional) — bulk COPY instead of REST paging
+DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("SUPABASE_DB_URL")
+# Offline snapshot written by export_lead_embeddings.py (--source snapshot)
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
 
 # Analysis parameters
 MIN_CLUSTER_SIZE = 50   # Minimum leads per cluster (per market)
@@ -48,6 +72,17 @@ N_NEIGHBORS = 15        # UMAP n_neighbors
 N_COMPONENTS = 10       # UMAP output dimensions
 MIN_MARKET_SIZE = 200   # Minimum leads to analyze a market
 MAX_LEADS_PER_MARKET = 5000  # Limit per market to avoid timeout
+MAX_MARKETS = 15        # Largest markets analysed per run
+EMBEDDING_DIM = 1536    # instagram_leads.embedding vector(1536)
+
+# 'per_market' (one fit per market, analyze_markets) | 'global' (one fit, sliced per market)
+CLUSTERING_MODE = os.getenv("MARKET_CLUSTERING", "per_market")
+
+# Parallel markets (analyze_markets)
+MARKET_WORKERS = int(os.getenv("MARKET_WORKERS", "0"))  # 0 = one per core, bounded by memory
+MARKET_WORKER_BASE_MB = 400    # per-fit working set besides the embeddings
+MARKET_EMBEDDING_COPIES = 4    # embedding-sized arrays alive during a fit
+MEMORY_HEADROOM = 0.8          # share of MemAvailable the running markets may use
 
 print("""
 ╔═══════════════════════════════════════════════════════════════╗
@@ -374,19 +409,193 @@ def get_supabase_client() -> Client:
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
-def fetch_leads_by_market(supabase: Client) -> Dict[str, List[Dict]]:
+def enrich_bio(bio: str, profession: Optional[str]) -> str:
+    """Enrich bio text with profession if available."""
+    return f"{profession}. {bio}" if profession else bio
+
+
+class MarketLeads:
     """
-    Fetch leads grouped by business_category (market).
-    Returns dict: {market_name: [leads]}
+    One market's leads ready for BERTopic: a preallocated float32 embedding
+    matrix filled row by row as leads arrive, plus the aligned bio texts
+    (enriched with the profession) and metadata.
     """
-    print("\n📥 Buscando leads com embeddings do Supabase...")
 
-    # First, get the market distribution
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.embeddings: Optional[np.ndarray] = None  # allocated on the first row (dim known)
+        self.bios: List[str] = []
+        self.metadata: List[Dict] = []
+
+    def add(self, lead_id: str, username: Optional[str], bio: str, profession: Optional[str], embedding) -> None:
+        n = len(self.bios)
+        if self.embeddings is None:
+            self.embeddings = np.empty((max(1, self.capacity), len(embedding)), dtype=np.float32)
+        elif n == len(self.embeddings):
+            self.embeddings = np.concatenate([self.embeddings, np.empty_like(self.embeddings)])
+        self.embeddings[n] = embedding
+        self.bios.append(enrich_bio(bio, profession))
+        self.metadata.append({"id": lead_id, "username": username, "profession": profession})
+
+    @classmethod
+    def from_arrays(cls, embeddings: np.ndarray, bios: List[str], metadata: List[Dict]) -> 'MarketLeads':
+        """Wrap data already in memory (e.g. a view of a memory-mapped snapshot) without copying."""
+        data = cls(len(bios))
+        data.embeddings, data.bios, data.metadata = embeddings, bios, metadata
+        return data
+
+    def finish(self) -> 'MarketLeads':
+        """Drop the unused tail of the matrix."""
+        n = len(self.bios)
+        if self.embeddings is None:
+            self.embeddings = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        elif n < len(self.embeddings):
+            self.embeddings = self.embeddings[:n].copy()
+        return self
+
+    def __len__(self) -> int:
+        return len(self.bios)
+
+
+def get_pg_connection():
+    """Direct Postgres connection (DATABASE_URL), or None to use the REST API."""
+    if not DATABASE_URL:
+        return None
+    try:
+        import psycopg2
+    except ImportError:
+        print("   ⚠ psycopg2 não instalado (pip install psycopg2-binary) — usando a API REST")
+        return None
+    return psycopg2.connect(DATABASE_URL)
+
+
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+
+
+class CopyBinarySink:
+    """
+    File-like target for cursor.copy_expert that decodes
+    COPY (id, username, bio, profession, embedding) TO STDOUT (FORMAT binary)
+    as the bytes arrive: text fields are UTF-8, and each pgvector value
+    (int16 dim, int16 unused, dim × big-endian float4) is copied straight
+    into the market's float32 matrix — no JSON text, no per-row lists.
+    """
+
+    def __init__(self, market: MarketLeads):
+        self.market = market
+        self._buf = bytearray()
+        self._header_done = False
+
+    def write(self, chunk: bytes) -> int:
+        self._buf += chunk
+        pos = 0
+        if not self._header_done:
+            if len(self._buf) < 19:
+                return len(chunk)
+            if self._buf[:11] != COPY_SIGNATURE:
+                raise ValueError("Not a binary COPY stream")
+            pos = 19 + struct.unpack_from('!i', self._buf, 15)[0]
+            self._header_done = True
+        while True:
+            end = self._read_row(pos)
+            if end is None:
+                break
+            pos = end
+        del self._buf[:pos]
+        return len(chunk)
+
+    def _read_row(self, pos: int) -> Optional[int]:
+        """Decode the row at pos; its end offset, or None while it is incomplete."""
+        buf = self._buf
+        if len(buf) - pos < 2:
+            return None
+        n_fields = struct.unpack_from('!h', buf, pos)[0]
+        if n_fields == -1:  # trailer
+            return pos + 2
+        fields = []
+        p = pos + 2
+        for _ in range(n_fields):
+            if len(buf) - p < 4:
+                return None
+            size = struct.unpack_from('!i', buf, p)[0]
+            p += 4
+            if size == -1:
+                fields.append(None)
+                continue
+            if len(buf) - p < size:
+                return None
+            fields.append((p, size))
+            p += size
+
+        text = lambda f: bytes(buf[f[0]:f[0] + f[1]]).decode('utf-8') if f else None
+        lead_id, username, bio, profession, vector = fields
+        dim = struct.unpack_from('!h', buf, vector[0])[0]
+        self.market.add(text(lead_id), text(username), text(bio) or "", text(profession),
+                        np.frombuffer(buf, dtype='>f4', count=dim, offset=vector[0] + 4))
+        return p
+
+
+def load_market_pg(conn, market: str, limit: int) -> MarketLeads:
+    """Stream one market's leads with a binary COPY into a preallocated float32 matrix."""
+    data = MarketLeads(limit)
+    with conn.cursor() as cur:
+        query = cur.mogrify(
+            "COPY (SELECT id::text, username, bio, profession, embedding FROM instagram_leads "
+            "WHERE business_category = %s AND embedding IS NOT NULL AND bio IS NOT NULL LIMIT %s) "
+            "TO STDOUT (FORMAT binary)",
+            (market, limit),
+        ).decode('utf-8')
+        cur.copy_expert(query, CopyBinarySink(data))
+    conn.rollback()
+    return data.finish()
+
+
+def load_market_rest(supabase: Client, market: str, limit: int) -> MarketLeads:
+    """REST fallback: page the market through PostgREST, converting each page as it arrives."""
+    data = MarketLeads(limit)
+    offset = 0
+    page_size = 1000
+
+    while len(data) < limit:
+        try:
+            query = supabase.table("instagram_leads").select(
+                "id, username, bio, business_category, profession, embedding"
+            ).eq("business_category", market).not_.is_("embedding", "null").not_.is_("bio", "null").range(offset, offset + page_size - 1)
+
+            response = query.execute()
+            if not response.data:
+                break
+
+            for lead in response.data[:limit - len(data)]:
+                if lead.get("embedding") and lead.get("bio"):
+                    emb = lead["embedding"]
+                    if isinstance(emb, str):
+                        emb = json.loads(emb)
+                    data.add(lead["id"], lead.get("username"), lead["bio"], lead.get("profession"), emb)
+
+            if len(response.data) < page_size:
+                break
+
+            offset += page_size
+
+        except Exception as e:
+            print(f"      ⚠ Erro na página {offset}: {e}")
+            break
+
+    return data.finish()
+
+
+CENSUS_SQL = "SELECT business_category, total_leads, eligible_leads FROM market_census(%s)"
+# SQLSTATE undefined_function: migration 105 not applied on this database
+PG_UNDEFINED_FUNCTION = '42883'
+
+
+def count_markets_by_paging(supabase: Client) -> Dict[str, Dict[str, int]]:
+    """Legacy census for databases without market_census(): pages every eligible category."""
     markets_query = supabase.table("instagram_leads").select(
         "business_category"
     ).not_.is_("embedding", "null").not_.is_("bio", "null").not_.is_("business_category", "null")
 
-    # Paginate to count all
     all_categories = []
     offset = 0
     page_size = 1000
@@ -402,10 +611,38 @@ def fetch_leads_by_market(supabase: Client) -> Dict[str, List[Dict]]:
         if offset > 50000:  # Safety limit
             break
 
-    # Count by market
-    market_counts = Counter(all_categories)
-    print(f"   ✓ {len(market_counts)} mercados encontrados")
+    return {m: {'total': c, 'eligible': c} for m, c in Counter(all_categories).items()}
+
 
+def fetch_market_census(supabase: Client, conn=None) -> Dict[str, Dict[str, int]]:
+    """
+    Per-market counts {market: {'total', 'eligible'}} aggregated server-side by
+    market_census() (migration 105) — one query instead of paging every category.
+    """
+    if conn is not None:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(CENSUS_SQL, (0,))
+                rows = cur.fetchall()
+        except Exception as e:
+            if getattr(e, 'pgcode', None) != PG_UNDEFINED_FUNCTION:
+                raise
+            print(f"   ⚠ market_census() indisponível ({str(e).strip()}) — contando por paginação")
+            return count_markets_by_paging(supabase)
+        finally:
+            conn.rollback()
+    else:
+        try:
+            rows = [(r['business_category'], r['total_leads'], r['eligible_leads'])
+                    for r in supabase.rpc('market_census', {'p_min_eligible': 0}).execute().data or []]
+        except Exception as e:
+            print(f"   ⚠ market_census() indisponível ({e}) — contando por paginação")
+            return count_markets_by_paging(supabase)
+    return {m: {'total': int(total), 'eligible': int(eligible)} for m, total, eligible in rows}
+
+
+def select_markets(market_counts: Dict[str, int]) -> List[Tuple[str, int]]:
+    """Markets with >= MIN_MARKET_SIZE eligible leads, largest first, at most MAX_MARKETS."""
     # Filter markets with enough leads
     valid_markets = {m: c for m, c in market_counts.items()
                      if c >= MIN_MARKET_SIZE and m and m.strip()}
@@ -413,77 +650,119 @@ def fetch_leads_by_market(supabase: Client) -> Dict[str, List[Dict]]:
     print(f"   ✓ {len(valid_markets)} mercados com >= {MIN_MARKET_SIZE} leads")
 
     # Show top markets
-    top_markets = sorted(valid_markets.items(), key=lambda x: x[1], reverse=True)[:10]
+    top_markets = sorted(valid_markets.items(), key=lambda x: x[1], reverse=True)
     print("\n   Top 10 mercados:")
-    for market, count in top_markets:
+    for market, count in top_markets[:10]:
         print(f"      • {market}: {count:,} leads")
 
-    # Fetch leads for each valid market
-    markets_data = {}
-
-    for market, count in sorted(valid_markets.items(), key=lambda x: x[1], reverse=True)[:15]:
-        print(f"\n   📦 Carregando: {market} ({count} leads)...")
+    return top_markets[:MAX_MARKETS]
 
-        leads = []
-        offset = 0
-        limit = min(count, MAX_LEADS_PER_MARKET)
 
-        while len(leads) < limit:
-            try:
-                query = supabase.table("instagram_leads").select(
-                    "id, username, bio, business_category, profession, embedding"
-                ).eq("business_category", market).not_.is_("embedding", "null").not_.is_("bio", "null").range(offset, offset + page_size - 1)
-
-                response = query.execute()
-                if not response.data:
-                    break
-
-                leads.extend(response.data)
+def fetch_leads_by_market(supabase: Client) -> Dict[str, MarketLeads]:
+    """
+    Fetch leads grouped by business_category (market).
+    Returns dict: {market_name: MarketLeads}
 
-                if len(response.data) < page_size:
-                    break
+    With DATABASE_URL each market is streamed by a binary COPY (load_market_pg);
+    otherwise it is paged through the REST API (load_market_rest).
+    """
+    print("\n📥 Buscando leads com embeddings do Supabase...")
+    conn = get_pg_connection()
 
-                offset += page_size
+    # First, get the market distribution (server-side aggregate)
+    try:
+        census = fetch_market_census(supabase, conn)
+    except Exception:
+        if conn is not None:
+            conn.close()
+        raise
+    print(f"   ✓ {len(census)} mercados encontrados "
+          f"({sum(c['eligible'] for c in census.values()):,} de {sum(c['total'] for c in census.values()):,} leads elegíveis)")
+    selected = select_markets({m: c['eligible'] for m, c in census.items()})
 
-            except Exception as e:
-                print(f"      ⚠ Erro na página {offset}: {e}")
-                break
+    # Fetch leads for each valid market
+    markets_data = {}
+    if conn is not None:
+        print("   ⚡ Carregando via COPY binário (Postgres direto)")
 
-        if leads:
-            markets_data[market] = leads[:limit]
-            print(f"      ✓ {len(markets_data[market])} leads carregados")
+    try:
+        for market, count in selected:
+            print(f"\n   📦 Carregando: {market} ({count} leads)...")
+            limit = min(count, MAX_LEADS_PER_MARKET)
+
+            if conn is not None:
+                data = load_market_pg(conn, market, limit)
+            else:
+                data = load_market_rest(supabase, market, limit)
+
+            if len(data):
+                markets_data[market] = data
+                print(f"      ✓ {len(data)} leads carregados ({data.embeddings.nbytes / 1024 / 1024:.1f} MB)")
+    finally:
+        if conn is not None:
+            conn.close()
 
     return markets_data
 
 
-def prepare_market_data(leads: List[Dict]) -> Tuple[np.ndarray, List[str], List[Dict]]:
+# ==================== SNAPSHOT SOURCE ====================
+
+def load_snapshot_markets(snapshot_dir: str = SNAPSHOT_DIR) -> Dict[str, MarketLeads]:
     """
-    Prepare embeddings, bios, and metadata for a market.
+    Offline source (--source snapshot): markets from the files written by
+    export_lead_embeddings.py, no network access.
+
+    lead_embeddings.npy is memory-mapped and joined row by row with the
+    Parquet metadata. Exports are sorted by business_category, so each market
+    is one contiguous row range and its embeddings are a view of the mapped
+    file — only the pages of the markets analysed are ever read. Unsorted
+    (older) exports fall back to one gathered copy per market.
+    Note: the snapshot holds embedding_final (lead_embedding_final), not
+    instagram_leads.embedding.
     """
-    embeddings = []
-    bios = []
-    metadata = []
+    import pandas as pd
 
-    for lead in leads:
-        if lead.get("embedding") and lead.get("bio"):
-            emb = lead["embedding"]
-            if isinstance(emb, str):
-                emb = json.loads(emb)
+    parquet_path = os.path.join(snapshot_dir, "lead_embeddings.parquet")
+    embeddings_path = os.path.join(snapshot_dir, "lead_embeddings.npy")
+    print(f"\n📂 Carregando snapshot de {os.path.abspath(snapshot_dir)}...")
 
-            # Enrich bio text with profession if available
-            bio_text = lead["bio"] or ""
-            if lead.get("profession"):
-                bio_text = f"{lead['profession']}. {bio_text}"
+    embeddings = np.load(embeddings_path, mmap_mode='r')
+    meta = pd.read_parquet(parquet_path)
+    if 'business_category' not in meta.columns:
+        raise ValueError("Snapshot sem business_category — rode export_lead_embeddings.py novamente")
+    if len(meta) != len(embeddings):
+        raise ValueError(f"Snapshot inconsistente: {len(meta)} linhas no Parquet, {len(embeddings)} embeddings")
 
-            embeddings.append(emb)
-            bios.append(bio_text)
-            metadata.append({
-                "id": lead["id"],
-                "username": lead.get("username"),
-                "profession": lead.get("profession")
-            })
+    try:
+        with open(os.path.join(snapshot_dir, "export_meta.json")) as f:
+            exported_at = json.load(f).get('exported_at')
+    except (OSError, ValueError):
+        exported_at = None
 
-    return np.array(embeddings), bios, metadata
+    category = meta['business_category']
+    eligible = (meta['bio'].notna() & category.notna()).to_numpy()
+    market_counts = category[eligible].value_counts().to_dict()
+    print(f"   ✓ {len(meta):,} leads, {len(market_counts)} mercados (exportado em {exported_at or '?'})")
+
+    markets_data = {}
+    category_values = category.to_numpy()
+    professions = meta['profession'].astype(object).where(meta['profession'].notna(), None).to_numpy()
+    for market, count in select_markets(market_counts):
+        rows = np.flatnonzero(eligible & (category_values == market))[:MAX_LEADS_PER_MARKET]
+        if rows[-1] - rows[0] + 1 == len(rows):
+            market_embeddings = embeddings[rows[0]:rows[-1] + 1]  # view of the mapped file
+        else:
+            market_embeddings = np.asarray(embeddings[rows])
+        part = meta.iloc[rows]
+        markets_data[market] = MarketLeads.from_arrays(
+            market_embeddings,
+            [enrich_bio(bio, profession) for bio, profession in zip(part['bio'], professions[rows])],
+            [{"id": lead_id, "username": username, "profession": profession}
+             for lead_id, username, profession in zip(part['lead_id'], part['username'], professions[rows])],
+        )
+        print(f"   📦 {market}: {len(rows)} leads")
+
+    return markets_data
 
 
 # ==================== BERTOPIC MODEL ====================
@@ -512,12 +791,18 @@ def get_portuguese_stopwords() -> List[str]:
     ]
 
 
-def create_bertopic_model(n_docs: int) -> BERTopic:
+def market_min_topic_size(n_docs: int) -> int:
+    """HDBSCAN min_cluster_size for a fit on n_docs leads."""
+    return max(15, min(MIN_CLUSTER_SIZE, n_docs // 20))
+
+
+def create_bertopic_model(n_docs: int, approximate_knn: bool = False) -> BERTopic:
     """
     Create BERTopic model optimized for friction discovery.
+    approximate_knn: NN-descent kNN graph even below UMAP's 4096-doc exact threshold.
     """
     # Adjust parameters based on dataset size
-    adjusted_min_cluster = max(15, min(MIN_CLUSTER_SIZE, n_docs // 20))
+    adjusted_min_cluster = market_min_topic_size(n_docs)
     adjusted_min_samples = max(5, min(MIN_SAMPLES, adjusted_min_cluster // 2))
 
     # UMAP for dimensionality reduction
@@ -528,6 +813,7 @@ def create_bertopic_model(n_docs: int) -> BERTopic:
         metric='cosine',
         random_state=42,
         low_memory=True,
+        force_approximation_algorithm=approximate_knn,
         verbose=False
     )
 
@@ -568,15 +854,14 @@ def create_bertopic_model(n_docs: int) -> BERTopic:
 
 # ==================== ANALYSIS ====================
 
-def analyze_market(market_name: str, leads: List[Dict]) -> Dict[str, Any]:
+def analyze_market(market_name: str, data: MarketLeads) -> Dict[str, Any]:
     """
     Run BERTopic++ analysis on a single market.
     Returns friction units and market analysis.
     """
     print(f"\n🔍 Analisando mercado: {market_name}")
 
-    # Prepare data
-    embeddings, bios, metadata = prepare_market_data(leads)
+    embeddings, bios = data.embeddings, data.bios
     n_docs = len(bios)
 
     if n_docs < MIN_MARKET_SIZE:
@@ -608,7 +893,6 @@ def analyze_market(market_name: str, leads: List[Dict]) -> Dict[str, Any]:
 
     for _, row in valid_topics.iterrows():
         topic_id = row['Topic']
-        count = row['Count']
 
         # Get topic details
         topic_words = topic_model.get_topic(topic_id)
@@ -616,29 +900,39 @@ def analyze_market(market_name: str, leads: List[Dict]) -> Dict[str, Any]:
 
         representative_docs = topic_model.get_representative_docs(topic_id) or []
 
-        # Apply friction detection rules
-        friction_analysis = detect_friction_type(keywords, representative_docs[:10])
-
-        # Extract routine
-        routine = extract_routine_from_topic(keywords, representative_docs[:5])
-
-        # Get topic label
-        topic_label = row.get('Name', f'Topic_{topic_id}')
-
-        friction_unit = {
-            'topic_id': int(topic_id),
-            'market': market_name,
-            'label': topic_label,
-            'count': int(count),
-            'percentage': round(count / n_docs * 100, 2),
-            'keywords': keywords,
-            'routine': routine,
-            'representative_bios': representative_docs[:3],
-            **friction_analysis
-        }
+        friction_units.append(build_friction_unit(
+            market_name, topic_id, row.get('Name', f'Topic_{topic_id}'), row['Count'], n_docs,
+            keywords, representative_docs,
+        ))
 
-        friction_units.append(friction_unit)
+    return summarize_market(market_name, n_docs, len(valid_topics), coverage, friction_units)
 
+
+def build_friction_unit(market_name: str, topic_id: int, label: str, count: int, n_docs: int,
+                        keywords: List[str], representative_docs: List[str]) -> Dict[str, Any]:
+    """Friction rules applied to one topic of a market."""
+    # Apply friction detection rules
+    friction_analysis = detect_friction_type(keywords, representative_docs[:10])
+
+    # Extract routine
+    routine = extract_routine_from_topic(keywords, representative_docs[:5])
+
+    return {
+        'topic_id': int(topic_id),
+        'market': market_name,
+        'label': label,
+        'count': int(count),
+        'percentage': round(count / n_docs * 100, 2),
+        'keywords': keywords,
+        'routine': routine,
+        'representative_bios': representative_docs[:3],
+        **friction_analysis
+    }
+
+
+def summarize_market(market_name: str, n_docs: int, n_topics: int, coverage: float,
+                     friction_units: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Market result: friction units sorted by score + market friction metrics."""
     # Sort by friction score
     friction_units.sort(key=lambda x: x['friction_score'], reverse=True)
 
@@ -649,18 +943,224 @@ def analyze_market(market_name: str, leads: List[Dict]) -> Dict[str, Any]:
     return {
         'market': market_name,
         'total_leads': n_docs,
-        'topics_discovered': len(valid_topics),
+        'topics_discovered': n_topics,
         'coverage_percentage': round(coverage, 2),
         'friction_units': friction_units,
         'metrics': {
             'friction_count': friction_count,
             'total_friction_score': round(total_friction_score, 3),
             'avg_friction_score': round(total_friction_score / max(1, friction_count), 3),
-            'friction_density': round(friction_count / max(1, len(valid_topics)), 3)
+            'friction_density': round(friction_count / max(1, n_topics), 3)
         }
     }
 
 
+# ==================== GLOBAL CLUSTERING ====================
+
+def analyze_markets_global(markets_data: Dict[str, MarketLeads]) -> List[Dict[str, Any]]:
+    """
+    Alternative to analyze_markets: ONE UMAP + HDBSCAN fit over every market's
+    leads, then each market gets its slice of the topic membership.
+
+    A global topic becomes one of a market's friction units when the market
+    holds at least market_min_topic_size(n) of its members — the cluster size
+    a fit on that market alone would have required. Keywords come from a
+    c-TF-IDF computed per market on the sliced class × term counts (the same
+    vocabulary for all), so a topic shared by two markets is described by
+    each market's own wording; representative bios are the market's members
+    closest to that c-TF-IDF vector.
+
+    Markets below MIN_MARKET_SIZE stay out of the fit (they would only lower
+    the cluster size for everyone) and get an 'Insufficient data' result.
+    """
+    results: Dict[str, Dict[str, Any]] = {
+        m: {'error': f'Insufficient data: {len(data)} < {MIN_MARKET_SIZE}'}
+        for m, data in markets_data.items() if len(data) < MIN_MARKET_SIZE
+    }
+    names = [m for m in markets_data if m not in results]
+    if not names:
+        return list(results.values())
+    sizes = [len(markets_data[m]) for m in names]
+    n_total = sum(sizes)
+    print(f"\n🌐 Clustering global: {n_total:,} leads de {len(names)} mercados"
+          + (f" ({len(results)} abaixo de {MIN_MARKET_SIZE} leads ignorados)" if results else ""))
+
+    embeddings = np.concatenate([markets_data[m].embeddings for m in names])
+    bios = [bio for m in names for bio in markets_data[m].bios]
+    market_of = np.repeat(np.arange(len(names)), sizes)
+
+    # Cluster granularity of the smallest market, so its topics can still form;
+    # the exact O(n²) kNN path UMAP takes below 4096 docs is never worth it here
+    topic_model = create_bertopic_model(min(sizes), approximate_knn=True)
+    try:
+        topics, _ = topic_model.fit_transform(bios, embeddings)
+    except Exception as e:
+        print(f"   ❌ Erro no BERTopic: {e}")
+        results.update({m: {'market': m, 'error': str(e)} for m in names})
+        return [results[m] for m in markets_data]
+    del embeddings
+    topics = np.asarray(topics)
+    print(f"   ✓ {len(set(topics.tolist()) - {-1})} tópicos globais, "
+          f"{(topics != -1).mean() * 100:.1f}% cobertura")
+
+    # Doc × term counts once, with the vocabulary of the global fit
+    vectorizer = topic_model.vectorizer_model
+    doc_terms = vectorizer.transform(bios).tocsr()
+    words = vectorizer.get_feature_names_out()
+
+    for mi, market_name in enumerate(names):
+        print(f"\n🔍 Analisando mercado: {market_name}")
+        rows = np.flatnonzero(market_of == mi)
+        n_docs = len(rows)
+        market_topics = topics[rows]
+        ids, counts = np.unique(market_topics[market_topics != -1], return_counts=True)
+        keep = ids[counts >= market_min_topic_size(n_docs)]
+        member = np.isin(market_topics, keep)
+        coverage = member.sum() / n_docs * 100
+        print(f"   ✓ {len(keep)} tópicos no recorte do mercado")
+        print(f"   ✓ {coverage:.1f}% cobertura (excl. outliers)")
+
+        friction_units = []
+        if len(keep):
+            doc_rows = rows[member]
+            doc_class = np.searchsorted(keep, market_topics[member])
+            indicator = sp.csr_matrix(
+                (np.ones(len(doc_rows)), (doc_class, np.arange(len(doc_rows)))),
+                shape=(len(keep), len(doc_rows)),
+            )
+            class_terms = indicator @ doc_terms[doc_rows]
+            used = np.flatnonzero(np.asarray(class_terms.sum(axis=0)).ravel())
+            ctfidf = ClassTfidfTransformer().fit_transform(class_terms[:, used]).toarray()
+            member_terms = normalize(doc_terms[doc_rows][:, used])
+
+            for ci, topic_id in enumerate(keep):
+                weights = ctfidf[ci]
+                keywords = [words[used[j]] for j in np.argsort(weights)[::-1][:12] if weights[j] > 0]
+
+                in_topic = np.flatnonzero(doc_class == ci)
+                closeness = member_terms[in_topic] @ (weights / (np.linalg.norm(weights) or 1))
+                representative_docs = [bios[doc_rows[j]] for j in in_topic[np.argsort(closeness)[::-1][:3]]]
+
+                friction_units.append(build_friction_unit(
+                    market_name, topic_id, f"{topic_id}_" + '_'.join(keywords[:4]), len(in_topic), n_docs,
+                    keywords, representative_docs,
+                ))
+
+        results[market_name] = summarize_market(market_name, n_docs, len(keep), coverage, friction_units)
+
+    return [results[m] for m in markets_data]
+
+
+# ==================== PARALLEL EXECUTION ====================
+
+_POOL_MARKETS: Dict[str, MarketLeads] = {}  # inherited by the forked workers
+
+
+def available_memory_mb() -> float:
+    """MemAvailable from /proc/meminfo (free pages + reclaimable cache), in MB."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def estimate_market_mb(n_docs: int, dims: int) -> float:
+    """Peak memory of one analyze_market: embedding copies (UMAP, BERTopic) + worker baseline."""
+    return MARKET_WORKER_BASE_MB + n_docs * dims * 4 * MARKET_EMBEDDING_COPIES / 1024 / 1024
+
+
+def _init_market_worker(threads: int) -> None:
+    configure_env(threads)
+    apply_budget(threads)
+
+
+def _analyze_pooled_market(market_name: str) -> Dict[str, Any]:
+    return analyze_market(market_name, _POOL_MARKETS[market_name])
+
+
+def _run_market_pool(pending: List[str], workers: int, threads: int, estimates: Dict[str, float],
+                     budget_mb: float, results: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Run `pending` (largest first, consumed in place) in one pool until it is
+    empty or a worker dies; returns the markets that were in flight on a dead worker.
+    """
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('fork'),
+                               initializer=_init_market_worker, initargs=(threads,))
+    running: Dict[Any, str] = {}
+    in_use = 0.0
+    lost: List[str] = []
+    try:
+        while (pending or running) and not lost:
+            # Largest first; a smaller market may start ahead of one that does not fit now
+            for market in list(pending):
+                if len(running) >= workers:
+                    break
+                if running and in_use + estimates[market] > budget_mb:
+                    continue
+                pending.remove(market)
+                running[pool.submit(_analyze_pooled_market, market)] = market
+                in_use += estimates[market]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                market = running.pop(future)
+                in_use -= estimates[market]
+                try:
+                    results[market] = future.result()
+                except BrokenProcessPool:
+                    lost.append(market)
+                except Exception as e:
+                    print(f"   ❌ {market}: {e}")
+                    results[market] = {'market': market, 'error': str(e)}
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    # A dead worker breaks the whole pool, so everything still running is lost too
+    return lost + list(running.values())
+
+
+def analyze_markets(markets_data: Dict[str, MarketLeads], max_workers: int = 0) -> List[Dict[str, Any]]:
+    """
+    Analyse every market, several at once in forked worker processes.
+
+    Markets are scheduled largest-first; one starts only while the estimated
+    memory of the running ones (estimate_market_mb) fits in MEMORY_HEADROOM of
+    the RAM available now. Each worker gets cores / workers threads
+    (d2p_threads). A market that raises yields an {'error'} result; markets
+    lost to a dead worker (OOM kill) are retried alone, so only the one that
+    kills its worker fails. Results come back in markets_data order.
+    """
+    cores = os.cpu_count() or 1
+    workers = max(1, min(max_workers or cores, cores, len(markets_data)))
+    if workers == 1:
+        return [analyze_market(name, data) for name, data in markets_data.items()]
+
+    estimates = {m: estimate_market_mb(len(d), d.embeddings.shape[1]) for m, d in markets_data.items()}
+    budget_mb = available_memory_mb() * MEMORY_HEADROOM
+    threads = max(1, cores // workers)
+    print(f"\n⚡ {workers} processos em paralelo, {threads} thread(s) cada, "
+          f"orçamento de memória {budget_mb:,.0f} MB")
+
+    _POOL_MARKETS.clear()
+    _POOL_MARKETS.update(markets_data)
+    results: Dict[str, Dict[str, Any]] = {}
+    pending = sorted(markets_data, key=lambda m: estimates[m], reverse=True)
+    suspects: List[str] = []
+    while pending:
+        suspects += _run_market_pool(pending, workers, threads, estimates, budget_mb, results)
+
+    for market in sorted(suspects, key=lambda m: estimates[m], reverse=True):
+        print(f"   ⚠ {market}: processo morreu — repetindo isolado")
+        if _run_market_pool([market], 1, threads, estimates, budget_mb, results):
+            results[market] = {'market': market, 'error': 'Worker process died (out of memory?)'}
+
+    _POOL_MARKETS.clear()
+    return [results[m] for m in markets_data]
+
+
 def rank_markets(market_results: List[Dict]) -> List[Dict]:
     """
     Rank markets by product potential based on friction analysis.
@@ -778,14 +1278,15 @@ def print_results(all_results: Dict):
 
 # ==================== MAIN ====================
 
-def main():
+def main(source: str = 'supabase', snapshot_dir: str = SNAPSHOT_DIR):
     """Main execution flow."""
     try:
-        # 1. Initialize Supabase
-        supabase = get_supabase_client()
-
-        # 2. Fetch leads grouped by market
-        markets_data = fetch_leads_by_market(supabase)
+        # 1-2. Leads grouped by market: live from Supabase, or from the exported snapshot
+        if source == 'snapshot':
+            markets_data = load_snapshot_markets(snapshot_dir)
+        else:
+            supabase = get_supabase_client()
+            markets_data = fetch_leads_by_market(supabase)
 
         if not markets_data:
             print("❌ Nenhum mercado com dados suficientes encontrado")
@@ -796,11 +1297,10 @@ def main():
         print("🔬 INICIANDO ANÁLISE BERTOPIC++ POR MERCADO")
         print("="*70)
 
-        market_results = []
-
-        for market_name, leads in markets_data.items():
-            result = analyze_market(market_name, leads)
-            market_results.append(result)
+        if CLUSTERING_MODE == 'global':
+            market_results = analyze_markets_global(markets_data)
+        else:
+            market_results = analyze_markets(markets_data, MARKET_WORKERS)
 
         # 4. Rank markets by product potential
         market_rankings = rank_markets(market_results)
@@ -809,6 +1309,8 @@ def main():
         all_results = {
             'generated_at': datetime.now().isoformat(),
             'methodology': 'BERTopic++ (BERTopic + Friction Rules)',
+            'clustering_mode': CLUSTERING_MODE,
+            'source': source,
             'total_markets_analyzed': len(market_results),
             'market_rankings': market_rankings,
             'detailed_results': market_results,
@@ -837,4 +1339,10 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="BERTopic++ market friction discovery")
+    parser.add_argument("--source", choices=['supabase', 'snapshot'], default='supabase',
+                        help="snapshot = data/lead_embeddings.{npy,parquet} from export_lead_embeddings.py, offline")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    main(args.source, args.snapshot_dir)
@@ -0,0 +1,83 @@
+"""
+Shared helpers for the D2P engine tests.
+
+The engine is exercised end to end through its CLI (JSON on stdin, JSON on
+stdout), the way the Node side calls it. Tests that need the heavy stack
+(BERTopic, HDBSCAN, sentence-transformers) skip when it is not installed.
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENGINE = os.path.join(SCRIPTS_DIR, 'd2p_analysis_engine.py')
+
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+THEMES = {
+    'Advogado': 'consulta direito família contrato trabalhista processo audiência petição escritório',
+    'Personal': 'treino alunos resultado academia hipertrofia emagrecimento funcional avaliação',
+    'Confeiteira': 'bolo encomenda doces festa brigadeiro casamento aniversário entrega',
+    'Dentista': 'clareamento implante ortodontia consulta sorriso lente facetas avaliação',
+    'Fotógrafo': 'ensaio casamento gestante book evento edição álbum estúdio',
+    'Nutricionista': 'dieta plano alimentar consulta emagrecimento reeducação cardápio online',
+}
+FILLER = 'agende whatsapp link bio atendimento online bh sp poa rj orçamento'.split()
+
+
+def make_leads(n: int, seed: int = 7, duplicate_share: float = 0.0) -> List[Dict]:
+    """Themed synthetic leads; duplicate_share of them repeat an earlier bio verbatim."""
+    rng = random.Random(seed)
+    leads = []
+    for i in range(n):
+        if leads and rng.random() < duplicate_share:
+            source = rng.choice(leads)
+            profession, bio = source['profession'], source['bio']
+        else:
+            profession = rng.choice(list(THEMES))
+            words = THEMES[profession].split()
+            bio = ' '.join(rng.sample(words, rng.randint(4, len(words))) + rng.sample(FILLER, 2))
+        leads.append({
+            'lead_id': f'lead-{i}', 'username': f'user{i}', 'bio': bio, 'profession': profession,
+            'business_category': profession.lower(), 'similarity': round(rng.uniform(0.6, 0.95), 3),
+        })
+    return leads
+
+
+def engine_input(leads: List[Dict], **options) -> Dict:
+    return {
+        'market_name': 'Teste', 'version_id': 'teste_v1', 'view_mode': 'empresa', 'leads': leads,
+        'use_result_cache': False, 'reuse_topic_model': False, **options,
+    }
+
+
+@pytest.fixture
+def heavy_stack():
+    for module in ('bertopic', 'hdbscan', 'umap', 'sentence_transformers'):
+        pytest.importorskip(module)
+
+
+@pytest.fixture
+def run_engine(tmp_path, heavy_stack):
+    """Run the engine CLI on an input dict; returns (returncode, result dict or None, stderr)."""
+
+    def run(input_data: Dict, timeout: float = 600, env: Optional[Dict[str, str]] = None):
+        proc_env = {**os.environ, 'D2P_CACHE_DIR': str(tmp_path / 'cache'), **(env or {})}
+        proc = subprocess.run(
+            [sys.executable, ENGINE], input=json.dumps(input_data), capture_output=True,
+            text=True, timeout=timeout, env=proc_env, cwd=SCRIPTS_DIR,
+        )
+        try:
+            result = json.loads(proc.stdout)
+        except ValueError:
+            result = None
+        return proc.returncode, result, proc.stderr
+
+    return run
@@ -0,0 +1,26 @@
+"""
+OpenAI-compatible client stub for engine subprocess tests:
+D2P_LLM_CLIENT_FACTORY=llm_stub:make_client with this directory on PYTHONPATH.
+"""
+
+import json
+from types import SimpleNamespace
+
+DECISIONS = [
+    {'decision': 'Aceito esse caso com prazo curto?', 'friction': 'agenda cheia', 'product_type': 'gatekeeper',
+     'weight': 0.9, 'grounded_in': 'Tópico 0'},
+    {'decision': 'Respondo agora ou depois?', 'friction': 'mensagens acumuladas', 'product_type': 'triage',
+     'weight': 0.6},
+]
+
+
+class _Completions:
+    def create(self, **kwargs):
+        usage = SimpleNamespace(prompt_tokens=len(kwargs['messages'][-1]['content']) // 4, completion_tokens=80,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=0))
+        message = SimpleNamespace(content=json.dumps({'decisions': DECISIONS}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def make_client():
+    return SimpleNamespace(chat=SimpleNamespace(completions=_Completions()))
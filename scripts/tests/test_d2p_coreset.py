@@ -0,0 +1,11 @@
+from conftest import engine_input, make_leads
+
+
+def test_scale_mode_times_coreset_fit_and_transform(run_engine):
+    code, result, stderr = run_engine(
+        engine_input(make_leads(400), scale_mode=True), env={'D2P_CORESET_SIZE': '150'})
+
+    assert code == 0 and result['success'], stderr[-2000:]
+    assert result['scale_mode']['enabled']
+    spans = {span['name'] for span in result['timings']['spans']}
+    assert {'fit', 'transform'} <= spans
@@ -0,0 +1,22 @@
+import pytest
+
+from conftest import engine_input, make_leads
+
+
+@pytest.mark.parametrize('deadline_ms', ['soon', 0, -500, True, [1000]])
+def test_invalid_deadline_is_rejected(run_engine, deadline_ms):
+    code, result, stderr = run_engine(engine_input(make_leads(60), deadline_ms=deadline_ms))
+
+    assert code == 0, stderr[-2000:]
+    assert result['success'] is False
+    assert 'deadline_ms' in result['error']
+
+
+def test_sampled_run_reports_received_leads(run_engine):
+    code, result, stderr = run_engine(
+        engine_input(make_leads(400), deadline_ms=10000), env={'D2P_DEADLINE_MIN_LEADS': '100'})
+
+    assert code == 0 and result['success'], stderr[-2000:]
+    assert result['leads_selected'] == 400
+    assert 100 <= result['deadline']['leads_sampled'] < 400
+    assert any(d['step'] == 'sample_leads' for d in result['deadline']['degradations'])
@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+import d2p_prompt
+
+
+def _offline(*args):
+    raise OSError('Could not download o200k_base.tiktoken')
+
+
+def test_count_tokens_falls_back_when_encoding_cannot_load(monkeypatch):
+    monkeypatch.setattr(d2p_prompt, 'tiktoken', SimpleNamespace(encoding_for_model=_offline, get_encoding=_offline),
+                        raising=False)
+    monkeypatch.setattr(d2p_prompt, '_tiktoken_available', True)
+    monkeypatch.setattr(d2p_prompt, '_encodings', {})
+
+    assert d2p_prompt.count_tokens('x' * 10) == 3
+    assert d2p_prompt._encodings == {'gpt-4o-mini': None}
+
+
+def test_fit_topics_to_budget_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(d2p_prompt, '_tiktoken_available', False)
+    keywords = [[f'palavra{i}{j}' for j in range(8)] for i in range(10)]
+    text, trim = d2p_prompt.fit_topics_to_budget(keywords, None, 60, 'gpt-4o-mini')
+
+    assert d2p_prompt.count_tokens(text) <= 60
+    assert trim['topics_kept'] < trim['topics_total']
@@ -0,0 +1,37 @@
+import os
+
+from conftest import engine_input, make_leads
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+NO_LLM = {'OPENAI_API_KEY': '', 'D2P_LLM_CLIENT_FACTORY': ''}
+STUB_LLM = {'D2P_LLM_CLIENT_FACTORY': 'llm_stub:make_client',
+            'PYTHONPATH': os.pathsep.join(filter(None, [TESTS_DIR, os.environ.get('PYTHONPATH')]))}
+
+
+def cached_input(leads, **options):
+    return engine_input(leads, use_result_cache=True, **options)
+
+
+def test_run_without_owner_decisions_is_not_cached(run_engine):
+    leads = make_leads(120)
+    for _ in range(2):
+        code, result, stderr = run_engine(cached_input(leads), env=NO_LLM)
+        assert code == 0 and result['success'], stderr[-2000:]
+        assert result['owner_analysis']['decisions'] == []
+        assert result['cache'] == 'miss'
+
+
+def test_llm_run_is_cached_but_force_refit_is_not_answered_from_it(run_engine):
+    leads = make_leads(120)
+    code, first, stderr = run_engine(cached_input(leads), env=STUB_LLM)
+    assert code == 0 and first['success'], stderr[-2000:]
+    assert first['owner_analysis']['decisions']
+    assert first['cache'] == 'miss'
+
+    code, second, stderr = run_engine(cached_input(leads), env=STUB_LLM)
+    assert code == 0 and second['cache'] == 'hit', stderr[-2000:]
+
+    code, refit, stderr = run_engine(cached_input(leads, force_refit=True), env=STUB_LLM)
+    assert code == 0 and refit['success'], stderr[-2000:]
+    assert refit['cache'] == 'miss'
+    assert refit['topic_model']['reason'] == 'force_refit'
@@ -0,0 +1,14 @@
+from conftest import engine_input, make_leads
+
+
+def test_parallel_sweep_cli_exits(run_engine):
+    # A pool forked after numba / OpenMP threads started left the CLI hanging
+    # after printing a correct result; subprocess.run raises on the timeout.
+    code, result, stderr = run_engine(
+        engine_input(make_leads(300), sweep={'workers': 2}), timeout=300)
+
+    assert code == 0, stderr[-2000:]
+    assert result['success'], result.get('error')
+    assert result['sweep']['parallel'] == 'process_pool'
+    assert result['sweep']['workers'] == 2
+    assert result['sweep']['configs'] >= 2
@@ -0,0 +1,25 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import SCRIPTS_DIR
+
+
+def test_non_object_lines_do_not_stop_the_server(tmp_path, heavy_stack):
+    lines = ['[1, 2]', '"text"', '{"id": "job-1", "input": 7}', 'not json', '{"command": "stats"}',
+             '{"command": "shutdown"}']
+    proc = subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS_DIR, 'd2p_worker.py'), '--workers', '1'],
+        input='\n'.join(lines) + '\n', capture_output=True, text=True, timeout=300, cwd=SCRIPTS_DIR,
+        env={**os.environ, 'D2P_CACHE_DIR': str(tmp_path / 'cache')},
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+
+    messages = [json.loads(line) for line in proc.stdout.splitlines() if line.strip()]
+    errors = {m['id']: m['result'] for m in messages if 'result' in m}
+    assert set(errors) == {1, 2, 'job-1', 4}
+    assert all(not r['success'] for r in errors.values())
+    assert 'expected a JSON object, got list' in errors[1]['error']
+    assert 'got int' in errors['job-1']['error']
+    assert any(m.get('event') == 'stats' for m in messages)
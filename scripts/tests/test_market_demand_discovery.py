@@ -0,0 +1,105 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import SCRIPTS_DIR, make_leads
+
+
+@pytest.fixture(scope='module')
+def mdd():
+    for module in ('dotenv', 'supabase', 'bertopic', 'hdbscan', 'umap'):
+        pytest.importorskip(module)
+    spec = importlib.util.spec_from_file_location(
+        'market_demand_discovery', os.path.join(SCRIPTS_DIR, 'market-demand-discovery.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class PgError(Exception):
+    def __init__(self, message: str, pgcode: str):
+        super().__init__(message)
+        self.pgcode = pgcode
+
+
+class FailingConnection:
+    """psycopg2-like connection whose queries fail with the given SQLSTATE."""
+
+    def __init__(self, pgcode: str):
+        self.pgcode = pgcode
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        raise PgError('function market_census(integer) does not exist', self.pgcode)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_census_falls_back_to_paging_without_migration_105(mdd, monkeypatch):
+    paged = {'Dentista': {'total': 300, 'eligible': 250}}
+    monkeypatch.setattr(mdd, 'count_markets_by_paging', lambda supabase: paged)
+    conn = FailingConnection(mdd.PG_UNDEFINED_FUNCTION)
+
+    assert mdd.fetch_market_census(supabase=None, conn=conn) == paged
+    assert conn.rollbacks == 1
+
+
+def test_census_raises_other_database_errors(mdd, monkeypatch):
+    monkeypatch.setattr(mdd, 'count_markets_by_paging', lambda supabase: pytest.fail('must not page'))
+    conn = FailingConnection('57014')  # query_canceled
+
+    with pytest.raises(PgError):
+        mdd.fetch_market_census(supabase=None, conn=conn)
+    assert conn.rollbacks == 1
+
+
+def synthetic_market(mdd, n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((6, 32)) * 3
+    embeddings = (centers[rng.integers(0, len(centers), n)] + rng.standard_normal((n, 32))).astype(np.float32)
+    data = mdd.MarketLeads(n)
+    for i, lead in enumerate(make_leads(n, seed=seed)):
+        data.add(lead['lead_id'], lead['username'], lead['bio'], lead['profession'], embeddings[i])
+    return data.finish()
+
+
+def test_global_fit_leaves_undersized_markets_out(mdd, monkeypatch):
+    fits = []
+    create = mdd.create_bertopic_model
+
+    def recording_model(n_docs, **kwargs):
+        model = create(n_docs, **kwargs)
+        fit_transform = model.fit_transform
+
+        def record(docs, embeddings=None):
+            fits.append({'min_size_for': n_docs, 'docs': len(docs)})
+            return fit_transform(docs, embeddings)
+
+        model.fit_transform = record
+        return model
+
+    monkeypatch.setattr(mdd, 'create_bertopic_model', recording_model)
+    small = mdd.MIN_MARKET_SIZE // 4
+    markets = {'Grande': synthetic_market(mdd, mdd.MIN_MARKET_SIZE + 150, 1),
+               'Pequeno': synthetic_market(mdd, small, 2),
+               'Medio': synthetic_market(mdd, mdd.MIN_MARKET_SIZE + 50, 3)}
+
+    results = mdd.analyze_markets_global(markets)
+
+    assert fits == [{'min_size_for': mdd.MIN_MARKET_SIZE + 50, 'docs': 2 * mdd.MIN_MARKET_SIZE + 200}]
+    assert results[1] == {'error': f'Insufficient data: {small} < {mdd.MIN_MARKET_SIZE}'}
+    assert [r.get('market') for r in (results[0], results[2])] == ['Grande', 'Medio']
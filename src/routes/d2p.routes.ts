@@ -38,11 +38,12 @@ const router = express.Router();
  *   market_name: string,
  *   min_similarity?: number (default 0.65) - fixed threshold for semantic match
  *   min_leads?: number (default 100)
+ *   force_refresh?: boolean (default false) - bypass the engine's result cache
  * }
  */
 router.post('/analyze', async (req: Request, res: Response): Promise<void> => {
   try {
-    const { market_name, min_similarity, min_leads, view_mode, async: asyncMode } = req.body;
+    const { market_name, min_similarity, min_leads, view_mode, force_refresh, async: asyncMode } = req.body;
 
     if (!market_name) {
       res.status(400).json({
@@ -53,7 +54,12 @@ router.post('/analyze', async (req: Request, res: Response): Promise<void> => {
     }
 
     const viewMode = view_mode === 'cliente' ? 'cliente' : 'empresa';
-    const analysisParams = { minSimilarity: min_similarity, minLeads: min_leads, viewMode: viewMode as 'empresa' | 'cliente' };
+    const analysisParams = {
+      minSimilarity: min_similarity,
+      minLeads: min_leads,
+      viewMode: viewMode as 'empresa' | 'cliente',
+      forceRefresh: force_refresh === true
+    };
 
     console.log(`[D2P API] Starting analysis: ${market_name} [${viewMode}] (threshold: ${min_similarity ?? 'default'})`);
 
@@ -187,6 +193,7 @@ router.get('/market/:slug/history', async (req: Request, res: Response): Promise
  * Body: {
  *   min_similarity?: number (default 0.65)
  *   min_leads?: number (default 100)
+ *   force_refresh?: boolean (default false) - bypass the engine's result cache
  * }
  */
 router.post('/market/:slug/reanalyze', async (req: Request, res: Response): Promise<void> => {
@@ -197,13 +204,14 @@ router.post('/market/:slug/reanalyze', async (req: Request, res: Response): Prom
       return;
     }
 
-    const { min_similarity, min_leads } = req.body;
+    const { min_similarity, min_leads, force_refresh } = req.body;
 
     console.log(`[D2P API] Re-analyzing market: ${slug} (threshold: ${min_similarity ?? 0.7})`);
 
     const analysis = await reanalyzeMarket(slug, {
       minSimilarity: min_similarity,
-      minLeads: min_leads
+      minLeads: min_leads,
+      forceRefresh: force_refresh === true
     });
 
     res.json({
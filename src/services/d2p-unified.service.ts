@@ -11,6 +11,7 @@
 
 import { createClient, SupabaseClient } from '@supabase/supabase-js';
 import { spawn } from 'child_process';
+import { once } from 'events';
 import * as path from 'path';
 
 const supabase: SupabaseClient = createClient(
@@ -26,6 +27,7 @@ export interface AnalysisParams {
   minSimilarity?: number;  // Default: 0.65
   minLeads?: number;       // Default: 100
   viewMode?: 'empresa' | 'cliente';  // Default: 'empresa'
+  forceRefresh?: boolean;  // Default: false — recompute even if the engine has this lead set cached
 }
 
 interface PgvectorLead {
@@ -258,16 +260,15 @@ async function generateMarketEmbedding(
 }
 
 /**
- * Search leads using pgvector RPC with embedding_d2p
+ * Run the full vector search server-side and store results in the
+ * d2p_search_results staging table. Returns the session to read them from.
  */
-async function searchLeadsForD2P(
+async function storeSearchSession(
   queryEmbedding: number[],
   minSimilarity: number
-): Promise<PgvectorLead[]> {
+): Promise<{ sessionId: string | null; totalCount: number }> {
   const embeddingStr = `[${queryEmbedding.join(',')}]`;
-  const pageSize = 1000;
 
-  // Step 1: Run full vector search and store results in staging table.
   // This bypasses PostgREST's 1000 row cap — the INSERT happens server-side.
   console.log(`[D2P] Running d2p_search_and_store (SECURITY DEFINER, 60s timeout)...`);
 
@@ -280,8 +281,23 @@ async function searchLeadsForD2P(
     throw new Error(`d2p_search_and_store failed: ${storeError.message}`);
   }
 
-  const sessionId = storeResult?.[0]?.session_id;
-  const totalCount = storeResult?.[0]?.total_count ?? 0;
+  return {
+    sessionId: storeResult?.[0]?.session_id ?? null,
+    totalCount: storeResult?.[0]?.total_count ?? 0
+  };
+}
+
+/**
+ * Search leads using pgvector RPC with embedding_d2p
+ */
+async function searchLeadsForD2P(
+  queryEmbedding: number[],
+  minSimilarity: number
+): Promise<PgvectorLead[]> {
+  const pageSize = 1000;
+
+  // Step 1: Run full vector search and store results in staging table.
+  const { sessionId, totalCount } = await storeSearchSession(queryEmbedding, minSimilarity);
 
   if (!sessionId || totalCount === 0) {
     console.log(`[D2P] No leads found above similarity threshold ${minSimilarity}`);
@@ -442,13 +458,17 @@ async function runPythonAnalysis(
   marketName: string,
   versionId: string,
   leads: PgvectorLead[],
-  viewMode: 'empresa' | 'cliente' = 'empresa'
+  viewMode: 'empresa' | 'cliente' = 'empresa',
+  sessionId: string | null = null,
+  forceRefresh: boolean = false
 ): Promise<any> {
   return new Promise((resolve, reject) => {
     const pythonScript = path.join(process.cwd(), 'scripts', 'd2p_analysis_engine.py');
     const pythonPath = path.join(process.cwd(), 'scripts', '.venv', 'bin', 'python3');
 
-    console.log(`[D2P] Starting Python analysis for "${marketName}" with ${leads.length} leads...`);
+    console.log(sessionId
+      ? `[D2P] Starting Python analysis for "${marketName}" reading session ${sessionId} directly...`
+      : `[D2P] Starting Python analysis for "${marketName}" with ${leads.length} leads...`);
 
     const python = spawn(pythonPath, [pythonScript], {
       cwd: process.cwd(),
@@ -480,7 +500,7 @@ async function runPythonAnalysis(
           reject(new Error(result.error || 'Python returned error'));
           return;
         }
-        console.log(`[D2P] Python completed in ${result.analysis_duration_ms}ms`);
+        console.log(`[D2P] Python completed in ${result.analysis_duration_ms}ms (cache ${result.cache})`);
         console.log(`[D2P] Python owner_analysis: ${JSON.stringify(result.owner_analysis)?.substring(0, 200)}`);
         console.log(`[D2P] Python micro_decisions: ${JSON.stringify(result.micro_decisions)}`);
         console.log(`[D2P] Python dominant_decision: ${result.dominant_decision}`);
@@ -494,26 +514,61 @@ async function runPythonAnalysis(
       reject(new Error(`Failed to start Python: ${err.message}`));
     });
 
-    // Send pre-filtered leads to Python
-    const inputData = JSON.stringify({
+    // Python may exit early (e.g. bad input); the close handler reports it
+    python.stdin.on('error', (err) => {
+      console.error(`[D2P] Python stdin error: ${err.message}`);
+    });
+
+    // Stream pre-filtered leads to Python as NDJSON (header line, then one
+    // lead per line) so it can preprocess bios while the rest still arrives.
+    // In direct session mode only the header (with session_id) is sent and
+    // Python reads d2p_search_results itself.
+    const header: Record<string, unknown> = {
       market_name: marketName,
       version_id: versionId,
-      view_mode: viewMode,
-      leads: leads.map(l => ({
-        lead_id: l.lead_id,
-        username: l.username,
-        bio: l.bio,
-        profession: l.profession,
-        business_category: l.business_category,
-        similarity: l.similarity
-      }))
+      view_mode: viewMode
+    };
+    if (sessionId) {
+      header.session_id = sessionId;
+    }
+    if (forceRefresh) {
+      header.force_refresh = true;
+    }
+    streamLeadsToPython(python.stdin, header, sessionId ? [] : leads).catch(err => {
+      reject(new Error(`Failed to stream leads to Python: ${err.message}`));
     });
-
-    python.stdin.write(inputData);
-    python.stdin.end();
   });
 }
 
+/**
+ * Write the NDJSON input stream for d2p_analysis_engine.py, honouring
+ * backpressure so only one lead line is serialised at a time.
+ */
+async function streamLeadsToPython(
+  stdin: NodeJS.WritableStream,
+  header: Record<string, unknown>,
+  leads: PgvectorLead[]
+): Promise<void> {
+  const writeLine = async (obj: unknown): Promise<void> => {
+    if (!stdin.write(JSON.stringify(obj) + '\n')) {
+      await once(stdin, 'drain');
+    }
+  };
+
+  await writeLine(header);
+  for (const l of leads) {
+    await writeLine({
+      lead_id: l.lead_id,
+      username: l.username,
+      bio: l.bio,
+      profession: l.profession,
+      business_category: l.business_category,
+      similarity: l.similarity
+    });
+  }
+  stdin.end();
+}
+
 async function getNextVersionNumber(marketSlug: string, viewMode: string = 'empresa'): Promise<number> {
   const { data } = await supabase
     .from('d2p_analyses')
@@ -629,13 +684,16 @@ export async function analyzeMarket(
   try {
     // Step 1: Generate embedding (different strategy per view mode)
     let marketEmbedding: number[];
-    let leads: PgvectorLead[];
+    let leads: PgvectorLead[] = [];
+    let leadCount: number;
+    let sessionId: string | null = null;
     let painSeeds: string[] | null = null;
 
     if (viewMode === 'cliente') {
       console.log(`[D2P] CLIENT mode: generating B2B supplier seeds + multi-query search in embedding_d2p...`);
       const result = await searchClientsBySeeds(marketName, minSimilarity);
       leads = result.leads;
+      leadCount = leads.length;
       painSeeds = result.seeds;
       marketEmbedding = []; // not used for seeds mode
     } else {
@@ -643,18 +701,29 @@ export async function analyzeMarket(
       marketEmbedding = await generateMarketEmbedding(marketName);
 
       console.log(`[D2P] Searching pgvector (embedding_d2p, threshold=${minSimilarity})...`);
-      leads = await searchLeadsForD2P(marketEmbedding, minSimilarity);
+      if (process.env.D2P_DIRECT_SESSION_READ === 'true') {
+        // Python streams the staged rows itself (server-side cursor), no paging here
+        const session = await storeSearchSession(marketEmbedding, minSimilarity);
+        sessionId = session.sessionId;
+        leadCount = session.totalCount;
+      } else {
+        leads = await searchLeadsForD2P(marketEmbedding, minSimilarity);
+        leadCount = leads.length;
+      }
     }
-    console.log(`[D2P] pgvector returned ${leads.length} leads`);
+    console.log(`[D2P] pgvector returned ${leadCount} leads`);
 
-    if (leads.length < minLeads) {
-      const errorMsg = `Insufficient leads: ${leads.length} (minimum: ${minLeads}). Try lowering similarity threshold.`;
+    if (leadCount < minLeads) {
+      if (sessionId) {
+        await supabase.from('d2p_search_results').delete().eq('session_id', sessionId);
+      }
+      const errorMsg = `Insufficient leads: ${leadCount} (minimum: ${minLeads}). Try lowering similarity threshold.`;
       await supabase
         .from('d2p_analyses')
         .update({
           status: 'error',
           error_message: errorMsg,
-          leads_selected: leads.length,
+          leads_selected: leadCount,
           analysis_duration_ms: Date.now() - startTime
         })
         .eq('id', inserted.id);
@@ -678,11 +747,13 @@ export async function analyzeMarket(
     }
 
     // Step 3: Send pre-filtered leads to Python for BERTopic + D2P
-    const pythonResult = await runPythonAnalysis(marketName, versionId, leads, viewMode);
+    const pythonResult = await runPythonAnalysis(
+      marketName, versionId, leads, viewMode, sessionId, params.forceRefresh ?? false
+    );
 
     // Step 4: Save results
     const updateData: Record<string, any> = {
-      leads_searched: leads.length,
+      leads_searched: leadCount,
       leads_selected: pythonResult.leads_selected,
       min_similarity: minSimilarity,
       avg_similarity: pythonResult.avg_similarity,